@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+ingest.py
+---------------------
+Per-file parse cost of the vote .json files of a synthetic session: the
+former path (json.load of the whole file, then nested Aye/Yea/No/Nay lookups
+and a name split per member) against src/data/parsers.py with every JSON
+backend installed. Files are read once into memory first, so only parsing is
+timed.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import click
+
+from stages import SESSION, SCALES
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                    'src')
+sys.path.append(os.path.join(_SRC, 'data'))
+
+from parsers import VoteParser, BACKENDS  # noqa: E402
+
+
+def legacy_parse(raw):
+    """What Congress and Records did with each file before parsers.py.
+    """
+
+    data = json.loads(raw.decode('utf-8'))
+
+    if all(x in ['Present', 'Not Voting'] for x in data['votes'].keys()):
+        return None
+
+    try:
+        yes_votes = data['votes']['Aye']
+    except KeyError:
+        try:
+            yes_votes = data['votes']['Yea']
+        except KeyError:
+            yes_votes = []
+
+    try:
+        no_votes = data['votes']['No']
+    except KeyError:
+        try:
+            no_votes = data['votes']['Nay']
+        except KeyError:
+            no_votes = []
+
+    return [(record['display_name'].split(' ')[0].strip(',').title(),
+             record['id'], record['party'], record['state'])
+            for record in yes_votes + no_votes if record != 'VP']
+
+
+def time_per_file(parse, raws, repeat):
+    """Best of repeat passes over raws, in milliseconds per file.
+    """
+
+    best = float('inf')
+
+    for _ in range(repeat):
+
+        start = time.time()
+
+        for raw in raws:
+            parse(raw)
+
+        best = min(best, time.time() - start)
+
+    return 1000. * best / len(raws)
+
+
+@click.command()
+@click.option('--scale', default='small', type=click.Choice(SCALES),
+              help='Session size.')
+@click.option('--repeat', default=3,
+              help='Passes over the files; the fastest is kept.')
+def main(scale, repeat):
+    """ Print the per-file parse time of each parser, and its speedup.
+    """
+
+    from make_synthetic import SyntheticCongress, PRESETS
+
+    root = tempfile.mkdtemp(prefix='usvotes_ingest_')
+
+    try:
+        SyntheticCongress(SESSION, **PRESETS[scale]).to_files(root)
+        raws = []
+
+        for dirpath, _, filenames in os.walk(root):
+
+            for filename in filenames:
+
+                if filename.endswith('.json'):
+
+                    with open(os.path.join(dirpath, filename), 'rb') as jfile:
+                        raws.append(jfile.read())
+
+    finally:
+        shutil.rmtree(root)
+
+    results = {'files': len(raws),
+               'legacy': time_per_file(legacy_parse, raws, repeat)}
+
+    for backend in BACKENDS:
+
+        try:
+            parser = VoteParser(backend)
+
+        except ImportError:
+            continue
+
+        results[backend] = time_per_file(parser.loads, raws, repeat)
+
+    click.echo('{} files of the {} preset'.format(len(raws), scale))
+
+    for name in ['legacy'] + BACKENDS:
+
+        if name in results:
+            click.echo('{:>10}: {:8.3f} ms/file  x{:.1f}'.format(
+                name, results[name], results['legacy'] / results[name]))
+
+    click.echo(json.dumps(results, sort_keys=True))
+
+if __name__ == '__main__':
+    main()
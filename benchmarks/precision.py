@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""
+precision.py
+---------------------
+Checks the float32 precision mode against float64 on a synthetic session:
+the House is reduced and embedded in both modes, each in a fresh process, and
+the memory of the vote matrix, SVD features and t-SNE trajectories is compared
+along with the quality of the embeddings (trustworthiness with respect to the
+float64 SVD features). Exits 1 if float32 loses more than --tolerance.
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+import click
+import numpy as np
+
+from stages import SESSION, SCALES, peak_rss_mb, prepare_workspace
+
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                    'src')
+
+
+def load_trustworthiness():
+
+    try:
+        from sklearn.manifold import trustworthiness
+
+    except ImportError:
+        from sklearn.manifold.t_sne import trustworthiness
+
+    return trustworthiness
+
+
+def run_child(precision, root, chamber):
+
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), 'measure', precision,
+         chamber],
+        cwd=os.path.join(root, 'src', 'features'))
+
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+@click.group()
+def cli():
+    """ float32 against float64: memory and embedding quality.
+    """
+
+
+@cli.command()
+@click.option('--scale', default='real', type=click.Choice(SCALES),
+              help='Session size.')
+@click.option('--chamber', default='h', type=click.Choice(['s', 'h']),
+              help='Senate or House.')
+@click.option('--neighbors', default=10,
+              help='Neighbors used by trustworthiness.')
+@click.option('--tolerance', default=0.01,
+              help='Largest allowed drop in trustworthiness.')
+def check(scale, chamber, neighbors, tolerance):
+    """ Compare the precision modes; exit code 1 if float32 degrades the
+    embedding.
+    """
+
+    root = tempfile.mkdtemp(prefix='usvotes_precision_')
+
+    try:
+        prepare_workspace(root, scale)
+        results = dict((precision, run_child(precision, root, chamber))
+                       for precision in ['float64', 'float32'])
+
+        trustworthiness = load_trustworthiness()
+        saved = dict((p, np.load(os.path.join(root, p + '.npz')))
+                     for p in results)
+        reference = saved['float64']['X_trunc']
+
+        for precision in results:
+            results[precision]['trustworthiness'] = float(trustworthiness(
+                reference, saved[precision]['embedding'],
+                n_neighbors=neighbors))
+
+        singular_values = [saved[p]['singular_values']
+                           for p in ['float64', 'float32']]
+        error = np.abs(singular_values[1] - singular_values[0])
+        results['svd_relative_error'] = float(
+            np.max(error / singular_values[0]))
+
+    finally:
+        shutil.rmtree(root)
+
+    drop = results['float64']['trustworthiness'] - \
+        results['float32']['trustworthiness']
+    results['ok'] = drop <= tolerance
+
+    for key in ['votes_mb', 'svd_mb', 'trajectory_mb', 'peak_rss_mb']:
+        results[key.replace('_mb', '_ratio')] = \
+            results['float32'][key] / results['float64'][key]
+
+    click.echo(json.dumps(results, indent=2, sort_keys=True))
+    sys.exit(0 if results['ok'] else 1)
+
+
+@cli.command()
+@click.argument('precision', type=click.Choice(['float64', 'float32']))
+@click.argument('chamber', type=click.Choice(['s', 'h']))
+def measure(precision, chamber):
+    """ Reduce and embed CHAMBER in PRECISION from the current directory;
+    saves the arrays in <root>/<precision>.npz and prints the measurements.
+    The t-SNE trajectory is recorded with getSteps, as for an animation.
+    """
+
+    for directory in ['features', 'visualization']:
+        sys.path.append(os.path.join(_SRC, directory))
+
+    from sklearn.manifold import TSNE
+    from build_features import Features
+    from measures import singular_values
+    from visualize import getSteps
+
+    features = Features(SESSION, precision=precision)
+    df = features.load_records()
+    df_chamber, X_trunc = features.transform_SVD(df, chamber)
+    df_tSNE = features.transform_tSNE(df_chamber, X_trunc)
+
+    votes = df_chamber.iloc[:, 3:].values
+    svd, _ = features.svd[chamber]
+    np.savez(os.path.join(os.pardir, os.pardir, precision + '.npz'),
+             X_trunc=X_trunc, embedding=df_tSNE[[0, 1]].values,
+             singular_values=singular_values(svd, votes))
+
+    class Animation(object):
+        tsne = TSNE(random_state=42, learning_rate=1000)
+        trajectory_dtype = np.dtype(features.dtype)
+
+    trajectory = getSteps(Animation(), X_trunc, None)
+    click.echo(json.dumps({
+        'votes_mb': votes.nbytes / 1024. ** 2,
+        'svd_mb': X_trunc.nbytes / 1024. ** 2,
+        'trajectory_mb': sum(p.nbytes for p in trajectory) / 1024. ** 2,
+        'trajectory_steps': len(trajectory),
+        'peak_rss_mb': peak_rss_mb()}))
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+
+"""
+stages.py
+---------------------
+Stage-level benchmarks of the data pipeline on synthetic sessions of several
+sizes (see src/data/make_synthetic.py). Each stage runs in a fresh child
+process, on inputs pickled by the stages before it in another child, so that
+its peak memory (ru_maxrss) is its own and that of its inputs. Results are
+saved as JSON; `compare` flags regressions against a saved baseline.
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import importlib
+import shutil
+import platform
+import datetime
+import tempfile
+import subprocess
+import click
+
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                    'src')
+_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+sys.path.append(os.path.join(_SRC, 'instrumentation'))
+
+from instrument import peak_rss_mb  # noqa: E402
+
+SESSION = '900'
+
+# Stage -> source directory it runs from, as the scripts do.
+STAGES = [('ingest', 'data'), ('construct', 'data'), ('to_file', 'data'),
+          ('load_csv', 'features'), ('svd_tsne', 'features'),
+          ('animate', 'visualization')]
+
+# Stages whose inputs are made by the stages before them.
+PREREQUISITES = ['construct', 'to_file', 'svd_tsne', 'animate']
+
+SCALES = ['tiny', 'small', 'real', '10x']
+
+
+def prepare_workspace(root, scale):
+    """Writes a synthetic session into a project-shaped scratch tree, with its
+    processed CSVs, so that every stage can run from <root>/src/<dir>/.
+    """
+
+    for directory in ['data/raw', 'data/processed', 'data/supplemental',
+                      'src/data', 'src/features', 'src/visualization']:
+        os.makedirs(os.path.join(root, directory))
+
+    select = os.path.join(root, 'data/supplemental/select_congressmen.json')
+
+    with open(select, 'w') as jfile:
+        json.dump({}, jfile)
+
+    sys.path.append(os.path.join(_SRC, 'data'))
+    from make_synthetic import SyntheticCongress, PRESETS
+
+    congress = SyntheticCongress(SESSION, **PRESETS[scale])
+    congress.to_files(os.path.join(root, 'data/raw'))
+    run_child('to_file', root)
+
+    return PRESETS[scale]
+
+
+def clear_caches(root):
+    """Removes the t-SNE affinities cached by an earlier run in the scratch
+    tree, so that every run of a stage computes its own.
+    """
+
+    shutil.rmtree(os.path.join(root, 'data/interim/affinities'),
+                  ignore_errors=True)
+
+
+def inputs_file(root, stage):
+    return os.path.join(root, '_'.join(['inputs', stage]) + '.pkl')
+
+
+def run_child(stage, root, prepare=False):
+    """Runs one stage in a fresh interpreter; returns its measurements. The
+    inputs of the stage are made by its prerequisites in an earlier child,
+    and pickled, so that its peak memory does not include theirs.
+    """
+
+    if not prepare and stage in PREREQUISITES and \
+            not os.path.exists(inputs_file(root, stage)):
+        run_child(stage, root, prepare=True)
+
+    directory = dict(STAGES)[stage]
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), 'stage', stage] +
+        (['--prepare'] if prepare else []),
+        cwd=os.path.join(root, 'src', directory))
+
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def stage_inputs(stage):
+    """Runs the prerequisites of a stage, untimed, and returns its inputs.
+    """
+
+    if stage in ['construct', 'to_file']:
+
+        from make_dataset import Congress, Dataset
+
+        measures_voted_on, records = Congress(SESSION).get_measures_voted_on()
+
+        if stage == 'construct':
+            return measures_voted_on, records
+
+        return Dataset().construct(measures_voted_on, records), \
+            measures_voted_on
+
+    if stage == 'svd_tsne':
+
+        from build_features import Features
+
+        return Features(SESSION).load_records()
+
+    from visualize import Animation
+
+    animation = Animation(SESSION, 's')
+    df = animation.load_data(chamber='s')
+
+    return animation.transform(df, option='svd')
+
+
+def time_stage(stage, inputs=None):
+    """Times a stage on the inputs made by stage_inputs. Returns a dict of
+    measurements, or of the reason it was skipped.
+    """
+
+    if stage in ['ingest', 'construct', 'to_file']:
+
+        from make_dataset import Congress, Dataset
+
+        start = time.time()
+
+        if stage == 'ingest':
+            Congress(SESSION).get_measures_voted_on()
+
+        elif stage == 'construct':
+            Dataset().construct(*inputs)
+
+        else:
+            dataframe, measures_voted_on = inputs
+            Dataset().to_file(SESSION, dataframe)
+            Dataset().measures_to_file(SESSION, measures_voted_on)
+
+        return {'seconds': time.time() - start}
+
+    if stage in ['load_csv', 'svd_tsne']:
+
+        from build_features import Features
+
+        start = time.time()
+        features = Features(SESSION)
+
+        if stage == 'load_csv':
+            features.load_records()
+            return {'seconds': time.time() - start}
+
+        features.transform_SVD_tSNE(inputs, chamber='s', scale='robust')
+        features.transform_SVD_tSNE(inputs, chamber='h', scale='standard')
+
+        return {'seconds': time.time() - start}
+
+    return time_animation(inputs)
+
+
+def time_animation(inputs):
+    """Times the frames of the senate animation on the inputs made by
+    stage_inputs, without encoding them.
+    """
+
+    from visualize import load_tsne_animate
+
+    try:
+        tsneAnimate = load_tsne_animate()
+
+    except ImportError as e:
+        return {'skipped': str(e)}
+
+    from sklearn.manifold import TSNE
+    from matplotlib.animation import AbstractMovieWriter
+
+    class RasterWriter(AbstractMovieWriter):
+        """Renders every frame on the figure's canvas and discards it, so that
+        frame generation is timed without an encoder.
+        """
+
+        def setup(self, fig, outfile, dpi=None):
+            self.fig, self.frames = fig, 0
+
+        def grab_frame(self, **savefig_kwargs):
+            self.fig.canvas.draw()
+            self.frames += 1
+
+        def finish(self):
+            pass
+
+    df_X, df_y = inputs
+    writer = RasterWriter()
+    start = time.time()
+    tsne = tsneAnimate(TSNE(random_state=42, learning_rate=1000))
+    tsne.animate(df_X, df_y, False, SESSION, 'Senate', writer=writer)
+
+    return {'seconds': time.time() - start, 'frames': writer.frames}
+
+
+def load_results(filename):
+
+    with open(filename) as jfile:
+        return json.load(jfile)
+
+
+@click.group()
+def cli():
+    """ Stage-level timings and peak memory on synthetic sessions.
+    """
+
+
+@cli.command()
+@click.option('--scale', multiple=True, type=click.Choice(SCALES),
+              help='Session size (default: tiny and small). Repeatable.')
+@click.option('--stage', 'stages', multiple=True,
+              type=click.Choice([s for s, _ in STAGES]),
+              help='Stage to run (default: all). Repeatable.')
+@click.option('--repeat', default=3,
+              help='Runs per stage; the median time is kept.')
+@click.option('--output', default=None,
+              help='JSON file (default: results/stages_<date>.json).')
+def run(scale, stages, repeat, output):
+    """ Benchmark the stages and save the results as JSON.
+    """
+
+    results = {}
+
+    for size in scale or ('tiny', 'small'):
+
+        root = tempfile.mkdtemp(prefix='usvotes_bench_')
+
+        try:
+            sizes = prepare_workspace(root, size)
+            results[size] = {}
+
+            for stage in stages or [s for s, _ in STAGES]:
+
+                runs = []
+
+                for _ in range(repeat):
+                    clear_caches(root)
+                    runs.append(run_child(stage, root))
+
+                if 'skipped' in runs[0]:
+                    results[size][stage] = runs[0]
+                    continue
+
+                seconds = sorted(r['seconds'] for r in runs)
+                peak = max(r['peak_rss_mb'] for r in runs)
+                results[size][stage] = dict(
+                    runs[0], seconds=seconds[len(seconds) // 2],
+                    runs=seconds, peak_rss_mb=peak)
+                click.echo('{:>6} {:>10}: {:8.3f}s {:8.1f} MB'.format(
+                    size, stage, results[size][stage]['seconds'],
+                    results[size][stage]['peak_rss_mb']))
+
+            results[size]['sizes'] = sizes
+
+        finally:
+            shutil.rmtree(root)
+
+    if output is None:
+
+        if not os.path.isdir(_RESULTS):
+            os.makedirs(_RESULTS)
+
+        today = datetime.date.today().strftime("%Y%m%d")
+        output = os.path.join(_RESULTS, '_'.join(['stages', today]) + '.json')
+
+    with open(output, 'w') as jfile:
+        json.dump({'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'repeat': repeat, 'results': results},
+                  jfile, indent=2, sort_keys=True)
+
+    click.echo('saved {}'.format(output))
+
+
+@cli.command()
+@click.argument('baseline', type=click.Path(exists=True))
+@click.argument('current', type=click.Path(exists=True))
+@click.option('--threshold', default=0.2,
+              help='Relative slowdown or memory growth flagged.')
+@click.option('--min-seconds', default=0.05,
+              help='Ignore time changes below this.')
+def compare(baseline, current, threshold, min_seconds):
+    """ Compare CURRENT against BASELINE; exit code 1 on any regression.
+    """
+
+    baseline = load_results(baseline)['results']
+    current = load_results(current)['results']
+    regressions = 0
+
+    for size in sorted(set(baseline) & set(current)):
+
+        for stage in [s for s, _ in STAGES]:
+
+            before, after = baseline[size].get(stage), current[size].get(stage)
+
+            if not before or not after or \
+                    'skipped' in before or 'skipped' in after:
+                continue
+
+            for metric, floor in [('seconds', min_seconds),
+                                  ('peak_rss_mb', 0.)]:
+
+                ratio = after[metric] / max(before[metric], 1e-9)
+                regressed = ratio > 1 + threshold and \
+                    after[metric] - before[metric] > floor
+                regressions += regressed
+                click.echo('{:>6} {:>10} {:>11}: {:10.3f} -> {:10.3f} '
+                           '({:+6.1%}){}'.format(
+                               size, stage, metric, before[metric],
+                               after[metric], ratio - 1,
+                               '  REGRESSION' if regressed else ''))
+
+    sys.exit(1 if regressions else 0)
+
+
+@cli.command()
+@click.argument('stage', type=click.Choice([s for s, _ in STAGES]))
+@click.option('--prepare', is_flag=True,
+              help='Run the prerequisites of STAGE and pickle its inputs.')
+def stage(stage, prepare):
+    """ Run one STAGE in this process from the current directory and print
+    its measurements as JSON; used by `run`.
+    """
+
+    for directory in ['data', 'features', 'visualization']:
+        sys.path.append(os.path.join(_SRC, directory))
+
+    # The child runs from <root>/src/<dir>/.
+    filename = inputs_file(os.path.join(os.pardir, os.pardir), stage)
+
+    if prepare:
+
+        with open(filename, 'wb') as pfile:
+            pickle.dump(stage_inputs(stage), pfile,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+        click.echo(json.dumps({'inputs': filename}))
+        return
+
+    # The scripts import these lazily; load them first so that no stage is
+    # charged for the import time. base_rss_mb is the memory they take, and
+    # inputs_rss_mb that and the unpickled inputs of the stage.
+    for module in ['pandas', 'sklearn.manifold']:
+        importlib.import_module(module)
+
+    base = peak_rss_mb()
+    inputs = None
+
+    if stage in PREREQUISITES:
+
+        with open(filename, 'rb') as pfile:
+            inputs = pickle.load(pfile)
+
+    loaded = peak_rss_mb()
+    result = time_stage(stage, inputs)
+    result.update(peak_rss_mb=peak_rss_mb(), base_rss_mb=base,
+                  inputs_rss_mb=loaded)
+    click.echo(json.dumps(result))
+
+if __name__ == '__main__':
+    cli()
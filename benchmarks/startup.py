@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+startup.py
+---------------------
+Import-time benchmark for the command line entry points. Each script is run
+with --help in a fresh interpreter, from its own directory as in normal use,
+and the median wall time is compared against a budget. Also checks that none
+of the heavy dependencies are imported just by loading the modules.
+"""
+import os
+import sys
+import subprocess
+import time
+import json
+import click
+
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                    'src')
+
+ENTRY_POINTS = [('data', 'make_dataset'),
+                ('features', 'build_features'),
+                ('visualization', 'visualize'),
+                ('pipeline', 'run_pipeline'),
+                ('pipeline', 'watch')]
+
+HEAVY_MODULES = ['sklearn', 'sklearn_pandas', 'matplotlib', 'tsne_animate',
+                 'pandas']
+
+_CHECK_IMPORTS = """
+import sys
+import {module}
+print(','.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def time_help(directory, module, repeat):
+    """Median seconds of `python <module>.py --help`.
+    """
+
+    cwd = os.path.join(_SRC, directory)
+    timings = []
+
+    for _ in range(repeat):
+
+        start = time.time()
+        subprocess.check_call([sys.executable, module + '.py', '--help'],
+                              cwd=cwd, stdout=open(os.devnull, 'w'))
+        timings.append(time.time() - start)
+
+    return sorted(timings)[len(timings) // 2]
+
+
+def heavy_imports(directory, module):
+    """Heavy dependencies loaded as a side effect of importing the module.
+    """
+
+    cwd = os.path.join(_SRC, directory)
+    script = _CHECK_IMPORTS.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, '-c', script], cwd=cwd)
+
+    return [m for m in output.decode('utf-8').strip().split(',') if m]
+
+
+@click.command()
+@click.option('--repeat', default=5,
+              help='Runs per entry point; the median is kept.')
+@click.option('--budget', default=0.5, help='Maximum seconds for --help.')
+def main(repeat, budget):
+    """ Fails (exit code 1) if any entry point's --help exceeds the budget or
+    imports a heavy dependency at module level.
+    """
+
+    results = {}
+    failed = False
+
+    for directory, module in ENTRY_POINTS:
+
+        seconds = time_help(directory, module, repeat)
+        heavy = heavy_imports(directory, module)
+        ok = seconds <= budget and not heavy
+        failed = failed or not ok
+        results[module] = {'help_seconds': round(seconds, 3),
+                           'heavy_imports': heavy, 'ok': ok}
+
+    print(json.dumps({'budget_seconds': budget, 'results': results},
+                     indent=2, sort_keys=True))
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+archive.py
+---------------------
+Functions for reading the raw govtrack vote files of a session straight out
+of a zip or tar.gz archive, one member at a time, without extracting them.
+"""
+import os
+import time
+import zlib
+import zipfile
+import tarfile
+
+
+ARCHIVE_EXTENSIONS = ['.zip', '.tar.gz', '.tgz']
+
+# What reading an archive that is missing, or still being written, raises.
+ARCHIVE_ERRORS = (IOError, OSError, EOFError, zlib.error, zipfile.BadZipfile,
+                  tarfile.TarError)
+
+
+def find_archive(raw_path, session):
+    """Returns the archive of a session in raw_path, e.g.
+    ../../data/raw/113.zip, or None if there is none.
+    """
+
+    for extension in ARCHIVE_EXTENSIONS:
+
+        filename = os.path.join(raw_path, str(session) + extension)
+
+        if os.path.isfile(filename):
+            return filename
+
+    return None
+
+
+def session_archive(path, session):
+    """The archive of a session given as --archive: path itself if it is a
+    file, or the session's archive in path (see find_archive) if it is a
+    directory of them.
+    """
+
+    if path is None or not os.path.isdir(path):
+        return path
+
+    return find_archive(path, session)
+
+
+class VoteArchive:
+    """Streams the vote .json files of a zip or tar.gz archive of govtrack
+    data. Members are decompressed sequentially, in archive order: tar.gz is
+    opened in stream mode ('r|gz'), so it is read from start to end exactly
+    once, and nothing is written to disk.
+    """
+
+    def __init__(self, filename):
+
+        self._filename = filename
+
+        if zipfile.is_zipfile(filename):
+            self._kind = 'zip'
+
+        elif tarfile.is_tarfile(filename):
+            self._kind = 'tar'
+
+        else:
+            raise ValueError(
+                '{} is neither a zip nor a tar archive'.format(filename))
+
+    @property
+    def filename(self):
+        return self._filename
+
+    def fingerprint(self):
+        """Size and modification time of the archive, to detect new data.
+        """
+
+        stat = os.stat(self._filename)
+        return {'archive': os.path.basename(self._filename),
+                'size': stat.st_size, 'latest': stat.st_mtime}
+
+    def modification_times(self):
+        """{member name: modification time} of the .json files, read from
+        the zip directory, or from the tar headers in one pass over the
+        stream (their contents are skipped, not decompressed into memory).
+        """
+
+        if self._kind == 'zip':
+
+            with zipfile.ZipFile(self._filename) as zfile:
+                return dict((info.filename,
+                             time.mktime(info.date_time + (0, 0, -1)))
+                            for info in zfile.infolist()
+                            if info.filename.endswith('.json'))
+
+        tfile = tarfile.open(self._filename, mode='r|*')
+
+        try:
+            return dict((info.name, float(info.mtime)) for info in tfile
+                        if info.isfile() and info.name.endswith('.json'))
+
+        finally:
+            tfile.close()
+
+    def iter_members(self, names=None):
+        """Yields (member name, raw bytes) of every .json file in the archive,
+        or only of those in names.
+        """
+
+        if self._kind == 'zip':
+
+            with zipfile.ZipFile(self._filename) as zfile:
+
+                for info in zfile.infolist():
+
+                    if info.filename.endswith('.json') and \
+                            (names is None or info.filename in names):
+                        yield info.filename, zfile.read(info)
+
+        else:
+
+            tfile = tarfile.open(self._filename, mode='r|*')
+
+            try:
+
+                for info in tfile:
+
+                    if info.isfile() and info.name.endswith('.json') and \
+                            (names is None or info.name in names):
+                        yield info.name, tfile.extractfile(info).read()
+
+            finally:
+                tfile.close()
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+
+"""
+export_db.py
+---------------------
+Functions for exporting the processed sessions of ../../data/processed/ into
+one SQLite database, ../../data/processed/usvotes.sqlite, in long format:
+one row per vote cast instead of one column per measure, so that analysts
+can query any member, measure or date range across sessions without loading
+a whole session into pandas.
+"""
+import os
+import sys
+import sqlite3
+from pathlib import Path
+from contextlib import contextmanager
+import click
+import logging
+
+from normalize import normalize_names
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'instrumentation'))
+from instrument import RunReport  # noqa: E402
+
+
+CHAMBERS = ['s', 'h']
+
+TABLES = [
+    """CREATE TABLE IF NOT EXISTS members (
+        member_id INTEGER PRIMARY KEY,
+        session INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        party TEXT,
+        state TEXT,
+        chamber TEXT,
+        UNIQUE (session, name))""",
+    """CREATE TABLE IF NOT EXISTS measures (
+        vote_id TEXT NOT NULL,
+        session INTEGER NOT NULL,
+        date TEXT,
+        result TEXT,
+        chamber TEXT,
+        PRIMARY KEY (session, vote_id)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS votes (
+        member_id INTEGER NOT NULL,
+        vote_id TEXT NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY (member_id, vote_id)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS embeddings (
+        member_id INTEGER PRIMARY KEY,
+        session INTEGER NOT NULL,
+        chamber TEXT NOT NULL,
+        x REAL NOT NULL,
+        y REAL NOT NULL)"""]
+
+# Secondary indexes, dropped during bulk loads and rebuilt once after them.
+INDEXES = [
+    ('members_name', 'members (name, session)'),
+    ('measures_date', 'measures (date, session)'),
+    ('votes_vote_id', 'votes (vote_id, value)'),
+    ('embeddings_session', 'embeddings (session, chamber)')]
+
+
+def read_session(data_path, session):
+    """(dataframe, measures, {chamber: embedding}) of a processed session;
+    measures is None for sessions processed before measures.csv was written,
+    and chambers without a saved embedding are left out.
+    """
+
+    import pandas as pd
+
+    filehandle = '_'.join([str(session), 'dataframe.csv'])
+    in_file = os.path.join(data_path, filehandle)
+    header = pd.read_csv(in_file, encoding='utf-8', nrows=0).columns
+    df = pd.read_csv(in_file, encoding='utf-8',
+                     dtype={col: 'int8' for col in header[4:]})
+
+    measures_file = os.path.join(data_path,
+                                 '_'.join([str(session), 'measures.csv']))
+    measures = None
+
+    if os.path.exists(measures_file):
+        measures = pd.read_csv(measures_file, encoding='utf-8')
+
+    embeddings = {}
+
+    for chamber in CHAMBERS:
+
+        embedding_file = os.path.join(
+            data_path, '_'.join([str(session), chamber, 'embedding.csv']))
+
+        if os.path.exists(embedding_file):
+            embeddings[chamber] = pd.read_csv(embedding_file, index_col=0,
+                                              encoding='utf-8')
+
+    return df, measures, embeddings
+
+
+def vote_rows(member_ids, vote_ids, votes):
+    """(member_id, vote_id, value) of every vote cast (value >= 0) in the
+    (members x measures) matrix votes, in primary key order.
+    """
+
+    import numpy as np
+
+    order = np.argsort(vote_ids, kind='mergesort')
+    votes = votes[:, order]
+    rows, cols = np.nonzero(votes >= 0)
+
+    return zip(np.asarray(member_ids)[rows].tolist(),
+               np.asarray(vote_ids)[order][cols].tolist(),
+               votes[rows, cols].tolist())
+
+
+class VoteDatabase:
+    """SQLite database of the processed sessions:
+
+    members(member_id, session, name, party, state, chamber)
+    measures(vote_id, session, date, result, chamber)
+    votes(member_id, vote_id, value (1 yea, 0 nay))
+    embeddings(member_id, session, chamber, x, y)
+
+    member_id is one member in one session. Votes that were not cast are not
+    stored. For instance, one member's votes over a date range:
+
+    SELECT ms.date, v.vote_id, v.value
+    FROM members m
+    JOIN votes v ON v.member_id = m.member_id
+    JOIN measures ms ON ms.session = m.session AND ms.vote_id = v.vote_id
+    WHERE m.name = 'Sanders'
+      AND ms.date BETWEEN '2013-01-01' AND '2013-06-30'
+    """
+
+    def __init__(self, db_file=None):
+
+        self._ROOT = str(Path(os.getcwd()).parents[1])
+        self._data_path = os.path.join(self._ROOT, 'data/processed/')
+        self._db_file = db_file or os.path.join(self._data_path,
+                                                'usvotes.sqlite')
+        self._connection = sqlite3.connect(self._db_file)
+        self.create_schema()
+
+    @property
+    def db_file(self):
+        return self._db_file
+
+    @property
+    def data_path(self):
+        return self._data_path
+
+    @property
+    def connection(self):
+        return self._connection
+
+    def close(self):
+        self._connection.close()
+
+    def create_schema(self):
+
+        with self._connection:
+
+            for table in TABLES:
+                self._connection.execute(table)
+
+        self.create_indexes()
+
+    def create_indexes(self):
+
+        with self._connection:
+
+            for name, columns in INDEXES:
+                self._connection.execute(
+                    'CREATE INDEX IF NOT EXISTS {} ON {}'.format(name,
+                                                                 columns))
+
+    def drop_indexes(self):
+
+        with self._connection:
+
+            for name, _ in INDEXES:
+                self._connection.execute(
+                    'DROP INDEX IF EXISTS {}'.format(name))
+
+    @contextmanager
+    def bulk(self):
+        """Loads in the body skip the secondary indexes and the fsync of every
+        commit; the indexes are rebuilt, once, at the end.
+        """
+
+        self.drop_indexes()
+        self._connection.execute('PRAGMA synchronous = OFF')
+
+        try:
+            yield self
+
+        finally:
+            self._connection.execute('PRAGMA synchronous = FULL')
+            self.create_indexes()
+            self._connection.execute('ANALYZE')
+
+    def delete_session(self, session):
+
+        self._connection.execute(
+            'DELETE FROM votes WHERE member_id IN '
+            '(SELECT member_id FROM members WHERE session = ?)', (session,))
+
+        for table in ['embeddings', 'measures', 'members']:
+            self._connection.execute(
+                'DELETE FROM {} WHERE session = ?'.format(table), (session,))
+
+    def export_session(self, session, df, measures=None, embeddings=None):
+        """Replaces the rows of a session, in one transaction, with those of
+        its processed dataframe, measures and {chamber: embedding}. Returns
+        the number of rows written per table.
+        """
+
+        session = int(session)
+        embeddings = embeddings or {}
+        vote_ids = df.columns.tolist()[4:]
+        names = normalize_names(df.Name).tolist()
+
+        with self._connection:
+
+            self.delete_session(session)
+            first_id = self._connection.execute(
+                'SELECT COALESCE(MAX(member_id), 0) + 1 '
+                'FROM members').fetchone()[0]
+            member_ids = list(range(first_id, first_id + len(names)))
+
+            self._connection.executemany(
+                'INSERT INTO members VALUES (?, ?, ?, ?, ?, ?)',
+                zip(member_ids, [session] * len(names), names,
+                    df.Party.tolist(), df.State.tolist(),
+                    df.Chamber.tolist()))
+
+            if measures is not None:
+                rows = zip(measures.vote_id.tolist(), measures.date.tolist(),
+                           measures.result.tolist(), measures.chamber.tolist())
+
+            else:
+                # Only the vote_id, and the chamber it starts with, are known.
+                rows = [(vote_id, None, None, vote_id[0])
+                        for vote_id in vote_ids]
+
+            self._connection.executemany(
+                'INSERT INTO measures VALUES (?, {}, ?, ?, ?)'.format(session),
+                rows)
+
+            self._connection.executemany(
+                'INSERT INTO votes VALUES (?, ?, ?)',
+                vote_rows(member_ids, vote_ids, df[vote_ids].values))
+
+            member_of = dict(zip(names, member_ids))
+
+            for chamber, df_tSNE in embeddings.items():
+
+                coordinates = zip(normalize_names(df_tSNE.index),
+                                  df_tSNE.iloc[:, -2], df_tSNE.iloc[:, -1])
+                self._connection.executemany(
+                    'INSERT INTO embeddings VALUES (?, {}, ?, ?, ?)'.format(
+                        session),
+                    [(member_of[name], chamber, float(x), float(y))
+                     for name, x, y in coordinates if name in member_of])
+
+        return dict((table, self.count(table, session))
+                    for table in ['members', 'measures', 'votes',
+                                  'embeddings'])
+
+    def count(self, table, session):
+
+        if table == 'votes':
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM votes JOIN members USING (member_id) '
+                'WHERE session = ?', (session,)).fetchone()[0]
+
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM {} WHERE session = ?'.format(table),
+            (session,)).fetchone()[0]
+
+    def member_votes(self, name, start=None, end=None, session=None):
+        """(session, date, vote_id, value) of every vote cast by the members
+        called name (in any session, unless one is given), in date order,
+        optionally between the ISO dates start and end.
+        """
+
+        query = ['SELECT m.session, ms.date, v.vote_id, v.value',
+                 'FROM members m',
+                 'JOIN votes v ON v.member_id = m.member_id',
+                 'JOIN measures ms',
+                 'ON ms.session = m.session AND ms.vote_id = v.vote_id',
+                 'WHERE m.name = ?']
+        params = [name]
+
+        for clause, value in [('m.session = ?', session),
+                              ('ms.date >= ?', start),
+                              ('ms.date <= ?', end)]:
+
+            if value is not None:
+                query.append('AND ' + clause)
+                params.append(value)
+
+        query.append('ORDER BY ms.date')
+
+        return self._connection.execute(' '.join(query), params).fetchall()
+
+
+@click.command()
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--all', is_flag=True,
+              help='Process all available sessions data.')
+@click.option('--db', default=None, type=click.Path(),
+              help='Database file (default: '
+                   '../../data/processed/usvotes.sqlite).')
+def main(session, all, db):
+    """ Exports the processed dataframes, measures and embeddings of
+    ../processed into an indexed SQLite database, in long format.
+    """
+
+    logger = logging.getLogger(__name__)
+    logger.info('exporting processed sessions to SQLite')
+
+    report = RunReport('export_db')
+    database = VoteDatabase(db)
+    sessions = [str(x) for x in range(75, 114)] if all else [session]
+
+    with database.bulk():
+
+        for session in sessions:
+
+            in_file = os.path.join(database.data_path,
+                                   '_'.join([session, 'dataframe.csv']))
+
+            if not os.path.exists(in_file):
+                logger.info('session %s has no processed dataframe, skipped',
+                            session)
+                continue
+
+            with report.stage(session, 'read'):
+                df, measures, embeddings = read_session(database.data_path,
+                                                        session)
+
+            with report.stage(session, 'export', input=df):
+                counts = database.export_session(session, df, measures,
+                                                 embeddings)
+
+            logger.info('session %s: %s', session, ', '.join(
+                '{} {}'.format(counts[table], table)
+                for table in sorted(counts)))
+
+    database.close()
+    logger.info('%s written', database.db_file)
+
+    logger.info('run report saved in %s\n%s', report.to_file(),
+                report.summary())
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
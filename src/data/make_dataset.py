@@ -6,14 +6,19 @@ make_dataset.py
 Functions for creating a dataframe of metadata and votes per representative.
 """
 import os
+import sys
 from pathlib import Path
 import click
 import logging
 import glob2
-import json
 from collections import OrderedDict
-import numpy as np
-import pandas as pd
+
+from archive import VoteArchive, find_archive, session_archive
+from parsers import VoteParser, BACKENDS
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'instrumentation'))
+from instrument import RunReport, NullReport  # noqa: E402
 
 
 class Congress:
@@ -27,7 +32,7 @@ class Congress:
     }
     """
 
-    def __init__(self, session):
+    def __init__(self, session, archive=None, report=None, backend=None):
 
         self._ROOT = str(Path(os.getcwd()).parents[1])
         self._input_data_path = os.path.join(self._ROOT, 'data/raw/')
@@ -36,34 +41,88 @@ class Congress:
         self.measures_voted_on = {}
         self.Records = Records()
 
-    def get_measures_voted_on(self):
-        """This function parses all .json files in ../../data/raw/ and returns
-        a dict of measures voted on, sorted by the date of each measure.
+        # Without an extracted tree, fall back to ../../data/raw/<session>.zip
+        # (or .tar.gz, .tgz) when there is one.
+        if archive is None and not os.path.isdir(self.input_filepath):
+            archive = find_archive(self._input_data_path, self.session_number)
+
+        self.archive = VoteArchive(archive) if archive else None
+        self.report = report or NullReport()
+        self.parser = VoteParser(backend)
+
+    def iter_votes(self):
+        """Yields the compact parsers.Vote of every vote .json file of the
+        session (None for votes without a yea or nay), from the archive if
+        there is one, else from the extracted tree.
         """
 
+        if self.archive is not None:
+
+            for _, raw in self.archive.iter_members():
+                yield self.parser.loads(raw)
+
+            return
+
         for filename in glob2.iglob(self.input_filepath + '/**/*.json'):
 
-            with open(filename) as jfile:
+            yield self.parser.load(filename)
+
+    def get_measures_voted_on(self):
+        """This function parses all .json files in ../../data/raw/ (or in the
+        session's archive) and returns a dict of measures voted on, sorted by
+        the date of each measure.
+        """
+
+        votes = self.iter_votes()
+        done = object()
 
-                data = json.load(jfile)
+        while True:
 
-            if all(x in ['Present', 'Not Voting'] for x in data['votes'].keys()):
+            with self.report.stage(self.session_number, 'parse'):
+                vote = next(votes, done)
+
+            if vote is done:
+                break
+
+            # Only Present and Not Voting were cast.
+            if vote is None:
                 continue
 
-            vote_date = data['date']
-            measure = data['vote_id']
-            result = data['result']
-            chamber = data['chamber']
+            with self.report.stage(self.session_number, 'records'):
+                self.add_vote(vote)
+
+        self.report.annotate(self.session_number, 'records',
+                             input=self.measures_voted_on,
+                             output=self.Records._records)
+
+        return self.sort_measures(), self.Records._records
+
+    def add_vote(self, vote):
+        """Adds a parsers.Vote to the measures and records; a vote already
+        seen (same vote_id) is replaced, so members missing from its new
+        version lose it. None, for votes where only Present and Not Voting
+        were cast, is ignored.
+        """
+
+        if vote is None:
+            return
+
+        if vote.vote_id in self.measures_voted_on:
+            self.Records.remove_measure(vote.vote_id)
+
+        self.measures_voted_on[vote.vote_id] = {
+            'date': vote.date, 'result': vote.result, 'chamber': vote.chamber}
+        self.Records.build_vote_records(vote.yeas, vote.nays, vote.vote_id,
+                                        vote.chamber, self.parser.members)
 
-            self.measures_voted_on[measure] = {
-                'date': vote_date, 'result': result, 'chamber': chamber}
-            yea_votes, nay_votes = self.Records.filter_abstaining_votes(data)
-            self.Records.build_vote_records(yea_votes, nay_votes, measure, chamber)
+    def sort_measures(self):
+        """Sorts the measures voted on by date, and returns them.
+        """
 
         self.measures_voted_on = OrderedDict(
-            sorted(self.measures_voted_on.iteritems(), key=lambda x: x[1]['date']))
+            sorted(self.measures_voted_on.items(), key=lambda x: x[1]['date']))
 
-        return self.measures_voted_on, self.Records._records
+        return self.measures_voted_on
 
 
 class Records:
@@ -104,65 +163,37 @@ class Records:
                       'party': party, 'state': state, 'votes': {measure: vote}}
             self._records[name] = record
 
-    def filter_abstaining_votes(self, data):
-        """Given the initial raw data (.json files), this function is used to
-        pass over measures where 'yea' and 'nay' votes were not cast.
+    def remove_measure(self, measure):
+        """Removes the votes cast on measure, and the congressmen left with
+        no vote at all.
         """
 
-        try:
-            yes_votes = data['votes']['Aye']
-        except KeyError:
-            try:
-                yes_votes = data['votes']['Yea']
-            except KeyError:
-                yes_votes = []
-
-        try:
-            no_votes = data['votes']['No']
-        except KeyError:
-            try:
-                no_votes = data['votes']['Nay']
-            except KeyError:
-                no_votes = []
+        for name, record in list(self._records.items()):
+            record['votes'].pop(measure, None)
 
-        return yes_votes, no_votes
+            if not record['votes']:
+                del self._records[name]
 
-    def format_record_entry(self, measure, record, vote_cast, chamber):
+    def format_record_entry(self, measure, member, vote_cast, chamber):
         """Used in the build_vote_records method depending on vote_cast.
         """
 
-        name = record['display_name'].split(' ')[0].strip(',').title()
-        congress_id = record['id']
-        party = record['party']
-        state = record['state']
-        vote = vote_cast
-        self.update_congressman(
-            name, congress_id, chamber, party, state, measure, vote)
-
-    def build_vote_records(self, yes_votes, no_votes, measure, chamber):
-        """Primary function used to build the records dict per congressman. Makes
-        use of Records.update_congressman and Records.format_record_entry.
-        """
-
-        if yes_votes:
-
-            for record in yes_votes:
+        self.update_congressman(member.name, member.congress_id, chamber,
+                                member.party, member.state, measure, vote_cast)
 
-                if record == "VP":
-                    continue
-
-                vote = 1
-                self.format_record_entry(measure, record, vote, chamber)
-
-        if no_votes:
-
-            for record in no_votes:
+    def build_vote_records(self, yes_votes, no_votes, measure, chamber,
+                           members):
+        """Primary function used to build the records dict per congressman,
+        from the yea and nay keys of a parsers.Vote and the parsers.Member
+        they map to. Makes use of Records.update_congressman and
+        Records.format_record_entry.
+        """
 
-                if record == "VP":
-                    continue
+        for key in yes_votes:
+            self.format_record_entry(measure, members[key], 1, chamber)
 
-                vote = 0
-                self.format_record_entry(measure, record, vote, chamber)
+        for key in no_votes:
+            self.format_record_entry(measure, members[key], 0, chamber)
 
 
 class Dataset:
@@ -175,7 +206,6 @@ class Dataset:
 
         self._ROOT = str(Path(os.getcwd()).parents[1])
         self._data_path = os.path.join(self._ROOT, 'data/processed/')
-        self._rows = []
 
     def to_file(self, session, dataframe):
         """Produces a human-readable csv file, saved in ../../data/processed/,
@@ -186,41 +216,77 @@ class Dataset:
         out_file = os.path.join(self._data_path, filehandle)
         dataframe.to_csv(out_file, encoding='utf-8')
 
-    def construct(self, measures_voted_on, voting_records):
-        """Returns pandas dataframe object with the following form:
-        RepName     Party   State   Chamber     Measure1    Measure2    ...
-        Smith       D       CA      s           1           0
+        return out_file
 
-        Note that currently a -1 is passed if a vote is not cast.
+    def measures_to_file(self, session, measures_voted_on):
+        """Produces a csv file of measure metadata (vote_id, date, result,
+        chamber), saved in ../../data/processed/. Rows follow the date order of
+        the measure columns written by to_file.
         """
 
-        for rep in voting_records.keys():
+        import pandas as pd
+
+        rows = [(measure, v['date'], v['result'], v['chamber'])
+                for measure, v in measures_voted_on.items()]
+        df = pd.DataFrame(data=rows,
+                          columns=['vote_id', 'date', 'result', 'chamber'])
+
+        filehandle = '_'.join([str(session), 'measures.csv'])
+        out_file = os.path.join(self._data_path, filehandle)
+        df.to_csv(out_file, index=False, encoding='utf-8')
 
-            row = [rep, voting_records[rep]['party'], voting_records[
-                rep]['state'], voting_records[rep]['chamber']]
+    def construct(self, measures_voted_on, voting_records, dtype='float64'):
+        """Returns pandas dataframe object with the following form:
+        RepName     Party   State   Chamber     Measure1    Measure2    ...
+        Smith       D       CA      s           1           0
 
-            for measure in measures_voted_on:
+        Note that currently a -1 is passed if a vote is not cast. Votes are
+        filled into a preallocated matrix of dtype, e.g. int8 to store them in
+        one byte each.
+        """
 
-                try:
+        import numpy as np
+        import pandas as pd
 
-                    row.append(voting_records[rep]['votes'][measure])
+        measures = list(measures_voted_on)
+        column = dict((measure, j) for j, measure in enumerate(measures))
+        reps = list(voting_records.keys())
+        votes = np.full((len(reps), len(measures)), -1, dtype=dtype)
 
-                except KeyError:
+        for i, rep in enumerate(reps):
 
-                    row.append(-1.0)  # row.append(np.nan)
+            for measure, vote in voting_records[rep]['votes'].items():
 
-            self._rows.append(row)
+                votes[i, column[measure]] = vote
 
-        columns = ['Name', 'Party', 'State', 'Chamber'] + measures_voted_on.keys()
-        df = pd.DataFrame(data=self._rows, columns=columns)
+        df = pd.DataFrame(votes, columns=measures)
+        df.insert(0, 'Name', reps)
+        df.insert(1, 'Party', [voting_records[rep]['party'] for rep in reps])
+        df.insert(2, 'State', [voting_records[rep]['state'] for rep in reps])
+        df.insert(3, 'Chamber',
+                  [voting_records[rep]['chamber'] for rep in reps])
         df = df.set_index('Name')
         return df
 
 
 @click.command()
-@click.option('--session', default='113', help='Which session of Congress? (int)')
-@click.option('--all', is_flag=True, help='Process all available sessions data.')
-def main(session, all):
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--all', is_flag=True,
+              help='Process all available sessions data.')
+@click.option('--archive', default=None, type=click.Path(exists=True),
+              help='zip or tar.gz of the session\'s raw data, read without '
+                   'extracting; with --all, a directory of <session>.zip '
+                   '(or .tar.gz) archives.')
+@click.option('--precision', default='float64',
+              type=click.Choice(['float64', 'float32']),
+              help='float32 stores the votes as int8.')
+@click.option('--backend', default=None, type=click.Choice(BACKENDS),
+              help='JSON parser of the vote files (default: fastest '
+                   'installed).')
+@click.option('--profile', is_flag=True,
+              help='Also save cProfile statistics of the run.')
+def main(session, all, archive, precision, backend, profile):
     """ Runs data processing scripts to turn raw data from (../raw) into
     cleaned data ready to be analyzed (saved in ../processed).
 
@@ -228,26 +294,37 @@ def main(session, all):
     measures voted on, ordered by vote_id.
     """
 
+    if all and archive and not os.path.isdir(archive):
+        raise click.UsageError('--archive with --all must be a directory of '
+                               '<session>.zip (or .tar.gz) archives')
+
     logger = logging.getLogger(__name__)
     logger.info('Making final data set from raw data')
 
-    if all:
+    report = RunReport('make_dataset', profile=profile)
+    sessions = [str(x) for x in range(75, 114)] if all else [session]
 
-        for x in range(75, 114):
+    for session in sessions:
 
-            session = str(x)
-            congress = Congress(session)
-            measures_voted_on, records = congress.get_measures_voted_on()
+        congress = Congress(session,
+                            archive=session_archive(archive, session),
+                            report=report, backend=backend)
+        measures_voted_on, records = congress.get_measures_voted_on()
 
-            dataframe = Dataset().construct(measures_voted_on, records)
-            Dataset().to_file(session, dataframe)
+        with report.stage(session, 'matrix', input=records):
+            dataframe = Dataset().construct(
+                measures_voted_on, records,
+                dtype='int8' if precision == 'float32' else 'float64')
 
-    else:
-        congress = Congress(session)
-        measures_voted_on, records = congress.get_measures_voted_on()
+        with report.stage(session, 'write', input=dataframe):
+            out_file = Dataset().to_file(session, dataframe)
+            Dataset().measures_to_file(session, measures_voted_on)
+
+        report.annotate(session, 'matrix', output=dataframe)
+        report.annotate(session, 'write', output=out_file)
 
-        dataframe = Dataset().construct(measures_voted_on, records)
-        Dataset().to_file(session, dataframe)
+    logger.info('run report saved in %s\n%s', report.to_file(),
+                report.summary())
 
 if __name__ == '__main__':
     log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
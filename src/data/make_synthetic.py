@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+"""
+make_synthetic.py
+---------------------
+Functions for writing a synthetic session of raw vote files, with the same
+schema as the govtrack data read by make_dataset.py, so that every stage can
+be run and timed offline at any scale.
+"""
+import os
+import json
+import shutil
+import zipfile
+from pathlib import Path
+import click
+import logging
+import numpy as np
+
+
+STATES = ['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA',
+          'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD',
+          'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ',
+          'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC',
+          'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY']
+
+# Members per chamber and number of measures; explicit options override these.
+PRESETS = {
+    'tiny': {'senators': 20, 'representatives': 60, 'measures': 100},
+    'small': {'senators': 100, 'representatives': 435, 'measures': 200},
+    'real': {'senators': 100, 'representatives': 435, 'measures': 1800},
+    '10x': {'senators': 1000, 'representatives': 4350, 'measures': 1800},
+}
+
+
+class SyntheticCongress:
+    """Generates the votes of a session from a one-dimensional spatial model:
+    members have ideal points around their party's center, and each measure
+    is either partisan (a cutpoint near the middle) or bipartisan (a cutpoint
+    far to one side). A member votes yea when
+
+        direction * ideal_point + noise > cutpoint,
+
+    where noise grows as party cohesion drops. Abstentions ('Not Voting'),
+    'Present' votes and the Vice President's tie-breakers ("VP") are mixed in.
+    """
+
+    def __init__(self, session, senators=100, representatives=435,
+                 measures=1800, democrats=0.48, independents=0.02,
+                 cohesion=0.8, bipartisan=0.3, abstention=0.05, present=0.005,
+                 senate_share=0.4, seed=0):
+
+        self._session_number = str(session)
+        self._rng = np.random.RandomState(seed)
+        self._n_measures = measures
+        self._cohesion = cohesion
+        self._bipartisan = bipartisan
+        self._abstention = abstention
+        self._present = present
+        self._senate_share = senate_share
+
+        # Sessions past the real ones (e.g. the default 900) are dated 2013.
+        try:
+            self._year = 1789 + 2 * (min(int(session), 113) - 1)
+
+        except ValueError:
+            self._year = 2013
+
+        self._members = {
+            's': self.make_members('s', senators, democrats, independents),
+            'h': self.make_members('h', representatives, democrats,
+                                   independents)}
+
+    @property
+    def session_number(self):
+        return self._session_number
+
+    @property
+    def members(self):
+        return self._members
+
+    def make_members(self, chamber, n_members, democrats, independents):
+        """Member records as they appear in the raw files, plus ideal points.
+        """
+
+        n_dem = int(round(n_members * democrats))
+        n_ind = int(round(n_members * independents))
+        n_rep = n_members - n_dem - n_ind
+        parties = np.array(['D'] * n_dem + ['I'] * n_ind + ['R'] * n_rep)
+        self._rng.shuffle(parties)
+
+        center = np.where(parties == 'D', -1.,
+                          np.where(parties == 'R', 1., -0.5))
+        ideal = center + self._rng.normal(0, 0.3, n_members)
+        prefix = 'Sen' if chamber == 's' else 'Rep'
+
+        records = [{'display_name': '{}{:05d}'.format(prefix, i),
+                    'id': '{}{:05d}'.format(chamber.upper(), i),
+                    'party': party, 'state': STATES[i % len(STATES)]}
+                   for i, party in enumerate(parties)]
+
+        return {'records': records, 'ideal': ideal}
+
+    def measures(self):
+        """Yields the content of every vote file, in date order.
+        """
+
+        n_senate = int(round(self._n_measures * self._senate_share))
+        chambers = np.array(['s'] * n_senate +
+                            ['h'] * (self._n_measures - n_senate))
+        self._rng.shuffle(chambers)
+
+        start = np.datetime64('{}-01-03T12:00'.format(self._year))
+        minutes = np.sort(self._rng.randint(0, 2 * 365 * 24 * 60,
+                                            self._n_measures))
+        counts = {'s': 0, 'h': 0}
+
+        for chamber, minute in zip(chambers, minutes):
+
+            counts[chamber] += 1
+            members = self.members[chamber]
+            n_members = len(members['records'])
+
+            direction = self._rng.choice([-1., 1.])
+
+            if self._rng.rand() < self._bipartisan:
+                cutpoint = self._rng.normal(-2.5, 0.5)
+
+            else:
+                cutpoint = self._rng.normal(0., 0.3)
+
+            noise = self._rng.normal(0, 1.5 * (1 - self._cohesion) + 0.05,
+                                     n_members)
+            yea = direction * members['ideal'] + noise > cutpoint
+            status = self._rng.rand(n_members)
+
+            votes = {}
+
+            if chamber == 's' or self._rng.rand() < 0.5:
+                yea_key, nay_key = 'Yea', 'Nay'
+
+            else:
+                yea_key, nay_key = 'Aye', 'No'
+
+            voting = status >= self._abstention + self._present
+            groups = [(yea_key, yea & voting), (nay_key, ~yea & voting),
+                      ('Not Voting', status < self._abstention),
+                      ('Present', (status >= self._abstention) & ~voting)]
+
+            for key, mask in groups:
+                votes[key] = [members['records'][i]
+                              for i in np.flatnonzero(mask)]
+
+            n_yea, n_nay = len(votes[yea_key]), len(votes[nay_key])
+
+            if chamber == 's' and n_yea == n_nay:
+                votes[yea_key].append('VP')
+                n_yea += 1
+
+            date = (start + np.timedelta64(int(minute), 'm')).astype(object)
+
+            yield {'vote_id': '{}{}-{}.{}'.format(
+                       chamber, counts[chamber], self.session_number,
+                       date.year),
+                   'chamber': chamber, 'congress': self.session_number,
+                   'date': date.strftime('%Y-%m-%dT%H:%M:00-05:00'),
+                   'number': counts[chamber], 'requires': '1/2',
+                   'result': 'Passed' if n_yea > n_nay else 'Failed',
+                   'votes': votes}
+
+    def to_files(self, raw_path, archive=False):
+        """Writes ../../data/raw/<session>/votes/<year>/<vote>/data.json, like
+        the govtrack tree, or the same layout inside
+        ../../data/raw/<session>.zip.
+        """
+
+        def member_name(data):
+            year = data['vote_id'].split('.')[-1]
+            vote = data['vote_id'].split('-')[0]
+            return '/'.join([self.session_number, 'votes', year, vote,
+                             'data.json'])
+
+        if archive:
+
+            filename = os.path.join(raw_path, self.session_number + '.zip')
+
+            with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zfile:
+
+                for data in self.measures():
+                    zfile.writestr(member_name(data), json.dumps(data))
+
+            return filename
+
+        for data in self.measures():
+
+            filename = os.path.join(raw_path, member_name(data))
+
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+
+            with open(filename, 'w') as jfile:
+                json.dump(data, jfile)
+
+        return os.path.join(raw_path, self.session_number)
+
+
+@click.command()
+@click.option('--session', default='900',
+              help='Session number to write (int).')
+@click.option('--preset', default='real', type=click.Choice(sorted(PRESETS)),
+              help='Size of the session; 10x has ten times the members of a '
+                   'real one.')
+@click.option('--senators', default=None, type=int,
+              help='Members of the Senate.')
+@click.option('--representatives', default=None, type=int,
+              help='Members of the House.')
+@click.option('--measures', default=None, type=int,
+              help='Measures voted on, both chambers.')
+@click.option('--democrats', default=0.48,
+              help='Share of Democrats per chamber.')
+@click.option('--independents', default=0.02,
+              help='Share of Independents per chamber.')
+@click.option('--cohesion', default=0.8,
+              help='Party discipline, from 0 (random) to 1.')
+@click.option('--bipartisan', default=0.3,
+              help='Share of measures most members support.')
+@click.option('--abstention', default=0.05, help='Probability of not voting.')
+@click.option('--seed', default=0, help='Random seed.')
+@click.option('--archive', is_flag=True,
+              help='Write a zip instead of a tree of files.')
+@click.option('--force', is_flag=True,
+              help='Replace existing raw data of the session.')
+def main(session, preset, senators, representatives, measures, democrats,
+         independents, cohesion, bipartisan, abstention, seed, archive,
+         force):
+    """ Writes a synthetic session of raw vote files to ../../data/raw/.
+    """
+    logger = logging.getLogger(__name__)
+
+    raw_path = os.path.join(str(Path(os.getcwd()).parents[1]), 'data/raw/')
+    targets = [os.path.join(raw_path, session),
+               os.path.join(raw_path, session + '.zip')]
+
+    if any(os.path.exists(target) for target in targets):
+
+        if not force:
+            raise click.ClickException('raw data of session {} exists; use '
+                                       '--force to replace it'.format(session))
+
+        for target in targets:
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            elif os.path.isfile(target):
+                os.remove(target)
+
+    sizes = dict(PRESETS[preset])
+    sizes.update((k, v) for k, v in [('senators', senators),
+                                     ('representatives', representatives),
+                                     ('measures', measures)]
+                 if v is not None)
+    logger.info('writing synthetic session %s: %s', session, sizes)
+
+    congress = SyntheticCongress(session, democrats=democrats,
+                                 independents=independents,
+                                 cohesion=cohesion, bipartisan=bipartisan,
+                                 abstention=abstention, seed=seed, **sizes)
+    logger.info('wrote %s', congress.to_files(raw_path, archive=archive))
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
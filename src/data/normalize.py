@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""
+normalize.py
+---------------------
+Functions shared by ../features and ../visualization for normalizing the
+names and parties of the processed dataframes. Each distinct value is
+normalized once (and cached across sessions), parties become a categorical
+with a single vocabulary, and a name -> row index replaces boolean scans.
+"""
+import unicodedata as ucd
+from collections import OrderedDict
+
+
+# Party labels found in the raw data, and the code each one is stored as.
+PARTIES = OrderedDict([('Democrat', 'D'), ('D', 'D'),
+                       ('Republican', 'R'), ('R', 'R'),
+                       ('Independent', 'I'), ('I', 'I'),
+                       ('Ind. Democrat', 'ID'), ('ID', 'ID'),
+                       ('Progressive', 'P'), ('P', 'P'),
+                       ('Farmer-Labor', 'F'), ('F', 'F'),
+                       ('American Labor', 'AL'), ('AL', 'AL')])
+
+PARTY_CODES = list(OrderedDict.fromkeys(PARTIES.values()))
+
+_names = {}
+
+
+def normalize_name(name):
+
+    try:
+        return _names[name]
+
+    except KeyError:
+        _names[name] = ucd.normalize('NFKD', name.title())
+        return _names[name]
+
+
+def map_unique(values, func):
+    """Apply func once per distinct value of values and broadcast the
+    results back; missing values stay missing.
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values)
+    mapped = np.array([func(value) for value in uniques] + [np.nan],
+                      dtype=object)
+
+    return mapped[codes]
+
+
+def normalize_names(names):
+    return map_unique(names, normalize_name)
+
+
+def normalize_parties(parties):
+    """Party codes as a categorical over PARTY_CODES; unknown labels are NaN.
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    codes = map_unique(parties, lambda party: PARTIES.get(party, np.nan))
+
+    return pd.Categorical(codes, categories=PARTY_CODES)
+
+
+def normalize_records(df):
+    """Normalizes Name (column or index) and Party of a processed dataframe,
+    in place, and returns it.
+    """
+
+    import pandas as pd
+
+    if 'Name' in df.columns:
+        df['Name'] = normalize_names(df['Name'])
+
+    else:
+        df.index = pd.Index(normalize_names(df.index), name=df.index.name)
+
+    df['Party'] = normalize_parties(df['Party'])
+
+    return df
+
+
+class NameIndex:
+    """Row position of every name, for O(1) lookups of members.
+    """
+
+    def __init__(self, names):
+        self._rows = dict((name, row) for row, name in enumerate(names))
+
+    def __contains__(self, name):
+        return normalize_name(name) in self._rows
+
+    def __getitem__(self, name):
+        return self._rows[normalize_name(name)]
+
+    def rows(self, names):
+
+        import numpy as np
+
+        return np.array([self[name] for name in names], dtype=int)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""
+parsers.py
+---------------------
+Functions for reading the govtrack vote .json files of ../../data/raw/ into
+compact records of only what make_dataset uses: vote_id, date, result,
+chamber and the members who voted yea or nay. The JSON backend is the fastest
+one installed (orjson, ujson, simplejson), else the standard library's json.
+"""
+import json
+from collections import namedtuple
+
+
+BACKENDS = ['orjson', 'ujson', 'simplejson', 'json']
+
+# Aliases of the two votes that are kept, in order of precedence: House
+# votes are recorded as Aye/No, Senate votes as Yea/Nay.
+YEA = ['Aye', 'Yea']
+NAY = ['No', 'Nay']
+ABSTAIN = ['Present', 'Not Voting']
+
+# One vote .json, compact: yeas and nays are the display names of the members
+# who voted so, keys of the Member table kept by VoteParser.
+Vote = namedtuple('Vote', ['vote_id', 'date', 'result', 'chamber', 'yeas',
+                           'nays'])
+Member = namedtuple('Member', ['name', 'congress_id', 'party', 'state'])
+
+
+def load_backend(name=None):
+    """Returns (name, loads) of the JSON backend called name, or of the first
+    one of BACKENDS that can be imported.
+    """
+
+    for backend in [name] if name else BACKENDS:
+
+        try:
+            module = __import__(backend)
+
+        except ImportError:
+
+            if name:
+                raise
+
+            continue
+
+        return backend, json_loads if backend == 'json' else module.loads
+
+
+def json_loads(raw):
+    # The standard library's json is faster on text than on bytes in 2.7.
+    return json.loads(raw.decode('utf-8'))
+
+
+def member_name(display_name):
+    """Last name of a member, e.g. 'Sanders (I-VT)' -> 'Sanders'.
+    """
+
+    return display_name.split(' ')[0].strip(',').title()
+
+
+def cast_votes(votes):
+    """(yea, nay) lists of the raw member entries of a vote's 'votes' dict,
+    with the Aye/Yea and No/Nay aliases resolved; [] when nobody voted so.
+    """
+
+    yeas = next((votes[key] for key in YEA if key in votes), [])
+    nays = next((votes[key] for key in NAY if key in votes), [])
+
+    return yeas, nays
+
+
+def member_keys(entries, members):
+    """Display names of a list of raw member entries, adding the members not
+    seen before to members. The vice president, recorded as the string 'VP'
+    when breaking a tie in the Senate, is not a member.
+    """
+
+    keys = [e['display_name'] for e in entries if e != 'VP']
+
+    if set(keys).difference(members):
+
+        for e in entries:
+
+            if e != 'VP' and e['display_name'] not in members:
+                members[e['display_name']] = Member(
+                    member_name(e['display_name']), e['id'], e['party'],
+                    e['state'])
+
+    return keys
+
+
+def compact_vote(data, members):
+    """Vote of the content of a vote .json, or None if only Present and Not
+    Voting were cast. New members are added to members.
+    """
+
+    votes = data['votes']
+
+    if all(key in ABSTAIN for key in votes):
+        return None
+
+    yeas, nays = cast_votes(votes)
+
+    return Vote(data['vote_id'], data['date'], data['result'], data['chamber'],
+                member_keys(yeas, members), member_keys(nays, members))
+
+
+class VoteParser:
+    """Parses raw vote .json files, as bytes, into compact Vote records, and
+    keeps the Member of every display name, as first seen:
+
+    Vote(vote_id='h62-113', date='2013-02-15T...', result='Passed',
+         chamber='h', yeas=['Pelosi (D-CA)', ...], nays=[...])
+    members = {'Pelosi (D-CA)': Member(name='Pelosi', congress_id='P000197',
+                                       party='Democrat', state='CA'), ...}
+    """
+
+    def __init__(self, backend=None):
+        self._backend, self._loads = load_backend(backend)
+        self._members = {}
+
+    @property
+    def backend(self):
+        return self._backend
+
+    @property
+    def members(self):
+        return self._members
+
+    def loads(self, raw):
+        """Vote of the raw bytes of a vote .json, or None (see compact_vote).
+        """
+
+        return compact_vote(self._loads(raw), self._members)
+
+    def load(self, filename):
+
+        with open(filename, 'rb') as jfile:
+
+            return self.loads(jfile.read())
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+
+"""
+affinities.py
+---------------------
+Functions for computing the input affinities P of t-SNE (nearest neighbors
+and perplexity-calibrated probabilities) once per input matrix and reusing
+them: P is cached in ../../data/interim/affinities/, keyed by a hash of the
+matrix and the perplexity, so that runs of the same session and chamber that
+only change the seed, learning rate, iterations or output skip that step.
+"""
+import os
+import inspect
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+import numpy as np
+import scipy.sparse as sp
+
+
+# Cached affinities of the t-SNE fitted in the current thread, if any.
+_local = threading.local()
+_originals = {}
+
+
+def tsne_module():
+    """scikit-learn's t-SNE implementation; t_sne became _t_sne in 0.22.
+    """
+
+    try:
+        from sklearn.manifold import _t_sne as module
+
+    except ImportError:
+        from sklearn.manifold import t_sne as module
+
+    return module
+
+
+def layout():
+    """How this scikit-learn's t-SNE finds the neighbors of each row:
+    'nearest_neighbors' with NearestNeighbors (0.19 and later), 'ball_tree'
+    with a BallTree queried for 3 * perplexity + 2 rows including the row
+    itself (0.18), or None if it does neither.
+    """
+
+    module = tsne_module()
+
+    if hasattr(module, 'NearestNeighbors'):
+        return 'nearest_neighbors'
+
+    if hasattr(module, 'BallTree'):
+        return 'ball_tree'
+
+    return None
+
+
+def supported():
+    """True if the affinities of this scikit-learn's t-SNE can be cached.
+    Only the Barnes-Hut method is covered: the exact one calibrates P over
+    all n x n distances of every fit.
+    """
+
+    return layout() is not None
+
+
+def argnames(func):
+
+    try:
+        return list(inspect.signature(func).parameters)
+
+    except AttributeError:
+        return inspect.getargspec(func).args
+
+
+def n_neighbors_of(n_samples, perplexity):
+    """Neighbors t-SNE searches for, as in TSNE._fit: 3 * perplexity + 1.
+    """
+
+    return min(n_samples - 1, int(3. * perplexity + 1))
+
+
+def knn_graph(distances, neighbors):
+    """CSR (n x n) matrix of the distances of every row to its neighbors, as
+    built by NearestNeighbors.kneighbors_graph.
+    """
+
+    n_samples, k = neighbors.shape
+    indptr = np.arange(0, n_samples * k + 1, k)
+
+    return sp.csr_matrix((distances.ravel(), neighbors.ravel(), indptr),
+                         shape=(n_samples, n_samples))
+
+
+def joint_probabilities(distances, neighbors, perplexity):
+    """P from the Euclidean distances of every row to its neighbors, with
+    scikit-learn's own _joint_probabilities_nn; it took the distances and
+    neighbors as arrays before 0.22, and as a sparse graph since.
+    """
+
+    module = tsne_module()
+    func = _originals.get('_joint_probabilities_nn',
+                          module._joint_probabilities_nn)
+
+    if 'neighbors' in argnames(func):
+        return func(distances ** 2, neighbors, perplexity, 0)
+
+    return func(knn_graph(distances ** 2, neighbors), perplexity, 0)
+
+
+class _CachedNeighbors:
+    """Stands in for the NearestNeighbors of TSNE._fit: returns the cached
+    neighbors instead of searching for them.
+    """
+
+    def __init__(self, affinities):
+        self._affinities = affinities
+
+    def fit(self, X, y=None):
+        return self
+
+    def kneighbors(self, X=None, n_neighbors=None, return_distance=True):
+
+        distances, neighbors = self._affinities.neighbors
+
+        if return_distance:
+            return distances.copy(), neighbors.copy()
+
+        return neighbors.copy()
+
+    def kneighbors_graph(self, X=None, n_neighbors=None, mode='distance'):
+        return knn_graph(*self._affinities.neighbors)
+
+
+class _CachedBallTree:
+    """Stands in for the BallTree of TSNE._fit on scikit-learn 0.18: a query
+    for the cached neighbor count returns the cached neighbors, any other
+    one goes to a real BallTree.
+    """
+
+    def __init__(self, affinities, X, *args, **kwargs):
+        self._affinities = affinities
+        self._tree = lambda: _originals['BallTree'](X, *args, **kwargs)
+
+    def query(self, X, k=1, *args, **kwargs):
+
+        if k != self._affinities.n_neighbors + 1:
+            return self._tree().query(X, k, *args, **kwargs)
+
+        # This fit searches for the cached neighbors: its P is the cached P.
+        _local.matched = self._affinities
+        distances, neighbors = self._affinities.neighbors
+
+        return distances.copy(), neighbors.copy()
+
+
+def _nearest_neighbors(*args, **kwargs):
+
+    affinities = getattr(_local, 'affinities', None)
+
+    if (affinities is not None and
+            kwargs.get('n_neighbors') == affinities.n_neighbors and
+            kwargs.get('metric', 'euclidean') == 'euclidean'):
+        # This fit searches for the cached neighbors: its P is the cached P.
+        _local.matched = affinities
+        return _CachedNeighbors(affinities)
+
+    return _originals['NearestNeighbors'](*args, **kwargs)
+
+
+def _ball_tree(X, *args, **kwargs):
+
+    affinities = getattr(_local, 'affinities', None)
+
+    if affinities is not None and affinities.is_input(X):
+        return _CachedBallTree(affinities, X, *args, **kwargs)
+
+    return _originals['BallTree'](X, *args, **kwargs)
+
+
+def _joint_probabilities_nn(*args, **kwargs):
+
+    affinities = getattr(_local, 'matched', None)
+
+    if affinities is not None:
+        _local.matched = None
+        # t-SNE scales P in place during early exaggeration.
+        return affinities.P.copy()
+
+    return _originals['_joint_probabilities_nn'](*args, **kwargs)
+
+
+# Stand-in for the neighbor search of each layout().
+_SEARCHES = {'nearest_neighbors': ('NearestNeighbors', _nearest_neighbors),
+             'ball_tree': ('BallTree', _ball_tree)}
+
+
+def install():
+    """Routes the neighbor search and P of scikit-learn's t-SNE through the
+    cache, for fits inside Affinities.fitting() (others are unaffected). As
+    with getSteps, module attributes of sklearn.manifold are replaced. Does
+    nothing where the cache is not supported().
+    """
+
+    module = tsne_module()
+
+    if not _originals and supported():
+        name, search = _SEARCHES[layout()]
+        _originals[name] = getattr(module, name)
+        _originals['_joint_probabilities_nn'] = module._joint_probabilities_nn
+        setattr(module, name, search)
+        module._joint_probabilities_nn = _joint_probabilities_nn
+
+
+class Affinities:
+    """t-SNE affinities P of the rows of X for a perplexity, with the
+    neighbors and distances they come from. Once computed they are saved as
+
+    ../../data/interim/affinities/<key>.npz
+    = {"data", "indices", "indptr", "distances", "neighbors", "label"}
+
+    where key is the md5 of X, its shape and dtype, the perplexity and the
+    layout(); any t-SNE of X fitted inside fitting() uses them. On
+    scikit-learn 0.18 P is the condensed (n * (n - 1) / 2) array t-SNE uses
+    there, saved as "condensed" instead of "data", "indices" and "indptr".
+    """
+
+    def __init__(self, X, perplexity=30., label='', n_jobs=-1,
+                 cache_path=None):
+
+        self._ROOT = str(Path(os.getcwd()).parents[1])
+        self._cache_path = cache_path or os.path.join(
+            self._ROOT, 'data/interim/affinities/')
+        self._X = np.ascontiguousarray(X)
+        self._perplexity = float(perplexity)
+        self._n_neighbors = n_neighbors_of(len(self._X), self._perplexity)
+        self._label = label
+        self._n_jobs = n_jobs
+        self._P = None
+        self._neighbors = None
+
+        blob = hashlib.md5(self._X.tobytes())
+        blob.update(repr((self._X.shape, self._X.dtype.str,
+                          self._perplexity, layout())).encode('utf-8'))
+        self._key = blob.hexdigest()
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def n_neighbors(self):
+        return self._n_neighbors
+
+    @property
+    def cache_file(self):
+        return os.path.join(self._cache_path, '.'.join([self._key, 'npz']))
+
+    @property
+    def P(self):
+
+        if self._P is None:
+            self.get()
+
+        return self._P
+
+    @property
+    def neighbors(self):
+        """(distances, neighbors), both (n x n_neighbors), or n_neighbors + 1
+        columns starting with the row itself on scikit-learn 0.18.
+        """
+
+        if self._neighbors is None:
+            self.get()
+
+        return self._neighbors
+
+    def load(self):
+        """True if the affinities were read from the cache.
+        """
+
+        try:
+            cached = np.load(self.cache_file)
+
+        except (IOError, OSError):
+            return False
+
+        with cached:
+            n_samples = len(self._X)
+
+            if 'condensed' in cached.files:
+                self._P = cached['condensed']
+
+            else:
+                self._P = sp.csr_matrix(
+                    (cached['data'], cached['indices'], cached['indptr']),
+                    shape=(n_samples, n_samples))
+
+            self._neighbors = cached['distances'], cached['neighbors']
+
+        return True
+
+    def compute(self):
+        """Searches for the neighbors, on n_jobs threads, and computes P.
+        """
+
+        if not supported():
+            raise RuntimeError('t-SNE affinities cannot be cached with '
+                               'this version of scikit-learn')
+
+        install()
+
+        if layout() == 'ball_tree':
+            self._compute_ball_tree()
+            return
+
+        knn = _originals['NearestNeighbors'](
+            algorithm='auto', n_neighbors=self._n_neighbors,
+            n_jobs=self._n_jobs).fit(self._X)
+        distances, neighbors = knn.kneighbors(None,
+                                              n_neighbors=self._n_neighbors)
+        self._neighbors = distances, neighbors
+        self._P = sp.csr_matrix(joint_probabilities(distances, neighbors,
+                                                    self._perplexity))
+
+    def _compute_ball_tree(self):
+        """P as TSNE._fit computes it on scikit-learn 0.18: the neighbors
+        come from a BallTree, and the perplexity is calibrated on the
+        squared distances of all pairs.
+        """
+
+        from sklearn.metrics.pairwise import pairwise_distances
+
+        X = self._X.astype(np.float64)
+        distances, neighbors = _originals['BallTree'](X).query(
+            X, k=self._n_neighbors + 1)
+        self._neighbors = distances, neighbors
+        self._P = _originals['_joint_probabilities_nn'](
+            pairwise_distances(X, squared=True), neighbors[:, 1:],
+            self._perplexity, 0)
+
+    def is_input(self, X):
+        """True if X holds the values of the rows these affinities are of.
+        """
+
+        return (np.shape(X) == self._X.shape and
+                np.array_equal(X, self._X))
+
+    def save(self):
+        """Writes the cache file atomically, so that concurrent runs never
+        read a partial one.
+        """
+
+        if not os.path.isdir(self._cache_path):
+            os.makedirs(self._cache_path)
+
+        handle, tmp_file = tempfile.mkstemp(suffix='.npz',
+                                            dir=self._cache_path)
+        os.close(handle)
+        if sp.issparse(self._P):
+            P = dict(data=self._P.data, indices=self._P.indices,
+                     indptr=self._P.indptr)
+
+        else:
+            P = dict(condensed=self._P)
+
+        np.savez(tmp_file, distances=self._neighbors[0],
+                 neighbors=self._neighbors[1], label=np.array(self._label),
+                 **P)
+        os.rename(tmp_file, self.cache_file)
+
+    def get(self):
+        """Loads the affinities, or computes and caches them. Returns self.
+        """
+
+        if not self.load():
+            self.compute()
+            self.save()
+
+        return self
+
+    @contextmanager
+    def fitting(self):
+        """t-SNE fits of X in the body use these affinities. Where the cache
+        is not supported(), they compute their own, as without it.
+        """
+
+        if not supported():
+            yield self
+            return
+
+        install()
+        self.get()
+        previous = getattr(_local, 'affinities', None)
+        _local.affinities = self
+
+        try:
+            yield self
+
+        finally:
+            _local.affinities = previous
+            _local.matched = None
+
+
+def fit_transform(tsne, X, label=''):
+    """tsne.fit_transform(X), with cached affinities for its perplexity.
+    """
+
+    with Affinities(X, perplexity=tsne.perplexity, label=label).fitting():
+        return tsne.fit_transform(X)
@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+
+"""
+all_congress.py
+---------------------
+Functions for embedding every member of every session, Senate and House
+together, as one body. The combined vote matrix (thousands of members by tens
+of thousands of measures) is never held in memory: sessions are streamed from
+../../data/processed/ into sparse blocks on disk, reduced with a randomized
+SVD that reads one block at a time, and only the reduced features are
+embedded with t-SNE. Every step checkpoints to
+../../data/interim/all_congress/<first>_<last>/ so that an interrupted run of
+the same sessions resumes where it stopped.
+"""
+import os
+from pathlib import Path
+import click
+import logging
+import datetime
+import unicodedata as ucd
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from build_features import Features, load_pyplot
+
+
+class SparseBlocks:
+    """Streams the processed sessions into one sparse block per session, with
+    rows indexed by a global member table and votes coded 1 yea, -1 nay and 0
+    (not stored) when no vote was cast. The member table depends on every
+    session before, so blocks are kept per range of sessions, in
+    all_congress/<first>_<last>/, and look like this on disk:
+
+    block_113.npz = {"row", "col", "data", "n_cols"}
+    members.csv   = Key, Name, State, Party, Chamber, First, Last
+    """
+
+    def __init__(self, sessions, chunksize=200):
+
+        self._ROOT = str(Path(os.getcwd()).parents[1])
+        self._input_data_path = os.path.join(self._ROOT, 'data/processed/')
+        self._sessions = [str(s) for s in sessions]
+        self._work_path = os.path.join(
+            self._ROOT, 'data/interim/all_congress/',
+            '_'.join([self._sessions[0], self._sessions[-1]]))
+        self._chunksize = chunksize
+        self._members = OrderedMembers(os.path.join(self._work_path,
+                                                    'members.csv'))
+
+        if not os.path.isdir(self._work_path):
+            os.makedirs(self._work_path)
+
+    @property
+    def members(self):
+        return self._members
+
+    @property
+    def work_path(self):
+        return self._work_path
+
+    @property
+    def chunksize(self):
+        return self._chunksize
+
+    def block_file(self, session):
+        return os.path.join(self._work_path,
+                            '_'.join(['block', session]) + '.npz')
+
+    def sessions(self):
+        """Sessions that have a processed dataframe.csv, in order.
+        """
+
+        return [s for s in self._sessions
+                if os.path.exists(self.input_file(s))]
+
+    def input_file(self, session):
+        return os.path.join(self._input_data_path,
+                            '_'.join([session, 'dataframe.csv']))
+
+    def build(self):
+        """Write the block of each session not already on disk. Only one chunk
+        of rows of one session is dense in memory at a time. Returns the
+        sessions whose blocks were written.
+        """
+
+        logger = logging.getLogger(__name__)
+        written = []
+
+        for session in self.sessions():
+
+            if os.path.exists(self.block_file(session)):
+                continue
+
+            logger.info('streaming session %s into a sparse block', session)
+            rows, cols, data = [], [], []
+            n_cols = None
+
+            for chunk in pd.read_csv(self.input_file(session),
+                                     encoding='utf-8',
+                                     chunksize=self._chunksize):
+
+                votes = chunk.iloc[:, 4:].values
+                n_cols = votes.shape[1]
+                index = self._members.add(chunk, session)
+
+                r, c = np.nonzero(votes >= 0)
+                rows.append(index[r])
+                cols.append(c.astype(np.int32))
+                data.append(np.where(votes[r, c] == 1, 1, -1).astype(np.int8))
+
+            # Members first: a block on disk always has its rows in the table.
+            self._members.save()
+            tmp_file = self.block_file(session) + '.tmp.npz'
+            np.savez(tmp_file, row=np.concatenate(rows),
+                     col=np.concatenate(cols), data=np.concatenate(data),
+                     n_cols=n_cols)
+            os.rename(tmp_file, self.block_file(session))
+            written.append(session)
+
+        return written
+
+    def blocks(self):
+        """Yield each session's block as a CSR matrix over all members.
+        """
+
+        n_rows = len(self._members)
+
+        for session in self.sessions():
+
+            block = np.load(self.block_file(session))
+            yield sp.csr_matrix((block['data'].astype(np.float64),
+                                 (block['row'], block['col'])),
+                                shape=(n_rows, int(block['n_cols'])))
+
+    def max_block_size(self):
+        """Largest number of stored votes and of columns over all blocks.
+        """
+
+        blocks = (np.load(self.block_file(s)) for s in self.sessions())
+        sizes = [(len(block['data']), int(block['n_cols']))
+                 for block in blocks]
+
+        return (max(nnz for nnz, _ in sizes),
+                max(n_cols for _, n_cols in sizes))
+
+
+class OrderedMembers:
+    """Global member table, keyed by normalized name and state, in order of
+    first appearance; persisted so that row indices survive a restart.
+    """
+
+    _COLUMNS = ['Key', 'Name', 'State', 'Party', 'Chamber', 'First', 'Last']
+
+    def __init__(self, path):
+
+        self._path = path
+        self._index = {}
+        self._rows = []
+
+        if os.path.exists(path):
+
+            df = pd.read_csv(path, encoding='utf-8')
+
+            for row in df.itertuples(index=False):
+                self._index[row.Key] = len(self._rows)
+                self._rows.append(list(row))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, chunk, session):
+        """Returns the global row index of each member in a chunk of a
+        processed dataframe, adding new members to the table.
+        """
+
+        index = np.empty(len(chunk), dtype=np.int32)
+
+        for i, (name, party, state, chamber) in enumerate(
+                zip(chunk.Name, chunk.Party, chunk.State, chunk.Chamber)):
+
+            name = ucd.normalize('NFKD', name.title())
+            key = '|'.join([name, state])
+
+            if key not in self._index:
+                self._index[key] = len(self._rows)
+                self._rows.append([key, name, state, party, chamber,
+                                   session, session])
+
+            index[i] = self._index[key]
+            self._rows[index[i]][3:5] = [party, chamber]
+            self._rows[index[i]][6] = session
+
+        return index
+
+    def save(self):
+
+        tmp_file = self._path + '.tmp'
+        df = pd.DataFrame(self._rows, columns=self._COLUMNS)
+        df.to_csv(tmp_file, index=False, encoding='utf-8')
+        os.rename(tmp_file, self._path)
+
+    def to_frame(self):
+        return pd.DataFrame(self._rows, columns=self._COLUMNS).set_index('Key')
+
+
+class BlockRandomizedSVD:
+    """Randomized SVD (Halko, Martinsson & Tropp) of a matrix given as column
+    blocks A = [A_1 ... A_B]. Every pass streams the blocks once:
+
+        range finder   Y = sum_b A_b Omega_b
+        power pass     Y = sum_b A_b (A_b^T Q),       Q = qr(Y)
+        projection     C = sum_b (Q^T A_b)(Q^T A_b)^T
+
+    and U S of A follows from the eigendecomposition of the small matrix C.
+    Omega_b is regenerated from a per-block seed, so it is never stored.
+    After every block the running sum is checkpointed to `state_file`.
+    """
+
+    def __init__(self, n_components=50, oversample=10, n_power_iter=2,
+                 random_state=0, state_file=None):
+
+        self._k = n_components
+        self._l = n_components + oversample
+        self._n_power_iter = n_power_iter
+        self._random_state = random_state
+        self._state_file = state_file
+
+    def memory_bound(self, n_rows, max_block_nnz, max_block_cols,
+                     chunksize=0):
+        """Upper bound, in bytes, of the working set: one block as loaded
+        (COO arrays) and as CSR (float64 data, int32 indices), the
+        accumulator, Q and the QR workspace, and one A_b^T Q (or Omega_b).
+        With chunksize, also the dense chunk of CSV rows that SparseBlocks
+        reads at a time (int64 votes and their boolean mask).
+        """
+
+        return int(max_block_nnz * 21 + 3 * n_rows * self._l * 8 +
+                   max_block_cols * self._l * 8 +
+                   chunksize * max_block_cols * 9)
+
+    def load_state(self):
+
+        if self._state_file and os.path.exists(self._state_file):
+            state = np.load(self._state_file)
+            return (int(state['step']), int(state['block']),
+                    state['accumulator'],
+                    state['Q'] if state['Q'].size else None)
+
+        return 0, 0, None, None
+
+    def save_state(self, step, block, accumulator, Q):
+
+        if self._state_file:
+            tmp_file = self._state_file + '.tmp.npz'
+            np.savez(tmp_file, step=step, block=block, accumulator=accumulator,
+                     Q=Q if Q is not None else np.empty(0))
+            os.rename(tmp_file, self._state_file)
+
+    def fit_transform(self, blocks, n_rows):
+        """Returns U S (n_rows x n_components). `blocks` is a callable that
+        returns a fresh iterator over the column blocks.
+        """
+
+        logger = logging.getLogger(__name__)
+        step, start, accumulator, Q = self.load_state()
+        n_steps = self._n_power_iter + 2
+
+        for step in range(step, n_steps):
+
+            final = step == n_steps - 1
+            shape = (self._l, self._l) if final else (n_rows, self._l)
+
+            if start == 0 or accumulator is None:
+                accumulator = np.zeros(shape)
+
+            for b, A in enumerate(blocks()):
+
+                if b < start:
+                    continue
+
+                if step == 0:
+                    rng = np.random.RandomState(self._random_state + b)
+                    omega = rng.randn(A.shape[1], self._l)
+                    accumulator += A.dot(omega)
+
+                elif not final:
+                    accumulator += A.dot(A.T.dot(Q))
+
+                else:
+                    QA = np.asarray(A.T.dot(Q)).T
+                    accumulator += QA.dot(QA.T)
+
+                self.save_state(step, b + 1, accumulator, Q)
+
+            logger.info('randomized SVD: pass %d of %d done', step + 1,
+                        n_steps)
+
+            if not final:
+                Q, _ = np.linalg.qr(accumulator)
+                start, accumulator = 0, None
+                self.save_state(step + 1, 0, np.empty(0), Q)
+
+        eigenvalues, W = np.linalg.eigh(accumulator)
+        order = np.argsort(eigenvalues)[::-1][:self._k]
+        singular_values = np.sqrt(np.maximum(eigenvalues[order], 0))
+
+        return np.dot(Q, W[:, order]) * singular_values
+
+
+class AllCongress:
+    """Combined Senate + House embedding over a range of sessions.
+    """
+
+    def __init__(self, first=75, last=113, n_features_SVD=50, chunksize=200):
+
+        self._sessions = range(first, last + 1)
+        self._n_features_SVD = n_features_SVD
+        self._blocks = SparseBlocks(self._sessions, chunksize=chunksize)
+        self._state_file = os.path.join(
+            self._blocks.work_path, 'svd_state_{}.npz'.format(n_features_SVD))
+        self._features_file = os.path.join(self._blocks.work_path,
+                                           'svd_{}.npy'.format(n_features_SVD))
+
+    @property
+    def blocks(self):
+        return self._blocks
+
+    def restart(self):
+        """Discard checkpoints from a previous run of the same sessions.
+        """
+
+        for filename in os.listdir(self._blocks.work_path):
+            os.remove(os.path.join(self._blocks.work_path, filename))
+
+        self._blocks = SparseBlocks(self._sessions,
+                                    chunksize=self._blocks.chunksize)
+
+    def transform_SVD(self):
+        """Returns the reduced member features, resuming from checkpoints.
+        """
+
+        logger = logging.getLogger(__name__)
+
+        if self._blocks.build():
+            # New blocks add members and columns: earlier features and SVD
+            # checkpoints are of a different matrix.
+            for filename in [self._features_file, self._state_file]:
+                if os.path.exists(filename):
+                    os.remove(filename)
+
+        if os.path.exists(self._features_file):
+            return np.load(self._features_file)
+
+        n_rows = len(self._blocks.members)
+        svd = BlockRandomizedSVD(n_components=self._n_features_SVD,
+                                 state_file=self._state_file)
+        max_nnz, max_cols = self._blocks.max_block_size()
+        logger.info('%d members; peak working set is bounded by %.1f MB',
+                    n_rows, svd.memory_bound(n_rows, max_nnz, max_cols,
+                                             self._blocks.chunksize) / 1e6)
+
+        X_trunc = svd.fit_transform(self._blocks.blocks, n_rows)
+        np.save(self._features_file, X_trunc)
+        os.remove(self._state_file)
+
+        return X_trunc
+
+    def transform_tSNE(self, X_trunc, n_components=2, n_landmarks=None):
+        """Returns the t-SNE of the reduced features alongside the member
+        table; with n_landmarks, a quick preview from that many k-means++
+        landmarks (see progressive.ProgressiveEmbedding).
+        """
+
+        from sklearn.manifold import TSNE
+        from sklearn.preprocessing import StandardScaler
+
+        if n_landmarks:
+            from progressive import ProgressiveEmbedding
+            X_tSNE = ProgressiveEmbedding(X_trunc,
+                                          n_landmarks=n_landmarks).preview()
+
+        else:
+            X_tSNE = TSNE(n_components=n_components,
+                          random_state=0).fit_transform(X_trunc)
+
+        X_tSNE = StandardScaler().fit_transform(X_tSNE)
+
+        df_tSNE = self._blocks.members.to_frame()
+        df_tSNE[0], df_tSNE[1] = X_tSNE[:, 0], X_tSNE[:, 1]
+
+        return df_tSNE
+
+    def to_file(self, df_tSNE):
+
+        df_tSNE.to_csv(os.path.join(self._blocks.work_path, 'embedding.csv'),
+                       encoding='utf-8')
+
+    def plot(self, df_tSNE):
+        """Scatter of every member, colored by party, one marker per chamber,
+        in ../../reports/figures/.
+        """
+
+        plt = load_pyplot()
+        f, ax = plt.subplots(1)
+        party = df_tSNE.Party.str[0].map({'D': 'b', 'R': 'r'}).fillna('m')
+
+        for chamber, marker in [('s', '^'), ('h', '.')]:
+            members = (df_tSNE.Chamber == chamber).values
+            ax.scatter(df_tSNE[0].values[members], df_tSNE[1].values[members],
+                       c=party.values[members], marker=marker, alpha=0.4, s=10)
+
+        ax.axis('off')
+        ax.set_title('All Congress, sessions {}-{}'.format(
+            self._sessions[0], self._sessions[-1]))
+
+        today = datetime.date.today().strftime("%Y%m%d")
+        outfile = '_'.join(
+            ('All_Congress_tSNE_SVD{}'.format(self._n_features_SVD), today))
+        plt.savefig(Features(self._sessions[0]).figure_file(outfile),
+                    bbox_inches='tight')
+        plt.close(f)
+
+
+@click.command()
+@click.option('--first', default=75, help='First session to include.')
+@click.option('--last', default=113, help='Last session to include.')
+@click.option('--components', default=50, help='Number of SVD features.')
+@click.option('--chunksize', default=200,
+              help='Rows of a session read at a time.')
+@click.option('--restart', is_flag=True,
+              help='Discard checkpoints of a previous run.')
+@click.option('--plot', is_flag=True, help='Plot the combined embedding.')
+@click.option('--landmarks', default=0,
+              help='Preview from this many landmark members instead of the '
+                   'full t-SNE.')
+def main(first, last, components, chunksize, restart, plot, landmarks):
+    """ Out-of-core t-SNE of the Senate and House of all sessions as one body.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('embedding sessions %s to %s as one body', first, last)
+
+    all_congress = AllCongress(first=first, last=last,
+                               n_features_SVD=components, chunksize=chunksize)
+
+    if restart:
+        all_congress.restart()
+
+    X_trunc = all_congress.transform_SVD()
+    df_tSNE = all_congress.transform_tSNE(X_trunc, n_landmarks=landmarks)
+    all_congress.to_file(df_tSNE)
+
+    if plot:
+        all_congress.plot(df_tSNE)
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
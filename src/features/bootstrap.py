@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+
+"""
+bootstrap.py
+---------------------
+Functions for putting confidence intervals on the agreement and cohesion
+statistics of a session, by resampling its measures (the columns of the
+vote matrix) with replacement. All resamples are drawn at once as a matrix
+of multinomial weights, so each statistic is evaluated for every resample in
+a few matrix products; sessions are spread over a process pool.
+"""
+import os
+import sys
+import time
+import warnings
+from pathlib import Path
+import click
+import logging
+import numpy as np
+import pandas as pd
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.extend([os.path.join(_SRC, 'instrumentation'),
+                 os.path.join(_SRC, 'data')])
+from build_features import Features  # noqa: E402
+from normalize import PARTY_CODES, normalize_name  # noqa: E402
+from instrument import RunReport  # noqa: E402
+from chamber import chamber_votes, party_codes, party_onehot  # noqa: E402
+
+
+def resample_weights(n_measures, n_resamples=1000, random_state=0):
+    """(n_measures x n_resamples) weights: how many times each measure is
+    drawn in each resample, i.e. n_measures draws with replacement.
+    """
+
+    rng = np.random.RandomState(random_state)
+    uniform = np.full(n_measures, 1. / n_measures)
+
+    return rng.multinomial(n_measures, uniform,
+                           size=n_resamples).T.astype(float)
+
+
+def weighted_ratio(numerator, denominator, W):
+    """Per-resample ratio of two per-measure sums, (rows x resamples), with
+    the point estimate (all weights 1) as the first column; NaN where the
+    denominator is 0.
+    """
+
+    W = np.hstack([np.ones((W.shape[0], 1), dtype=W.dtype), W])
+    num = numerator.dot(W).astype(float)
+    den = denominator.dot(W).astype(float)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(den > 0, num / den, np.nan)
+
+
+class Bootstrap:
+    """Bootstrap of one chamber over its measures. Every statistic is a ratio
+    of weighted sums over measures, so that for the weight matrix W of all
+    resamples it is (per-measure numerators) W / (per-measure denominators) W:
+
+    agreement   members a, b: same vote / both voted;
+    cohesion    party: Rice index |yeas - nays| / cast, mean over measures;
+    distance    member: RMS distance of their votes (+1 yea, -1 nay) to the
+                mean vote of their party, over the measures they voted on.
+
+    Each row of the result holds a point estimate, the bootstrap standard
+    error and a percentile interval:
+
+    statistic  chamber  subject        estimate  std    low    high
+    agreement  s        Reid|Sanders   0.912     0.011  0.889  0.932
+    cohesion   s        D              0.874     0.008  0.857  0.889
+    distance   s        Sanders        0.402     0.021  0.361  0.444
+    """
+
+    def __init__(self, df, chamber, n_resamples=1000, random_state=0):
+
+        df, X, cast = chamber_votes(df, chamber)
+        X = X[:, cast]
+
+        self._chamber = chamber
+        self._names = df.index.tolist()
+        self._yea = (X == 1).astype(float)
+        self._nay = (X == 0).astype(float)
+        self._yea32 = self._yea.astype(np.float32)
+        self._nay32 = self._nay.astype(np.float32)
+        self._party = party_codes(df.Party, PARTY_CODES)
+        self._onehot = party_onehot(self._party, len(PARTY_CODES))
+        self._W = resample_weights(X.shape[1], n_resamples, random_state)
+        # Agreement sums 0/1 products with integer weights, to at most the
+        # number of measures: float32 holds them exactly, at half the cost.
+        self._W32 = self._W.astype(np.float32)
+
+    @property
+    def chamber(self):
+        return self._chamber
+
+    @property
+    def weights(self):
+        return self._W
+
+    def pairs(self, members=None):
+        """(pairs x 2) rows (a, b) of every pair of members, with a < b; with
+        members (names), only those of each of them with every other member.
+        """
+
+        if members is None:
+            return np.column_stack(np.triu_indices(len(self._names), 1))
+
+        rows = dict((name, row) for row, name in enumerate(self._names))
+
+        return np.array([(rows[name], other) for name in members
+                         if name in rows
+                         for other in range(len(self._names))
+                         if other != rows[name]], dtype=int).reshape(-1, 2)
+
+    def agreement(self, pairs):
+        """(pairs x 1 + resamples) agreement of every (row a, row b) pair.
+        """
+
+        a, b = np.asarray(pairs, dtype=int).reshape(-1, 2).T
+        yea, nay = self._yea32, self._nay32
+        same = yea[a] * yea[b] + nay[a] * nay[b]
+        both = (yea[a] + nay[a]) * (yea[b] + nay[b])
+
+        return weighted_ratio(same, both, self._W32)
+
+    def cohesion(self):
+        """(parties x 1 + resamples) mean Rice index of every party.
+        """
+
+        onehot = self._onehot
+        yeas, nays = onehot.T.dot(self._yea), onehot.T.dot(self._nay)
+        cast = yeas + nays
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rice = np.where(cast > 0, np.abs(yeas - nays) / cast, 0.)
+
+        return weighted_ratio(rice, (cast > 0).astype(float), self._W)
+
+    def distance(self):
+        """(members x 1 + resamples) RMS distance of every member to the
+        centroid of their party; NaN for members of unknown party.
+        """
+
+        onehot = self._onehot
+        votes = self._yea - self._nay
+        cast = self._yea + self._nay
+        centroids = onehot.T.dot(votes) / np.maximum(onehot.T.dot(cast), 1)
+        squared = (votes - onehot.dot(centroids)) ** 2 * cast
+
+        distance = np.sqrt(weighted_ratio(squared, cast, self._W))
+        distance[self._party < 0] = np.nan
+
+        return distance
+
+    def summarize(self, statistic, subjects, values, confidence=0.95):
+        """Rows of the result for values (subjects x 1 + resamples).
+        """
+
+        resamples = values[:, 1:]
+        tail = 50. * (1 - confidence)
+
+        if np.isnan(resamples).any():
+            # Members of unknown party have no distance in any resample.
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                low, high = np.nanpercentile(resamples, [tail, 100 - tail],
+                                             axis=1)
+                std = np.nanstd(resamples, axis=1)
+
+        else:
+            # Much faster than nanpercentile, for blocks of agreement.
+            low, high = np.percentile(resamples, [tail, 100 - tail], axis=1)
+            std = resamples.std(axis=1)
+
+        return pd.DataFrame({'statistic': statistic, 'chamber': self.chamber,
+                             'subject': subjects, 'estimate': values[:, 0],
+                             'std': std, 'low': low, 'high': high},
+                            columns=['statistic', 'chamber', 'subject',
+                                     'estimate', 'std', 'low', 'high'])
+
+    def compute(self, members=None, confidence=0.95, block_size=4096):
+        """Cohesion of every party with members, distance of every member,
+        and agreement of every pair of members, or with members (names) only
+        of each of them with every other member. Agreement is bootstrapped
+        block_size pairs at a time, so that only one block of
+        (pairs x measures) products is in memory.
+        """
+
+        present = [p for p in range(len(PARTY_CODES))
+                   if (self._party == p).any()]
+        cohesion = self.cohesion()[present]
+
+        pairs = self.pairs(members)
+        frames = [self.summarize('cohesion', [PARTY_CODES[p] for p in present],
+                                 cohesion, confidence),
+                  self.summarize('distance', self._names, self.distance(),
+                                 confidence)]
+
+        for start in range(0, len(pairs), block_size):
+
+            block = pairs[start:start + block_size]
+            subjects = ['|'.join([self._names[a], self._names[b]])
+                        for a, b in block]
+            frames.append(self.summarize('agreement', subjects,
+                                         self.agreement(block), confidence))
+
+        return pd.concat(frames, ignore_index=True)
+
+
+class SessionBootstrap:
+    """Bootstraps both chambers of a processed session and writes
+    ../../data/processed/<session>_bootstrap.csv.
+    """
+
+    def __init__(self, session):
+
+        self._ROOT = str(Path(os.getcwd()).parents[1])
+        self._data_path = os.path.join(self._ROOT, 'data/processed/')
+        self._session_number = str(session)
+
+    @property
+    def session_number(self):
+        return self._session_number
+
+    @property
+    def output_file(self):
+        return os.path.join(self._data_path,
+                            '_'.join([self._session_number, 'bootstrap.csv']))
+
+    def build(self, df, members=None, n_resamples=1000, confidence=0.95,
+              random_state=0):
+        """Agreement is bootstrapped for every pair of members of a chamber,
+        or, with members ({chamber: names}), only for each of those names
+        with every other member.
+        """
+
+        frames = []
+
+        for chamber in ['s', 'h']:
+
+            names = None if members is None else members.get(chamber, ())
+            bootstrap = Bootstrap(df, chamber, n_resamples=n_resamples,
+                                  random_state=random_state)
+            frames.append(bootstrap.compute(names, confidence=confidence))
+
+        return pd.concat(frames, ignore_index=True)
+
+    def to_file(self, df_bootstrap):
+        df_bootstrap.to_csv(self.output_file, index=False, encoding='utf-8')
+        return self.output_file
+
+
+def _bootstrap(args):
+    """Worker: bootstraps one session; with select, agreement only of the
+    select congressmen of select_congressmen.json with every other member.
+    Returns (session, output file, seconds, error).
+    """
+
+    session, n_resamples, confidence, random_state, select = args
+    start = time.time()
+
+    try:
+        features = Features(session)
+        df = features.load_records()
+
+    except (IOError, OSError) as e:
+        return session, None, time.time() - start, str(e)
+
+    members = None
+
+    if select:
+        members = {'s': [normalize_name(n) for n in features.sens or []],
+                   'h': [normalize_name(n) for n in features.reps or []]}
+
+    session_bootstrap = SessionBootstrap(session)
+    df_bootstrap = session_bootstrap.build(df, members,
+                                           n_resamples=n_resamples,
+                                           confidence=confidence,
+                                           random_state=random_state)
+    out_file = session_bootstrap.to_file(df_bootstrap)
+
+    return session, out_file, time.time() - start, None
+
+
+def bootstrap_sessions(sessions, n_resamples=1000, confidence=0.95,
+                       random_state=0, n_jobs=1, select=False):
+    """Bootstraps sessions, in n_jobs worker processes (all CPUs if n_jobs
+    is 0 or less). Yields (session, output file, seconds, error) as they
+    finish.
+    """
+
+    tasks = [(str(session), n_resamples, confidence, random_state, select)
+             for session in sessions]
+
+    if n_jobs <= 0:
+        from multiprocessing import cpu_count
+        n_jobs = cpu_count()
+
+    n_jobs = min(n_jobs, len(tasks))
+
+    if n_jobs <= 1:
+
+        for task in tasks:
+            yield _bootstrap(task)
+
+        return
+
+    from multiprocessing import Pool
+
+    pool = Pool(n_jobs)
+
+    try:
+
+        for result in pool.imap_unordered(_bootstrap, tasks):
+            yield result
+
+    finally:
+        pool.terminate()
+
+
+@click.command()
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--all', is_flag=True,
+              help='Process all available sessions data.')
+@click.option('--resamples', default=1000,
+              help='Bootstrap resamples of the measures.')
+@click.option('--confidence', default=0.95,
+              help='Level of the percentile intervals.')
+@click.option('--random-state', default=0, help='Seed of the resamples.')
+@click.option('--n-jobs', default=0,
+              help='Worker processes (0 for one per CPU).')
+@click.option('--select', is_flag=True,
+              help='Bootstrap agreement only for the congressmen of '
+                   'select_congressmen.json, instead of every pair.')
+@click.option('--profile', is_flag=True,
+              help='Also save cProfile statistics of the run.')
+def main(session, all, resamples, confidence, random_state, n_jobs, select,
+         profile):
+    """ Script to bootstrap confidence intervals of agreement, party cohesion
+    and distance to the party centroid.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('bootstrapping %d resamples of the measures', resamples)
+
+    report = RunReport('bootstrap', profile=profile)
+    sessions = [str(x) for x in range(75, 114)] if all else [session]
+
+    for session, out_file, seconds, error in bootstrap_sessions(
+            sessions, resamples, confidence, random_state, n_jobs, select):
+
+        if error:
+            logger.warning('session %s not bootstrapped: %s', session, error)
+            continue
+
+        record = report.record(session, 'bootstrap')
+        record['calls'] += 1
+        record['wall_s'] += seconds
+        report.annotate(session, 'bootstrap', output=out_file)
+        logger.info('session %s: %s in %.2fs', session, out_file, seconds)
+
+    logger.info('run report saved in %s\n%s', report.to_file(),
+                report.summary())
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
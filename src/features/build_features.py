@@ -7,25 +7,49 @@ Functions for exploratory data analysis, e.g., feature engineering and
 dimensionality reduction.
 """
 import os
+import sys
 from pathlib import Path
 import click
 import logging
 import json
 import datetime
-import unicodedata as ucd
-import numpy as np
-import pandas as pd
-from sklearn.decomposition import TruncatedSVD
-from sklearn.manifold import TSNE
-from sklearn_pandas import DataFrameMapper
-from sklearn.preprocessing import StandardScaler, RobustScaler
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.extend([os.path.join(_SRC, 'instrumentation'),
+                 os.path.join(_SRC, 'data'),
+                 os.path.join(_SRC, 'visualization')])
+from instrument import RunReport  # noqa: E402
+from normalize import NameIndex, normalize_records  # noqa: E402
+
+# pandas, scikit-learn, sklearn_pandas and matplotlib are imported in the
+# methods that use them, so that --help and cached runs start quickly.
+
+# Storage dtype of the votes, and working dtype of the SVD, t-SNE input and
+# t-SNE trajectories, per precision mode. Votes are only ever 1, 0 or -1.
+# scikit-learn 0.18 converts the t-SNE input back to float64, so there the
+# fit itself is neither smaller nor faster in float32.
+PRECISIONS = {'float64': ('float64', 'float64'),
+              'float32': ('int8', 'float32')}
+
+
+def load_pyplot():
+    """Import matplotlib.pyplot on first use, on the non-interactive Agg
+    backend unless a backend was already chosen (e.g. with MPLBACKEND).
+    """
+
+    if 'matplotlib.pyplot' not in sys.modules and \
+            not os.environ.get('MPLBACKEND'):
+        import matplotlib
+        matplotlib.use('Agg')
+
+    import matplotlib.pyplot as plt
+
+    return plt
 
 
 class Features:
 
-    def __init__(self, session):
+    def __init__(self, session, data=None, precision='float64'):
 
         self._ROOT = str(Path(os.getcwd()).parents[1])
         self._input_data_path = os.path.join(self._ROOT, 'data/processed/')
@@ -33,11 +57,19 @@ class Features:
         self._session_number = session
         self._filehandle = '_'.join([str(self._session_number), 'dataframe.csv'])
         self._input_file = os.path.join(self._input_data_path, self._filehandle)
-        self._data = pd.read_csv(self._input_file, encoding='utf-8')
+        self._output_path = os.path.join(self._ROOT, 'reports/figures/')
+        self._vote_dtype, self._dtype = PRECISIONS[precision]
+        # Read from dataframe.csv on first use, if not given.
+        self._data = data
+        self._svd = {}
         self._sens, self._reps, self._senate_majority, self._house_majority = self.load_select_congressmen()
 
     @property
     def data(self):
+
+        if self._data is None:
+            self._data = self.load_data()
+
         return self._data
 
     @property
@@ -64,6 +96,34 @@ class Features:
     def session_number(self):
         return self._session_number
 
+    @property
+    def input_file(self):
+        return self._input_file
+
+    @property
+    def output_path(self):
+        return self._output_path
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    def figure_file(self, outfile):
+        """Path of a figure in output_path, ../../reports/figures/, which is
+        created if needed.
+        """
+
+        if not os.path.isdir(self.output_path):
+            os.makedirs(self.output_path)
+
+        return os.path.join(self.output_path, outfile)
+
+    @property
+    def svd(self):
+        """Fitted TruncatedSVD and its input columns, per chamber.
+        """
+        return self._svd
+
     def load_select_congressmen(self):
         """Load congressmen presets in select_congressmen.json to be plotted.
         """
@@ -89,36 +149,105 @@ class Features:
 
         return senators, representatives, senate_majority, house_majority
 
+    def load_data(self):
+        """Read the dataframe.csv of the session, with the vote columns in
+        the storage dtype of the precision mode.
+        """
+
+        import pandas as pd
+
+        header = pd.read_csv(self._input_file, encoding='utf-8',
+                             nrows=0).columns
+
+        return pd.read_csv(self._input_file, encoding='utf-8',
+                           dtype={col: self._vote_dtype for col in header[4:]})
+
     def load_records(self):
         """Read input dataframe.csv files (Votes Records) in
         ../../data/processed/ and return Party (y_labels) and votes cast (X_data)
         """
 
-        df = self.data.set_index('Name')
-        df.index = df.index.map(lambda x: ucd.normalize('NFKD', x.title()))
-        df.Party = df.Party.map({'Democrat': 'D', 'D': 'D', 'Republican': 'R',
-                                 'R': 'R', 'Independent': 'I', 'I': 'I'})
-
-        return df
+        return normalize_records(self.data.set_index('Name'))
 
     def transform_SVD_tSNE(self, df, chamber, n_features_SVD=50,
-                           n_components=2, scale='standard'):
+                           n_components=2, scale='standard', convergence=None):
         """Transform 1800+ features (measures/bills) to 50 features using
         truncated singular value decomposition (SVD). This is followed by
         creating and returning a t-distributed stochastic neighbor embedding
         (t-SNE).
         """
 
+        df, X_trunc = self.transform_SVD(df, chamber,
+                                         n_features_SVD=n_features_SVD)
+
+        return self.transform_tSNE(df, X_trunc, n_components=n_components,
+                                   scale=scale, convergence=convergence)
+
+    def transform_SVD(self, df, chamber, n_features_SVD=50):
+        """Returns the members of a chamber and their votes reduced to
+        n_features_SVD features by truncated SVD.
+        """
+
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn_pandas import DataFrameMapper
+
         df = df[df.Chamber == chamber]
         data_cols = df.columns.tolist()[3:]
 
-        svd = TruncatedSVD(n_features_SVD)
+        svd = TruncatedSVD(n_features_SVD, random_state=0)
         svd_mapper = DataFrameMapper([(data_cols, svd)])
-        X_trunc = svd_mapper.fit_transform(df.copy())
+        X_trunc = svd_mapper.fit_transform(df[data_cols].astype(self._dtype))
+
+        # Newer sklearn_pandas fits a clone of svd; keep whichever was fitted
+        # so that its right singular vectors can be reused for the measures.
+        fitted = getattr(svd_mapper, 'built_features', None) or \
+            svd_mapper.features
+        self._svd[chamber] = (fitted[0][1], data_cols)
+
+        return df, X_trunc.astype(self._dtype, copy=False)
+
+    def analyze_measures(self, df, n_clusters=8):
+        """Embed, score and cluster the measures of every chamber reduced by
+        transform_SVD, reusing its fitted SVD, and save the results.
+        """
+
+        from measures import MeasureSpace, measures_to_file
+
+        for chamber, (svd, data_cols) in self.svd.items():
+
+            space = MeasureSpace(df, svd, data_cols, chamber)
+            measures_to_file(self, space.analyze(n_clusters=n_clusters),
+                             chamber)
+
+    def transform_tSNE(self, df, X_trunc, n_components=2, scale='standard',
+                       convergence=None):
+        """Returns the t-SNE of SVD features, scaled, alongside Party and
+        State of the members in df. With a convergence.Convergence, t-SNE
+        stops when it has converged or is out of budget.
+        """
+
+        import numpy as np
+        from sklearn.manifold import TSNE
+        from affinities import fit_transform
+        from convergence import monitoring
 
         tSNE = TSNE(n_components=n_components, random_state=0)
         np.set_printoptions(suppress=True)
-        X_tSNE = tSNE.fit_transform(X_trunc)
+
+        with monitoring(convergence):
+            X_tSNE = fit_transform(tSNE,
+                                   X_trunc.astype(self._dtype, copy=False),
+                                   label=str(self.session_number))
+
+        return self.tSNE_frame(df, X_tSNE, scale=scale)
+
+    def tSNE_frame(self, df, X_tSNE, scale='standard'):
+        """Scales t-SNE coordinates and puts them alongside Party and State of
+        the members in df.
+        """
+
+        import pandas as pd
+        from sklearn.preprocessing import StandardScaler, RobustScaler
 
         if scale != 'robust':
 
@@ -133,15 +262,73 @@ class Features:
 
         return df_tSNE
 
+    def preview_tSNE(self, df, X_trunc, scale='standard', n_landmarks=100,
+                     method='kmeans++', refine=False):
+        """Quick t-SNE of the members in df from a subset of landmarks (see
+        progressive.ProgressiveEmbedding). Returns the preview, in the form
+        returned by transform_tSNE, and the ProgressiveEmbedding; with refine,
+        the full t-SNE is already running in the background, and
+        refined_tSNE() returns it.
+        """
+
+        from progressive import ProgressiveEmbedding
+
+        embedding = ProgressiveEmbedding(
+            X_trunc.astype(self._dtype, copy=False), n_landmarks=n_landmarks,
+            method=method, strata=df.Party)
+
+        df_tSNE = self.tSNE_frame(df, embedding.preview(), scale=scale)
+
+        if refine:
+            embedding.refine()
+
+        return df_tSNE, embedding
+
+    def refined_tSNE(self, df, embedding, scale='standard'):
+        """Waits for the full t-SNE refined from a preview_tSNE.
+        """
+
+        return self.tSNE_frame(df, embedding.result(), scale=scale)
+
+    def embedding_file(self, chamber):
+        """Path of the saved t-SNE coordinates of a chamber,
+        ../../data/processed/<session>_<chamber>_embedding.csv.
+        """
+
+        filehandle = '_'.join([str(self.session_number), chamber,
+                               'embedding.csv'])
+        return os.path.join(self._input_data_path, filehandle)
+
+    def embedding_to_file(self, df_tSNE, chamber):
+        """Save the output of transform_SVD_tSNE so that it can be re-plotted
+        or queried without recomputing the embedding.
+        """
+
+        df_tSNE.to_csv(self.embedding_file(chamber), encoding='utf-8')
+
+    def load_embedding(self, chamber):
+        """Read coordinates saved by embedding_to_file, in the same form as
+        returned by transform_SVD_tSNE.
+        """
+
+        import pandas as pd
+
+        df_tSNE = pd.read_csv(self.embedding_file(chamber), index_col=0,
+                              encoding='utf-8')
+        df_tSNE.columns = ['Party', 'State', 0, 1]
+
+        return df_tSNE
+
     def plot_congressman(self, df, plt, members, markers, groups, labels):
         """Add congressmen to plot generated by plot_2D_tSNE().
         """
 
+        rows = NameIndex(df.index)
+
         for p, person in enumerate(members):
 
-            vis_x, vis_y = df[(df.index == person.title())].values[0, 2:]
-            party = df.Party[(df.index == person.title())].values[0]
-            party = ''.join(['(', party, ')'])
+            vis_x, vis_y = df.iloc[rows[person], 2:4].values
+            party = ''.join(['(', df.Party.iloc[rows[person]], ')'])
             point = plt.scatter(vis_x, vis_y, s=75,
                                 marker=markers[p], c='black')
             label = ' '.join([person, party])
@@ -151,9 +338,11 @@ class Features:
         return groups, labels
 
     def plot_2D_tSNE(self, df_senate, df_house, session_number):
-        """Plot tSNE for senate and house.
+        """Plot tSNE for senate and house, in ../../reports/figures/ as the
+        figures of render_batch.py.
         """
 
+        plt = load_pyplot()
         f, (senate, house) = plt.subplots(2, sharex=False, sharey=False)
         marker = '.'
         alpha = 0.5
@@ -256,45 +445,160 @@ class Features:
 
         today = datetime.date.today().strftime("%Y%m%d")
         outfile = '_'.join((session_number, 'senate_house', today))
-        plt.savefig(outfile, bbox_inches='tight')
+        plt.savefig(self.figure_file(outfile), bbox_inches='tight')
 
         # plt.show()
 
 
+def embed_session(features, df, report, convergence=None, preview=False,
+                  refine=False, landmarks=100, landmark_method='kmeans++'):
+    """SVD and t-SNE of both chambers of df, the records loaded by
+    features, timed in report; with preview, a quick t-SNE of landmark
+    members is plotted first. Returns the full embeddings, saved, by chamber.
+    """
+
+    logger = logging.getLogger(__name__)
+    session = features.session_number
+    embeddings, previews, reduced = {}, {}, {}
+
+    for chamber, scale in [('s', 'robust'), ('h', 'standard')]:
+
+        with report.stage(session, 'svd_' + chamber):
+            df_chamber, X_trunc = features.transform_SVD(df, chamber)
+
+        report.annotate(session, 'svd_' + chamber, input=df_chamber,
+                        output=X_trunc)
+
+        if preview:
+
+            with report.stage(session, 'preview_' + chamber, input=X_trunc):
+                previews[chamber], progressive = features.preview_tSNE(
+                    df_chamber, X_trunc, scale=scale, n_landmarks=landmarks,
+                    method=landmark_method, refine=refine)
+
+            reduced[chamber] = df_chamber, X_trunc, scale, progressive
+            continue
+
+        with report.stage(session, 'tsne_' + chamber, input=X_trunc):
+            embeddings[chamber] = features.transform_tSNE(
+                df_chamber, X_trunc, scale=scale, convergence=convergence)
+
+        if convergence is not None:
+            logger.info('%s %s t-SNE: %s', session, chamber,
+                        convergence.summary())
+
+    if preview:
+
+        with report.stage(session, 'plot_preview'):
+            features.plot_2D_tSNE(previews['s'], previews['h'],
+                                  '_'.join([session, 'preview']))
+
+    if refine:
+
+        for chamber in ['s', 'h']:
+
+            df_chamber, X_trunc, scale, progressive = reduced[chamber]
+
+            # Only the wait for the background t-SNE is timed here.
+            with report.stage(session, 'tsne_' + chamber, input=X_trunc):
+                embeddings[chamber] = features.refined_tSNE(
+                    df_chamber, progressive, scale=scale)
+
+    for chamber in embeddings:
+        features.embedding_to_file(embeddings[chamber], chamber)
+        report.annotate(session, 'tsne_' + chamber,
+                        output=embeddings[chamber])
+
+    return embeddings
+
+
 @click.command()
 # @click.argument('session_number')
 # def main(session_number):
-@click.option('--session', default='113', help='Which session of Congress? (int)')
-@click.option('--all', is_flag=True, help='Process all available sessions data.')
-def main(session, all):
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--all', is_flag=True,
+              help='Process all available sessions data.')
+@click.option('--measures', is_flag=True,
+              help='Also embed, score and cluster the measures.')
+@click.option('--precision', default='float64',
+              type=click.Choice(sorted(PRECISIONS)),
+              help='float32 stores votes as int8 and SVD features in float32.')
+@click.option('--preview', is_flag=True,
+              help='Quick t-SNE of landmark members only, the others '
+                   'interpolated.')
+@click.option('--refine', is_flag=True,
+              help='With --preview, refine the full t-SNE in the background.')
+@click.option('--landmarks', default=100,
+              help='Landmark members of a --preview.')
+@click.option('--landmark-method', default='kmeans++',
+              type=click.Choice(['kmeans++', 'stratified']),
+              help='k-means++ on the SVD features, or stratified by party.')
+@click.option('--tol', default=None, type=float,
+              help='Stop t-SNE once the KL divergence improves by less than '
+                   'this.')
+@click.option('--max-iter', default=None, type=int,
+              help='Iteration budget of each t-SNE.')
+@click.option('--max-seconds', default=None, type=float,
+              help='Wall-clock budget of each t-SNE.')
+@click.option('--profile', is_flag=True,
+              help='Also save cProfile statistics of the run.')
+def main(session, all, measures, precision, preview, refine, landmarks,
+         landmark_method, tol, max_iter, max_seconds, profile):
     """ Script to explore dimensionality reduction using TruncatedSVD
     """
     logger = logging.getLogger(__name__)
     logger.info('making final data set from raw data')
 
-    if all:
+    from convergence import from_options
 
-        for x in range(75, 114):
+    report = RunReport('build_features', profile=profile)
+    sessions = [str(x) for x in range(75, 114)] if all else [session]
+    convergence = from_options(tol, max_iter, max_seconds)
+    # A preview alone is not saved, so there is nothing to batch render.
+    full = refine or not preview
 
-            session = str(x)
-            congressional_votes = Features(session)
+    for session in sessions:
+
+        with report.stage(session, 'load'):
+            congressional_votes = Features(session, precision=precision)
             df = congressional_votes.load_records()
 
-            df_tSNE_senate = congressional_votes.transform_SVD_tSNE(df, chamber='s', scale='robust')
-            df_tSNE_house = congressional_votes.transform_SVD_tSNE(
-                df, chamber='h', scale='standard')
+        report.annotate(session, 'load',
+                        input=congressional_votes.input_file, output=df)
+
+        embeddings = embed_session(
+            congressional_votes, df, report, convergence=convergence,
+            preview=preview, refine=refine, landmarks=landmarks,
+            landmark_method=landmark_method)
+
+        if measures:
+
+            with report.stage(session, 'measures'):
+                congressional_votes.analyze_measures(df)
+
+        if full and not all:
+
+            with report.stage(session, 'plot'):
+                congressional_votes.plot_2D_tSNE(embeddings['s'],
+                                                 embeddings['h'], session)
 
-            congressional_votes.plot_2D_tSNE(df_tSNE_senate, df_tSNE_house, session)
+    if full and all:
+        # One figure per worker, redrawn for each session from the saved
+        # embeddings, instead of a new figure per session.
+        from render_batch import render_sessions
 
-    else:
+        with report.stage('all', 'plot', input=sessions):
 
-        congressional_votes = Features(session)
-        df = congressional_votes.load_records()
+            for session, paths, seconds, error in render_sessions(
+                    sessions, n_jobs=0):
 
-        df_tSNE_senate = congressional_votes.transform_SVD_tSNE(df, chamber='s', scale='robust')
-        df_tSNE_house = congressional_votes.transform_SVD_tSNE(df, chamber='h', scale='standard')
+                if error:
+                    logger.warning('session %s not plotted: %s', session,
+                                   error)
 
-        congressional_votes.plot_2D_tSNE(df_tSNE_senate, df_tSNE_house, session)
+    logger.info('run report saved in %s\n%s', report.to_file(),
+                report.summary())
 
 if __name__ == '__main__':
     log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""
+chamber.py
+---------------------
+Functions shared by the analyses of one chamber of a session: its slice of
+the vote matrix, and the party indicator matrix of its members.
+"""
+import numpy as np
+import pandas as pd
+
+
+def chamber_votes(df, chamber, data_cols=None):
+    """Returns (members, X, cast): the rows of a chamber in a dataframe of
+    vote records, their votes X over data_cols (default: every measure), and
+    the mask of the columns of X the chamber voted on. Measures of the other
+    chamber are all -1 (not cast) in X.
+    """
+
+    df = df[df.Chamber == chamber]
+
+    if data_cols is None:
+        data_cols = df.columns.tolist()[3:]
+
+    X = df[data_cols].values
+
+    return df, X, (X >= 0).any(axis=0)
+
+
+def party_codes(parties, codes):
+    """Index of each member's party in codes; -1 for any other party.
+    """
+
+    return np.asarray(pd.Categorical(parties, categories=codes).codes)
+
+
+def party_onehot(party_codes, n_parties):
+    """(members x parties) indicator of each member's party, from
+    party_codes; members of code -1 belong to none.
+    """
+
+    return (party_codes[:, None] ==
+            np.arange(n_parties)[None, :]).astype(float)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+"""
+convergence.py
+---------------------
+Functions for stopping t-SNE when it has converged rather than after a fixed
+schedule: every few iterations the KL divergence and gradient norm are
+checked, and the optimization stops once the KL divergence stops improving,
+or when an iteration or wall-clock budget runs out. The time saved against
+the full schedule is reported.
+"""
+import time
+import threading
+from contextlib import contextmanager
+import numpy as np
+from numpy import linalg
+
+from affinities import tsne_module, argnames
+
+
+# Convergence of the t-SNE fitted in the current thread, if any.
+_local = threading.local()
+_originals = {}
+
+
+class _Stop(Exception):
+    pass
+
+
+def exaggeration_stages():
+    """Calls of scikit-learn's _gradient_descent with early exaggeration at
+    the start of a fit: two (of 50 and 100 iterations) before 0.19, which
+    also dropped its min_error_diff argument, and one since.
+    """
+
+    func = _originals.get('_gradient_descent',
+                          tsne_module()._gradient_descent)
+
+    return 2 if 'min_error_diff' in argnames(func) else 1
+
+
+class Convergence:
+    """Watches one t-SNE run. After early exaggeration, it is converged once
+    the KL divergence improves by less than tol (relative) over n_iter_check
+    iterations (never, if tol is None), or the gradient norm falls below
+    min_grad_norm. max_iter and max_seconds are hard budgets over the whole
+    run. Checks look like this:
+
+    iteration  kl      grad_norm  improvement
+    300        1.412   0.0031     0.0410
+    350        1.398   0.0024     0.0099
+    400        1.397   0.0019     0.0007   -> converged
+    """
+
+    def __init__(self, tol=1e-3, min_grad_norm=1e-7, n_iter_check=50,
+                 max_iter=None, max_seconds=None):
+
+        self._tol = tol
+        self._min_grad_norm = min_grad_norm
+        self._n_iter_check = n_iter_check
+        self._max_iter = max_iter
+        self._max_seconds = max_seconds
+        self.reset()
+
+    def reset(self):
+
+        self._start = None
+        self._n_iter = 0
+        self._scheduled = 0
+        self._stage = 0
+        self._reason = None
+        self._last_error = None
+        self._history = []
+
+    @property
+    def reason(self):
+        """Why the run stopped early: 'converged', 'max_iter', 'max_seconds'
+        or 'gradient'; None if it ran its whole schedule.
+        """
+        return self._reason
+
+    @property
+    def n_iter(self):
+        return self._n_iter
+
+    @property
+    def history(self):
+        """(iteration, kl, grad_norm, improvement) of every check.
+        """
+        return self._history
+
+    @property
+    def seconds(self):
+        return time.time() - self._start if self._start is not None else 0.
+
+    def saved(self):
+        """(iterations, seconds) saved against the full schedule, estimated
+        from the mean time per iteration of this run.
+        """
+
+        iterations = max(self._scheduled - self._n_iter, 0)
+        return iterations, iterations * self.seconds / max(self._n_iter, 1)
+
+    def summary(self):
+
+        iterations, seconds = self.saved()
+        return '{} of {} iterations in {:.2f}s ({}), ~{:.2f}s saved'.format(
+            self._n_iter, self._scheduled, self.seconds,
+            self._reason or 'full schedule', seconds)
+
+    def update(self, i, error, grad, final=True, check=True):
+        """Called at iteration i with the KL divergence error (None if not
+        computed) and gradient grad; returns True to stop. Convergence is only
+        judged in the final stage (after early exaggeration), budgets always.
+        """
+
+        if self._start is None:
+            self._start = time.time()
+
+        self._n_iter = i + 1
+
+        if self._max_iter is not None and self._n_iter >= self._max_iter:
+            self._reason = 'max_iter'
+
+        elif self._max_seconds is not None and \
+                self.seconds >= self._max_seconds:
+            self._reason = 'max_seconds'
+
+        elif final and check and error is not None and \
+                (i + 1) % self._n_iter_check == 0:
+
+            grad_norm = linalg.norm(grad)
+            improvement = np.nan
+
+            if self._last_error is not None:
+                improvement = (self._last_error - error) / \
+                    max(abs(self._last_error), 1e-12)
+
+            self._history.append((i + 1, float(error), float(grad_norm),
+                                  float(improvement)))
+            self._last_error = error
+
+            if grad_norm <= self._min_grad_norm:
+                self._reason = 'gradient'
+
+            elif self._tol is not None and improvement < self._tol:
+                self._reason = 'converged'
+
+        return self._reason is not None
+
+    def schedule(self, n_iter):
+        self._scheduled = max(self._scheduled, n_iter)
+
+    def begin_stage(self, n_iter, n_exaggeration=None):
+        """Called as each call of _gradient_descent of a fit begins, with
+        its last iteration. Returns True in the final stage, after the
+        n_exaggeration stages of early exaggeration (default:
+        exaggeration_stages()).
+        """
+
+        if n_exaggeration is None:
+            n_exaggeration = exaggeration_stages()
+
+        self.schedule(n_iter)
+        self._stage += 1
+
+        return self._stage > n_exaggeration
+
+    @contextmanager
+    def monitoring(self):
+        """scikit-learn t-SNE fits in the body stop early as decided here.
+        """
+
+        install()
+        self.reset()
+        previous = getattr(_local, 'convergence', None)
+        _local.convergence = self
+
+        try:
+            yield self
+
+        finally:
+            _local.convergence = previous
+
+
+def from_options(tol=None, max_iter=None, max_seconds=None):
+    """Convergence of the command line options, or None if none is set.
+    """
+
+    if tol is None and max_iter is None and max_seconds is None:
+        return None
+
+    return Convergence(tol=tol, max_iter=max_iter, max_seconds=max_seconds)
+
+
+@contextmanager
+def monitoring(convergence):
+    """convergence.monitoring(), or nothing if convergence is None.
+    """
+
+    if convergence is None:
+        yield None
+
+    else:
+
+        with convergence.monitoring():
+            yield convergence
+
+
+def _gradient_descent(objective, p0, *args, **kwargs):
+    """Stands in for scikit-learn's _gradient_descent: runs it with an
+    objective that reports to the thread's Convergence, and ends it early by
+    raising from the objective. Once the run has stopped, the stages left
+    return at once.
+    """
+
+    original = _originals['_gradient_descent']
+    convergence = getattr(_local, 'convergence', None)
+
+    if convergence is None:
+        return original(objective, p0, *args, **kwargs)
+
+    it = kwargs.get('it', args[0] if args else 0)
+    n_iter = kwargs.get('max_iter', kwargs.get(
+        'n_iter', args[1] if len(args) > 1 else 0))
+    final = convergence.begin_stage(n_iter)
+    state = {'i': it - 1, 'error': np.nan}
+
+    if convergence.reason is not None:
+        return p0.copy(), state['error'], state['i']
+
+    def watched(p, *a, **kw):
+
+        error, grad = objective(p, *a, **kw)
+        check = kw.get('compute_error', True)
+        state['i'] += 1
+        state['p'] = p
+
+        if check:
+            state['error'] = error
+
+        if convergence.update(state['i'], error, grad, final=final,
+                              check=check):
+            raise _Stop()
+
+        return error, grad
+
+    try:
+        return original(watched, p0, *args, **kwargs)
+
+    except _Stop:
+        return state['p'].copy(), state['error'], state['i']
+
+
+def install():
+    """Routes scikit-learn's t-SNE optimizer through _gradient_descent, for
+    fits inside Convergence.monitoring() (others are unaffected).
+    """
+
+    module = tsne_module()
+
+    if not _originals:
+        _originals['_gradient_descent'] = module._gradient_descent
+        module._gradient_descent = _gradient_descent
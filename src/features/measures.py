@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""
+measures.py
+---------------------
+Functions for looking at a session from the side of the measures: measures
+are placed in the reduced space of the members' SVD, scored for partisanship,
+clustered, and ranked from most divisive to most bipartisan.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+from chamber import chamber_votes, party_codes, party_onehot
+
+
+def singular_values(svd, X):
+    """Singular values of a TruncatedSVD fitted on X. singular_values_ is
+    only set from scikit-learn 0.19 on; before, they are the norms of the
+    columns of X V.
+    """
+
+    values = getattr(svd, 'singular_values_', None)
+
+    if values is None:
+        values = np.linalg.norm(X.dot(svd.components_.T), axis=0)
+
+    return values
+
+
+class MeasureSpace:
+    """Measures of one chamber, described by the TruncatedSVD fitted on its
+    members in Features.transform_SVD. Members are X V (= U S); measures get
+    the principal coordinates V S, i.e. the right singular vectors scaled by
+    the singular values, so no second decomposition is needed. The result
+    looks like this:
+
+    vote_id  yea_D  yea_R  partisanship  cluster  0      1     2
+    h100-..  0.98   0.03   0.95          2        41.2   -8.1  3.3
+    """
+
+    _PARTIES = ['D', 'R']
+
+    def __init__(self, df, svd, data_cols, chamber, n_dims=10):
+
+        df, X, cast = chamber_votes(df, chamber, data_cols)
+
+        V = svd.components_.T
+
+        self._chamber = chamber
+        self._vote_ids = np.asarray(data_cols)[cast]
+        self._votes = X[:, cast]
+        self._party = np.asarray(df.Party)
+        self._coordinates = (V * singular_values(svd, X))[cast, :n_dims]
+
+    @property
+    def chamber(self):
+        return self._chamber
+
+    @property
+    def coordinates(self):
+        return self._coordinates
+
+    def party_votes(self):
+        """Yea fraction, among votes cast, of each party for every measure,
+        as (parties x measures), via a one-hot product with the vote matrix.
+        """
+
+        onehot = party_onehot(party_codes(self._party, self._PARTIES),
+                              len(self._PARTIES))
+        yeas = onehot.T.dot(self._votes == 1)
+        cast = onehot.T.dot(self._votes >= 0)
+
+        return yeas / np.maximum(cast, 1), cast
+
+    def partisanship(self):
+        """Returns a dataframe, indexed by vote_id, of the party yea fractions
+        and the partisanship score |yea_D - yea_R|, from 0 (both parties vote
+        alike) to 1 (straight party line).
+        """
+
+        yea_fraction, cast = self.party_votes()
+        df = pd.DataFrame(yea_fraction.T,
+                          index=pd.Index(self._vote_ids, name='vote_id'),
+                          columns=['yea_' + party for party in self._PARTIES])
+        df['partisanship'] = np.abs(yea_fraction[0] - yea_fraction[1])
+        # Not meaningful unless both parties voted.
+        df.loc[(cast == 0).any(axis=0), 'partisanship'] = np.nan
+
+        return df
+
+    def cluster(self, n_clusters=8, random_state=0):
+        """KMeans labels of the measures in the reduced space.
+        """
+
+        from sklearn.cluster import KMeans
+
+        n_clusters = min(n_clusters, len(self._vote_ids))
+        kmeans = KMeans(n_clusters=n_clusters, random_state=random_state)
+
+        return kmeans.fit_predict(self.coordinates)
+
+    def analyze(self, n_clusters=8):
+        """Partisanship, cluster and coordinates of every measure.
+        """
+
+        df = self.partisanship()
+        df['cluster'] = self.cluster(n_clusters) if len(df) else []
+        df_coordinates = pd.DataFrame(self.coordinates, index=df.index)
+
+        return pd.concat([df, df_coordinates], axis=1)
+
+    @staticmethod
+    def most_divisive(df_measures, n=10):
+        return df_measures.dropna(subset=['partisanship']).sort_values(
+            'partisanship', ascending=False).head(n)
+
+    @staticmethod
+    def most_bipartisan(df_measures, n=10):
+        """Least partisan measures; among ties, the ones most contested
+        overall come first, so that unanimous votes do not crowd the list.
+        """
+
+        df = df_measures.dropna(subset=['partisanship'])
+        contested = -np.abs(df[['yea_D', 'yea_R']].mean(axis=1) - 0.5)
+
+        df = df.assign(_contested=contested).sort_values(
+            ['partisanship', '_contested'], ascending=[True, False])
+
+        return df.head(n).drop('_contested', axis=1)
+
+
+def measures_to_file(features, df_measures, chamber, n=10):
+    """Save the measure analytics of a chamber as
+    ../../data/processed/<session>_<chamber>_measures_analysis.csv, with the
+    date and result of each measure when <session>_measures.csv exists, and
+    the rank (1 to n) of the n most divisive and most bipartisan measures.
+    """
+
+    df_measures = df_measures.copy()
+
+    for column, top in [('divisive_rank',
+                         MeasureSpace.most_divisive(df_measures, n)),
+                        ('bipartisan_rank',
+                         MeasureSpace.most_bipartisan(df_measures, n))]:
+        df_measures[column] = pd.Series(np.arange(1, len(top) + 1),
+                                        index=top.index)
+
+    data_path = os.path.dirname(features.embedding_file(chamber))
+    session = str(features.session_number)
+    measures_file = os.path.join(data_path,
+                                 '_'.join([session, 'measures.csv']))
+
+    if os.path.isfile(measures_file):
+        meta = pd.read_csv(measures_file,
+                           encoding='utf-8').set_index('vote_id')
+        df_measures = meta[['date', 'result']].join(df_measures, how='right')
+
+    filehandle = '_'.join([session, chamber, 'measures_analysis.csv'])
+    df_measures.to_csv(os.path.join(data_path, filehandle), encoding='utf-8')
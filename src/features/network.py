@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+
+"""
+network.py
+---------------------
+Functions for treating a chamber as a co-voting graph: members are nodes,
+and two members are joined when they agree on at least `threshold` of the
+measures they both voted on. Graphs are exported as GraphML, partitioned into
+communities by modularity (Louvain), and summarized per session.
+"""
+import os
+import sys
+import io
+from pathlib import Path
+import click
+import logging
+from xml.sax.saxutils import escape, quoteattr
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(os.path.join(_SRC, 'data'))
+from build_features import Features  # noqa: E402
+from normalize import PARTY_CODES  # noqa: E402
+from chamber import chamber_votes, party_codes  # noqa: E402
+
+
+class CoVotingGraph:
+    """Agreement graph of one chamber. With S coding votes as 1 yea, -1 nay
+    and 0 not cast, and V = |S| marking votes cast,
+
+        common = V V^T,     agree = (common + S S^T) / 2,
+
+    computed a block of rows at a time; only pairs above the threshold are
+    kept, in a sparse adjacency matrix, so at most block_size x n_members
+    rates exist at once. S and V are kept dense (float32): a chamber's vote
+    matrix is mostly filled, and dense products beat sparse ones there.
+    """
+
+    def __init__(self, df, chamber, threshold=0.8, min_common=10,
+                 block_size=256):
+
+        df, X, cast = chamber_votes(df, chamber)
+
+        self._chamber = chamber
+        self._members = df[['Party', 'State']]
+        self._threshold = threshold
+        self._min_common = min_common
+        self._block_size = block_size
+        X = X[:, cast]
+        self._S = np.where(X == 1, 1,
+                           np.where(X == 0, -1, 0)).astype(np.float32)
+        self._V = np.abs(self._S)
+        self._adjacency = None
+
+    @property
+    def members(self):
+        return self._members
+
+    @property
+    def adjacency(self):
+
+        if self._adjacency is None:
+            self._adjacency = self.build()
+
+        return self._adjacency
+
+    def build(self):
+        """Returns the symmetric sparse adjacency matrix, weighted by the
+        agreement rate.
+        """
+
+        S, V = self._S, self._V
+        n = S.shape[0]
+        rows, cols, weights = [], [], []
+
+        for start in range(0, n, self._block_size):
+
+            stop = min(start + self._block_size, n)
+            common = V[start:stop].dot(V.T)
+            agree = (common + S[start:stop].dot(S.T)) / 2.
+
+            rate = agree / np.maximum(common, 1)
+            keep = (rate >= self._threshold) & (common >= self._min_common)
+            # Upper triangle only; the matrix is symmetrized below.
+            keep &= np.arange(n)[None, :] > np.arange(start, stop)[:, None]
+
+            i, j = np.nonzero(keep)
+            rows.append(i + start)
+            cols.append(j)
+            weights.append(rate[i, j])
+
+        i, j = np.concatenate(rows), np.concatenate(cols)
+        w = np.concatenate(weights)
+        upper = sp.csr_matrix((w, (i, j)), shape=(n, n))
+
+        return (upper + upper.T).tocsr()
+
+    def to_graphml(self, path, communities=None):
+        """Write the graph as GraphML, with party, state and community as node
+        attributes and the agreement rate as edge weight.
+        """
+
+        upper = sp.triu(self.adjacency, k=1).tocoo()
+        names = [quoteattr(name) for name in self.members.index]
+
+        with io.open(path, 'w', encoding='utf-8') as gfile:
+
+            gfile.write(
+                u'<?xml version="1.0" encoding="UTF-8"?>\n'
+                u'<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                u'<key id="party" for="node" attr.name="party" '
+                u'attr.type="string"/>\n'
+                u'<key id="state" for="node" attr.name="state" '
+                u'attr.type="string"/>\n'
+                u'<key id="community" for="node" attr.name="community" '
+                u'attr.type="int"/>\n'
+                u'<key id="weight" for="edge" attr.name="weight" '
+                u'attr.type="double"/>\n'
+                u'<graph id="{}" edgedefault="undirected">\n'.format(
+                    self._chamber))
+
+            for i, (party, state) in enumerate(zip(self.members.Party,
+                                                   self.members.State)):
+
+                community = u'' if communities is None else \
+                    u'<data key="community">{}</data>'.format(communities[i])
+                gfile.write(
+                    u'<node id={}><data key="party">{}</data>'
+                    u'<data key="state">{}</data>{}</node>\n'.format(
+                        names[i], escape(u'{}'.format(party)),
+                        escape(u'{}'.format(state)), community))
+
+            for i, j, w in zip(upper.row, upper.col, upper.data):
+                gfile.write(
+                    u'<edge source={} target={}>'
+                    u'<data key="weight">{:.4f}</data></edge>\n'.format(
+                        names[i], names[j], w))
+
+            gfile.write(u'</graph>\n</graphml>\n')
+
+
+def modularity(adjacency, communities, resolution=1.0):
+    """Newman-Girvan modularity of a partition of a weighted graph.
+    """
+
+    k = np.asarray(adjacency.sum(axis=1)).ravel()
+    m2 = k.sum()
+
+    if m2 == 0:
+        return 0.
+
+    n = len(communities)
+    P = sp.csr_matrix((np.ones(n), (np.arange(n), communities)))
+    inside = P.T.dot(adjacency).dot(P).diagonal()
+    total = P.T.dot(k)
+
+    return float((inside - resolution * total ** 2 / m2).sum() / m2)
+
+
+def _local_moving(A, resolution, rng):
+    """One Louvain level: move nodes to the neighboring community with the
+    largest modularity gain until no move improves it. Returns consecutive
+    community labels.
+    """
+
+    k = np.asarray(A.sum(axis=1)).ravel()
+    m2 = k.sum()
+    labels = np.arange(A.shape[0])
+    total = k.copy()
+    improved = True
+
+    while improved and m2 > 0:
+
+        improved = False
+
+        for i in rng.permutation(A.shape[0]):
+
+            neighbors = A.indices[A.indptr[i]:A.indptr[i + 1]]
+            weights = A.data[A.indptr[i]:A.indptr[i + 1]]
+            weights = weights[neighbors != i]
+            neighbors = neighbors[neighbors != i]
+
+            current = labels[i]
+            total[current] -= k[i]
+
+            if len(neighbors):
+                candidates, inverse = np.unique(labels[neighbors],
+                                                return_inverse=True)
+                links = np.bincount(inverse, weights=weights)
+                gains = links - resolution * total[candidates] * k[i] / m2
+                best = np.argmax(gains)
+
+                stay = links[candidates == current].sum() - \
+                    resolution * total[current] * k[i] / m2
+
+                if gains[best] > stay + 1e-12 and candidates[best] != current:
+                    current = candidates[best]
+                    improved = True
+
+            labels[i] = current
+            total[current] += k[i]
+
+    return np.unique(labels, return_inverse=True)[1]
+
+
+def louvain(adjacency, resolution=1.0, random_state=0):
+    """Louvain community detection: alternate local moving with collapsing
+    communities into nodes (A' = P^T A P) until the partition stops changing.
+    """
+
+    rng = np.random.RandomState(random_state)
+    A = sp.csr_matrix(adjacency, dtype=np.float64)
+    membership = np.arange(A.shape[0])
+
+    while A.shape[0] > 1:
+
+        communities = _local_moving(A, resolution, rng)
+
+        if communities.max() + 1 == A.shape[0]:
+            break
+
+        membership = communities[membership]
+        n = A.shape[0]
+        P = sp.csr_matrix((np.ones(n), (np.arange(n), communities)))
+        A = P.T.dot(A).dot(P).tocsr()
+
+    return membership
+
+
+class SessionNetwork:
+    """Co-voting graphs, communities and summary statistics of both chambers
+    of a session; graphs are saved in ../../data/processed/.
+    """
+
+    def __init__(self, session, threshold=0.8, min_common=10):
+
+        self._ROOT = str(Path(os.getcwd()).parents[1])
+        self._data_path = os.path.join(self._ROOT, 'data/processed/')
+        self._session_number = str(session)
+        self._threshold = threshold
+        self._min_common = min_common
+
+    @property
+    def data_path(self):
+        return self._data_path
+
+    def graph_file(self, chamber):
+
+        filehandle = '_'.join([self._session_number, chamber,
+                               'covoting.graphml'])
+        return os.path.join(self._data_path, filehandle)
+
+    def statistics(self, graph, communities):
+        """Node, edge and community statistics of one chamber.
+        """
+
+        A = graph.adjacency
+        n = A.shape[0]
+        degree = np.diff(A.indptr)
+        upper = sp.triu(A, k=1).tocoo()
+        party = party_codes(graph.members.Party, PARTY_CODES)
+        sizes = np.bincount(communities)
+
+        # Share of each community's members in its largest party.
+        purity = np.nan
+        largest, mean_degree = 0., 0.
+        mean_agreement, cross_party = np.nan, np.nan
+
+        if n:
+            purity = pd.crosstab(communities,
+                                 party).max(axis=1).sum() / float(n)
+            largest, mean_degree = sizes.max() / float(n), degree.mean()
+
+        if upper.nnz:
+            mean_agreement = upper.data.mean()
+            cross_party = float((party[upper.row] != party[upper.col]).mean())
+
+        return {'session': self._session_number, 'chamber': graph._chamber,
+                'n_nodes': n, 'n_edges': upper.nnz,
+                'density': 2. * upper.nnz / (n * (n - 1)) if n > 1 else 0.,
+                'mean_degree': mean_degree,
+                'isolated': int((degree == 0).sum()),
+                'mean_agreement': mean_agreement,
+                'cross_party_edges': cross_party,
+                'n_communities': len(sizes), 'largest_community': largest,
+                'modularity': modularity(A, communities),
+                'party_purity': purity}
+
+    def build(self, df):
+        """Returns the statistics of both chambers and writes their graphs.
+        """
+
+        stats = []
+
+        for chamber in ['s', 'h']:
+
+            graph = CoVotingGraph(df, chamber, threshold=self._threshold,
+                                  min_common=self._min_common)
+            communities = louvain(graph.adjacency)
+            graph.to_graphml(self.graph_file(chamber), communities)
+            stats.append(self.statistics(graph, communities))
+
+        return stats
+
+
+@click.command()
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--all', is_flag=True,
+              help='Process all available sessions data.')
+@click.option('--threshold', default=0.8,
+              help='Minimum agreement rate for an edge.')
+@click.option('--min-common', default=10,
+              help='Minimum measures voted on by both members.')
+def main(session, all, threshold, min_common):
+    """ Script to build co-voting graphs and detect voting blocs.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('building co-voting graphs')
+
+    sessions = [str(x) for x in range(75, 114)] if all else [session]
+    stats = []
+
+    for session in sessions:
+
+        network = SessionNetwork(session, threshold=threshold,
+                                 min_common=min_common)
+        stats.extend(network.build(Features(session).load_records()))
+
+    columns = ['session', 'chamber', 'n_nodes', 'n_edges', 'density',
+               'mean_degree', 'isolated', 'mean_agreement',
+               'cross_party_edges', 'n_communities', 'largest_community',
+               'modularity', 'party_purity']
+    df_stats = pd.DataFrame(stats, columns=columns)
+    filehandle = 'network_stats.csv' if all else \
+        '_'.join([session, 'network_stats.csv'])
+    df_stats.to_csv(os.path.join(network.data_path, filehandle), index=False)
+    print(df_stats.to_string(index=False))
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+"""
+pivotal.py
+---------------------
+Functions for finding the close votes of a session and the members who
+decided them: margins and party breakdowns of every measure, the members who
+voted against their party, and those whose switch alone would have flipped
+the outcome, all from array operations on the vote matrix of a chamber.
+"""
+import os
+import sys
+from pathlib import Path
+import click
+import logging
+import numpy as np
+import pandas as pd
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.extend([os.path.join(_SRC, 'instrumentation'),
+                 os.path.join(_SRC, 'data')])
+from build_features import Features  # noqa: E402
+from normalize import PARTY_CODES  # noqa: E402
+from instrument import RunReport  # noqa: E402
+from chamber import chamber_votes, party_codes, party_onehot  # noqa: E402
+
+
+class PivotalVotes:
+    """Close votes and swing members of one chamber. A measure passes when
+    its yeas outnumber its nays (supermajority thresholds are not modeled).
+    A member is pivotal on a measure when switching their vote alone would
+    flip the outcome, and defects when voting against the majority of their
+    party. Measures look like this:
+
+    vote_id  yeas  nays  margin  margin_share  close  party_line  pivotal
+    s123-..  51    49    2       0.02          True   True        51
+
+    (with the number of defectors, and yeas and nays by party), and members
+    like this:
+
+    Name     Party  n_votes  defections  close_defections  pivotal
+    Manchin  D      640      61          9                 24
+
+    (with pivotal_defections, the pivotal votes cast against the party).
+    """
+
+    def __init__(self, df, chamber, close=0.1):
+
+        df, X, cast = chamber_votes(df, chamber)
+
+        self._chamber = chamber
+        self._close = close
+        self._members = df[['Party', 'State']]
+        self._vote_ids = np.asarray(df.columns.tolist()[3:])[cast]
+        self._yea = X[:, cast] == 1
+        self._nay = X[:, cast] == 0
+        self._party = party_codes(df.Party, PARTY_CODES)
+
+    @property
+    def chamber(self):
+        return self._chamber
+
+    @property
+    def vote_ids(self):
+        return self._vote_ids
+
+    def party_votes(self):
+        """Yeas and nays of each party on every measure, both (parties x
+        measures), as one-hot products with the vote matrix.
+        """
+
+        onehot = party_onehot(self._party, len(PARTY_CODES))
+        return onehot.T.dot(self._yea), onehot.T.dot(self._nay)
+
+    def defections(self, party_yeas, party_nays):
+        """(members x measures) mask of the votes cast against the majority
+        of the member's own party (never on a tie within the party).
+        """
+
+        position = np.sign(party_yeas - party_nays)
+        # Members of unknown party (code -1) have no position to defect from.
+        position = np.vstack([position, np.zeros((1, position.shape[1]))])
+        member_position = position[self._party]
+
+        return ((self._yea & (member_position < 0)) |
+                (self._nay & (member_position > 0)))
+
+    def pivotal(self, yeas, nays):
+        """(members x measures) mask of the votes whose switch alone would
+        flip the outcome: a yea on a measure passed by 2 or less, or a nay on
+        a measure that failed by 1 or less (a tie fails).
+        """
+
+        difference = yeas - nays
+        passed = difference > 0
+        deciding_yea = passed & (difference <= 2)
+        deciding_nay = ~passed & (difference >= -1)
+
+        return ((self._yea & deciding_yea[None, :]) |
+                (self._nay & deciding_nay[None, :]))
+
+    def analyze(self):
+        """Returns (measures, members): the margin, party breakdown, pivotal
+        and defecting votes of every measure, and the per-member counts of
+        the swing table, unranked.
+        """
+
+        yeas = self._yea.sum(axis=0)
+        nays = self._nay.sum(axis=0)
+        party_yeas, party_nays = self.party_votes()
+        defect = self.defections(party_yeas, party_nays)
+        pivotal = self.pivotal(yeas, nays)
+
+        margin = np.abs(yeas - nays)
+        margin_share = margin / np.maximum(yeas + nays, 1).astype(float)
+        close = margin_share <= self._close
+
+        df_measures = pd.DataFrame(
+            index=pd.Index(self._vote_ids, name='vote_id'))
+        df_measures['chamber'] = self.chamber
+
+        for column, values in [('yeas', yeas), ('nays', nays),
+                               ('margin', margin),
+                               ('margin_share', margin_share),
+                               ('close', close)]:
+            df_measures[column] = values
+
+        for p, party in enumerate(PARTY_CODES):
+            df_measures['yea_' + party] = party_yeas[p].astype(int)
+            df_measures['nay_' + party] = party_nays[p].astype(int)
+
+        d, r = PARTY_CODES.index('D'), PARTY_CODES.index('R')
+        # As in timeline.py: a majority of Democrats opposes a majority of
+        # Republicans.
+        df_measures['party_line'] = (
+            np.sign(party_yeas[d] - party_nays[d]) *
+            np.sign(party_yeas[r] - party_nays[r])) < 0
+        df_measures['pivotal'] = pivotal.sum(axis=0)
+        df_measures['defectors'] = defect.sum(axis=0)
+
+        voted = self._yea | self._nay
+        is_close = close.astype(int)
+        df_members = self._members.copy()
+        df_members['chamber'] = self.chamber
+        df_members['n_votes'] = voted.sum(axis=1)
+        df_members['n_close'] = voted.dot(is_close)
+        df_members['defections'] = defect.sum(axis=1)
+        df_members['close_defections'] = defect.dot(is_close)
+        df_members['pivotal'] = pivotal.sum(axis=1)
+        df_members['pivotal_defections'] = (pivotal & defect).sum(axis=1)
+        df_members['defection_rate'] = (
+            df_members.defections /
+            np.maximum(df_members.n_votes, 1).astype(float))
+
+        return df_measures, df_members
+
+    @staticmethod
+    def rank(df_members):
+        """Swing table: members ranked by votes that decided an outcome
+        against their party, then by defections on close votes, then by
+        defection rate.
+        """
+
+        df = df_members.sort_values(
+            ['pivotal_defections', 'close_defections', 'defection_rate'],
+            ascending=False)
+        df.insert(0, 'rank', np.arange(1, len(df) + 1))
+
+        return df
+
+
+class SessionPivotal:
+    """Reads the processed dataframe and measure metadata of a session and
+    writes its close votes and swing table, both chambers stacked.
+    """
+
+    def __init__(self, session):
+
+        self._ROOT = str(Path(os.getcwd()).parents[1])
+        self._data_path = os.path.join(self._ROOT, 'data/processed/')
+        self._session_number = str(session)
+        self._filehandle = '_'.join([self._session_number, 'measures.csv'])
+        self._measures_file = os.path.join(self._data_path, self._filehandle)
+
+    @property
+    def session_number(self):
+        return self._session_number
+
+    @property
+    def processed(self):
+        """True if the session has a processed dataframe to analyze.
+        """
+
+        return os.path.isfile(os.path.join(self._data_path, '_'.join(
+            [self._session_number, 'dataframe.csv'])))
+
+    def load_measures(self):
+        """Date and result of every measure, from the measures.csv written by
+        ../data/make_dataset.py; None for sessions processed without one.
+        """
+
+        if not os.path.isfile(self._measures_file):
+            return None
+
+        return pd.read_csv(self._measures_file,
+                           encoding='utf-8').set_index('vote_id')
+
+    def build(self, df, close=0.1):
+        """Returns (close votes, swing table) of the Senate and House.
+        """
+
+        measures, members = [], []
+
+        for chamber in ['s', 'h']:
+
+            pivotal = PivotalVotes(df, chamber, close=close)
+            df_measures, df_members = pivotal.analyze()
+            measures.append(df_measures)
+            members.append(PivotalVotes.rank(df_members))
+
+        # Party columns of the parties that cast a vote in either chamber.
+        absent = [column for party in PARTY_CODES
+                  for column in ['yea_' + party, 'nay_' + party]
+                  if not any(df[['yea_' + party, 'nay_' + party]].values.any()
+                             for df in measures)]
+        df_measures = pd.concat(measures).drop(absent, axis=1)
+        meta = self.load_measures()
+
+        if meta is not None:
+            df_measures = meta[['date', 'result']].join(df_measures,
+                                                        how='right')
+
+        return df_measures, pd.concat(members)
+
+    def to_file(self, df_measures, df_swing):
+        """Saves ../../data/processed/<session>_close_votes.csv (close votes
+        only, closest first) and <session>_swing.csv.
+        """
+
+        df_close = df_measures[df_measures.close].sort_values('margin_share')
+        df_close.to_csv(os.path.join(self._data_path, '_'.join(
+            [self.session_number, 'close_votes.csv'])), encoding='utf-8')
+        df_swing.to_csv(os.path.join(self._data_path, '_'.join(
+            [self.session_number, 'swing.csv'])), encoding='utf-8')
+
+
+@click.command()
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--all', is_flag=True,
+              help='Process all available sessions data.')
+@click.option('--close', default=0.1,
+              help='Largest margin, as a share of the votes cast, of a close '
+                   'vote.')
+@click.option('--profile', is_flag=True,
+              help='Also save cProfile statistics of the run.')
+def main(session, all, close, profile):
+    """ Script to find the close votes and swing members of a session.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('finding close votes and swing members')
+
+    report = RunReport('pivotal', profile=profile)
+    sessions = [str(x) for x in range(75, 114)] if all else [session]
+
+    for session in sessions:
+
+        analysis = SessionPivotal(session)
+
+        if not analysis.processed:
+            logger.info('session %s has no processed dataframe, skipped',
+                        session)
+            continue
+
+        with report.stage(session, 'load'):
+            df = Features(session).load_records()
+
+        with report.stage(session, 'analyze', input=df):
+            df_measures, df_swing = analysis.build(df, close=close)
+
+        with report.stage(session, 'write', output=df_measures):
+            analysis.to_file(df_measures, df_swing)
+
+        top = df_swing[df_swing['rank'] <= 3]
+        logger.info('session %s: %d close votes of %d; top swing: %s',
+                    session, df_measures.close.sum(), len(df_measures),
+                    ', '.join(top.index))
+
+    logger.info('run report saved in %s\n%s', report.to_file(),
+                report.summary())
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+"""
+progressive.py
+---------------------
+Functions for a quick look at a large chamber (or the all-Congress body): a
+subset of landmark members is embedded with t-SNE, and every other member is
+placed from its nearest landmarks in the SVD space. The full t-SNE can then
+be refined from that preview in a background thread.
+"""
+import threading
+import numpy as np
+
+
+LANDMARK_METHODS = ['kmeans++', 'stratified']
+
+
+def make_tsne(n_iter=None, **kwargs):
+    """TSNE with n_iter iterations; scikit-learn renamed n_iter to max_iter.
+    """
+
+    from sklearn.manifold import TSNE
+
+    if n_iter is None:
+        return TSNE(**kwargs)
+
+    try:
+        return TSNE(max_iter=n_iter, **kwargs)
+
+    except TypeError:
+        return TSNE(n_iter=n_iter, **kwargs)
+
+
+def squared_distances(A, B):
+    """(len(A) x len(B)) squared Euclidean distances, as one product.
+    """
+
+    D = (A ** 2).sum(axis=1)[:, None] + (B ** 2).sum(axis=1)[None, :] - \
+        2 * A.dot(B.T)
+    return np.maximum(D, 0)
+
+
+def kmeans_plusplus(X, n_landmarks, random_state=0):
+    """Rows of X picked by k-means++ seeding: each next landmark is drawn with
+    probability proportional to its squared distance to the nearest landmark
+    so far, so sparse regions of the chamber are covered too.
+    """
+
+    rng = np.random.RandomState(random_state)
+    landmarks = [rng.randint(len(X))]
+    closest = squared_distances(X, X[landmarks]).ravel()
+
+    for _ in range(1, n_landmarks):
+
+        total = closest.sum()
+
+        if total <= 0:
+            break
+
+        landmark = rng.choice(len(X), p=closest / total)
+        landmarks.append(landmark)
+        closest = np.minimum(closest,
+                             squared_distances(X, X[[landmark]]).ravel())
+
+    return np.array(landmarks)
+
+
+def stratified(strata, n_landmarks, random_state=0):
+    """Rows drawn at random within every stratum (e.g. party), in proportion
+    to its size and with at least one row per stratum.
+    """
+
+    rng = np.random.RandomState(random_state)
+    strata = np.asarray(strata)
+    landmarks = []
+
+    for stratum in np.unique(strata.astype(str)):
+
+        rows = np.flatnonzero(strata.astype(str) == stratum)
+        n = max(1, int(round(n_landmarks * len(rows) / float(len(strata)))))
+        landmarks.extend(rng.choice(rows, min(n, len(rows)), replace=False))
+
+    return np.sort(landmarks)
+
+
+def interpolate(X, landmarks, Y_landmarks, n_neighbors=5):
+    """Places every row of X at the inverse-distance weighted mean of the
+    embedding Y_landmarks of its n_neighbors nearest landmarks in X. Landmarks
+    keep their own coordinates.
+    """
+
+    n_neighbors = min(n_neighbors, len(landmarks))
+    D = np.sqrt(squared_distances(X, X[landmarks]))
+    nearest = np.argpartition(D, n_neighbors - 1, axis=1)[:, :n_neighbors]
+    rows = np.arange(len(X))[:, None]
+
+    weights = 1. / np.maximum(D[rows, nearest], 1e-12)
+    weights /= weights.sum(axis=1)[:, None]
+    Y = (weights[:, :, None] * Y_landmarks[nearest]).sum(axis=1)
+    Y[landmarks] = Y_landmarks
+
+    return Y
+
+
+class ProgressiveEmbedding:
+    """t-SNE of X_trunc in two steps:
+
+    preview(): t-SNE of n_landmarks members only, chosen by k-means++ on the
+               SVD features or stratified by strata, the others interpolated
+               from their nearest landmarks;
+    refine():  full t-SNE of every member, initialized with the preview, in a
+               background thread; result() waits for it.
+    """
+
+    def __init__(self, X_trunc, n_landmarks=100, method='kmeans++',
+                 strata=None, n_neighbors=5, n_iter=500, random_state=0):
+
+        if method not in LANDMARK_METHODS:
+            raise ValueError(
+                'method must be one of {}'.format(LANDMARK_METHODS))
+
+        if method == 'stratified' and strata is None:
+            raise ValueError(
+                'stratified landmarks need strata, e.g. the parties')
+
+        self._X = np.asarray(X_trunc)
+        self._n_landmarks = min(n_landmarks, len(self._X))
+        self._method = method
+        self._strata = strata
+        self._n_neighbors = n_neighbors
+        self._n_iter = n_iter
+        self._random_state = random_state
+        self._landmarks = None
+        self._preview = None
+        self._thread = None
+        self._result = None
+        self._error = None
+
+    @property
+    def landmarks(self):
+        return self._landmarks
+
+    @property
+    def refining(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def select_landmarks(self):
+
+        if self._method == 'stratified':
+            return stratified(self._strata, self._n_landmarks,
+                              self._random_state)
+
+        return kmeans_plusplus(self._X, self._n_landmarks, self._random_state)
+
+    def preview(self):
+        """Preview coordinates of every member, (n x 2).
+        """
+
+        if self._preview is None:
+
+            self._landmarks = self.select_landmarks()
+            X_landmarks = self._X[self._landmarks]
+            perplexity = min(30., (len(self._landmarks) - 1) / 3.)
+            tSNE = make_tsne(n_iter=self._n_iter, n_components=2,
+                             perplexity=perplexity,
+                             random_state=self._random_state)
+            Y_landmarks = tSNE.fit_transform(X_landmarks)
+            self._preview = interpolate(self._X, self._landmarks, Y_landmarks,
+                                        n_neighbors=self._n_neighbors)
+
+        return self._preview
+
+    def _refine(self, callback):
+
+        from affinities import fit_transform
+
+        try:
+            # Same small spread as scikit-learn's own PCA initialization.
+            init = self.preview()
+            init = 1e-4 * (init - init.mean(axis=0)) / init[:, 0].std()
+            tSNE = make_tsne(n_components=2, init=init.astype(self._X.dtype),
+                             random_state=self._random_state)
+            self._result = fit_transform(tSNE, self._X)
+
+        except Exception as e:
+            self._error = e
+            return
+
+        if callback is not None:
+            callback(self._result)
+
+    def refine(self, callback=None):
+        """Starts the full t-SNE in a background thread, and returns it;
+        callback, if any, is called with the result from that thread.
+        """
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refine,
+                                            args=(callback,))
+            self._thread.daemon = True
+            self._thread.start()
+
+        return self._thread
+
+    def result(self, timeout=None):
+        """Full embedding, once refine() is done (None on timeout).
+        """
+
+        self.refine().join(timeout)
+
+        if self._error is not None:
+            raise self._error
+
+        return self._result
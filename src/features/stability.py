@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+"""
+stability.py
+---------------------
+Functions for judging whether the structure of a t-SNE plot is real: the same
+SVD features are embedded with many seeds (and perplexities) in parallel, and
+every member is scored by how consistently it keeps the same neighbors.
+"""
+import os
+import click
+import logging
+import datetime
+import itertools
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+
+from build_features import Features, load_pyplot
+
+
+# SVD features of the workers, set once per process by _init_worker.
+_X = None
+
+
+def _init_worker(shared, shape):
+    """Wraps the shared buffer as an array, without copying, so the input
+    matrix is not pickled for every task.
+    """
+
+    global _X
+    _X = np.frombuffer(shared, dtype=np.float64).reshape(shape)
+
+
+def _embed(task):
+
+    from sklearn.manifold import TSNE
+    from affinities import fit_transform
+
+    seed, perplexity = task
+    tSNE = TSNE(n_components=2, perplexity=perplexity, random_state=seed)
+    return fit_transform(tSNE, _X)
+
+
+def knn_indicator(X, n_neighbors):
+    """Dense (n x n) 0/1 matrix of the n_neighbors nearest neighbors of
+    every row of X, excluding itself.
+    """
+
+    from sklearn.neighbors import NearestNeighbors
+
+    nn = NearestNeighbors(n_neighbors=n_neighbors + 1).fit(X)
+    neighbors = nn.kneighbors(X, return_distance=False)[:, 1:]
+    A = np.zeros((X.shape[0], X.shape[0]))
+    A[np.arange(X.shape[0])[:, None], neighbors] = 1
+
+    return A
+
+
+class Stability:
+    """Runs one t-SNE per (seed, perplexity) over X_trunc, in a pool of worker
+    processes sharing X_trunc through a RawArray, and scores every member:
+
+    consistency: mean overlap of its k nearest neighbors between any two runs,
+                 from the counts C = sum_r A_r of the runs' kNN indicators;
+    fidelity:    mean overlap of its k nearest neighbors in the runs with
+                 those in the SVD space.
+    """
+
+    def __init__(self, X_trunc, seeds=range(10), perplexities=(30,),
+                 n_neighbors=10, n_jobs=None):
+
+        self._X = np.ascontiguousarray(X_trunc, dtype=np.float64)
+        self._tasks = list(itertools.product(seeds, perplexities))
+        self._n_neighbors = n_neighbors
+        self._n_jobs = n_jobs or multiprocessing.cpu_count()
+
+    @property
+    def tasks(self):
+        return self._tasks
+
+    def run(self):
+        """Returns the list of embeddings, in the order of tasks.
+        """
+
+        from affinities import Affinities, supported
+
+        # Every seed of a perplexity shares its affinities: compute them once
+        # here, so that the workers only read them.
+        if supported():
+
+            for perplexity in set(p for _, p in self._tasks):
+                Affinities(self._X, perplexity=perplexity).get()
+
+        shared = RawArray('d', self._X.size)
+        np.frombuffer(shared, dtype=np.float64)[:] = self._X.ravel()
+
+        pool = multiprocessing.Pool(min(self._n_jobs, len(self._tasks)),
+                                    initializer=_init_worker,
+                                    initargs=(shared, self._X.shape))
+
+        try:
+            embeddings = pool.map(_embed, self._tasks)
+
+        finally:
+            pool.close()
+            pool.join()
+
+        return embeddings
+
+    def scores(self, embeddings):
+        """Per-member consistency and fidelity, both between 0 and 1.
+        """
+
+        k, R = self._n_neighbors, len(embeddings)
+        C = np.zeros((self._X.shape[0], self._X.shape[0]))
+
+        for embedding in embeddings:
+            C += knn_indicator(embedding, k)
+
+        # Over all pairs of runs r < s, sum_j C_ij (C_ij - 1) / 2 counts the
+        # neighbors shared by member i in both.
+        shared_pairs = (C * (C - 1)).sum(axis=1) / 2.
+
+        if R > 1:
+            consistency = shared_pairs / (k * R * (R - 1) / 2.)
+
+        else:
+            consistency = np.ones(len(C))
+
+        fidelity = (C * knn_indicator(self._X, k)).sum(axis=1) / (k * R)
+
+        return consistency, fidelity
+
+
+class SessionStability:
+    """Stability analysis of one chamber of a session; scores are saved as
+    ../../data/processed/<session>_<chamber>_stability.csv.
+    """
+
+    def __init__(self, session, chamber):
+
+        self._features = Features(session)
+        self._session_number = str(session)
+        self._chamber = chamber
+
+    def build(self, seeds, perplexities, n_neighbors=10, n_jobs=None):
+        """Returns the scores of the chamber's members and the embedding of
+        the first run, for plotting.
+        """
+
+        df = self._features.load_records()
+        df, X_trunc = self._features.transform_SVD(df, self._chamber)
+
+        stability = Stability(X_trunc, seeds=seeds, perplexities=perplexities,
+                              n_neighbors=n_neighbors, n_jobs=n_jobs)
+        embeddings = stability.run()
+        consistency, fidelity = stability.scores(embeddings)
+
+        df_scores = df[['Party', 'State']].copy()
+        df_scores['consistency'] = consistency
+        df_scores['fidelity'] = fidelity
+
+        return df_scores, embeddings[0]
+
+    def to_file(self, df_scores):
+
+        embedding_file = self._features.embedding_file(self._chamber)
+        df_scores.to_csv(embedding_file.replace('embedding.csv',
+                                                'stability.csv'),
+                         encoding='utf-8')
+
+    def plot(self, df_scores, embedding):
+        """Overlay of the scores on the first run, in ../../reports/figures/:
+        points are filled by consistency and outlined by party.
+        """
+
+        plt = load_pyplot()
+        f, ax = plt.subplots()
+
+        colors = df_scores.Party.map({'D': 'b', 'R': 'r'}).fillna('g').values
+        points = ax.scatter(embedding[:, 0], embedding[:, 1],
+                            c=df_scores.consistency.values, cmap='viridis',
+                            vmin=0, vmax=1, edgecolors=colors,
+                            linewidths=1.5, s=40)
+        f.colorbar(points, ax=ax, label='Neighbor consistency')
+        ax.set_title('{} {} t-SNE stability'.format(
+            self._session_number,
+            'Senate' if self._chamber == 's' else 'House'))
+
+        today = datetime.date.today().strftime("%Y%m%d")
+        outfile = '_'.join((self._session_number, self._chamber, 'stability',
+                            today))
+        plt.savefig(self._features.figure_file(outfile), bbox_inches='tight')
+        plt.close(f)
+
+
+@click.command()
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--chamber', default='h', type=click.Choice(['s', 'h']),
+              help='Senate or House.')
+@click.option('--seeds', default=10,
+              help='Number of random seeds per perplexity.')
+@click.option('--perplexity', multiple=True, type=float,
+              help='t-SNE perplexity. Repeatable.')
+@click.option('--neighbors', default=10,
+              help='Neighbors compared between runs.')
+@click.option('--n-jobs', default=None, type=int,
+              help='Worker processes (default: all CPUs).')
+def main(session, chamber, seeds, perplexity, neighbors, n_jobs):
+    """ Script to score the stability of the t-SNE embedding of a chamber
+    across seeds and perplexities.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('running %d embeddings per perplexity', seeds)
+
+    stability = SessionStability(session, chamber)
+    df_scores, embedding = stability.build(range(seeds), perplexity or (30.,),
+                                           n_neighbors=neighbors,
+                                           n_jobs=n_jobs)
+    stability.to_file(df_scores)
+    stability.plot(df_scores, embedding)
+
+    logger.info('median consistency %.2f, median fidelity %.2f',
+                df_scores.consistency.median(), df_scores.fidelity.median())
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
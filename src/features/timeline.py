@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+
+"""
+timeline.py
+---------------------
+Functions for tracking polarization within a session, using a window of
+measures (or days) that slides over the date-ordered vote matrix.
+"""
+import os
+from pathlib import Path
+import click
+import logging
+import datetime
+import numpy as np
+import pandas as pd
+
+from build_features import Features, load_pyplot
+
+
+class Timeline:
+    """This class computes rolling-window party separation, party cohesion and
+    a low-rank (rank-k) projection for one chamber of a session. Window sums
+    come from cumulative sums over the measure axis, and the member Gram matrix
+    and its leading factors are updated as the window slides, rather than
+    recomputed for each window. The result looks like this:
+
+    date        n_measures  cohesion_D  cohesion_R  separation  unity
+    2013-01-03  50          0.91        0.88        0.72        0.66
+
+    with, for the same windows:
+
+    date        polarization  explained
+    2013-01-03  3.41          0.58
+    """
+
+    _PARTIES = ['D', 'R']
+
+    def __init__(self, df, measures, chamber, window=50, days=None, rank=2,
+                 n_power_iter=2):
+
+        self._chamber = chamber
+        self._window = window
+        self._days = days
+        self._rank = rank
+        self._n_power_iter = n_power_iter
+
+        df = df[df.Chamber == chamber]
+        measures = measures[(measures.chamber == chamber) &
+                            (measures.vote_id.isin(df.columns))]
+
+        X = df[measures.vote_id.tolist()].values
+        self._votes = np.where(X == 1, 1.0, np.where(X == 0, -1.0, 0.0))
+        self._party = np.asarray(df.Party)
+        self._dates = pd.to_datetime(measures.date.str[:10]).values
+
+    @property
+    def chamber(self):
+        return self._chamber
+
+    @property
+    def votes(self):
+        return self._votes
+
+    @property
+    def dates(self):
+        return self._dates
+
+    @staticmethod
+    def window_sums(cumulative, starts, ends):
+        """Sum of a per-measure quantity over [start, end) for every window,
+        given its cumulative sum with a leading zero.
+        """
+
+        return cumulative[..., ends] - cumulative[..., starts]
+
+    def windows(self):
+        """Return (days, starts, ends), one window per voting day. Each window
+        ends after the last measure of that day and spans either the last
+        `window` measures or the last `days` days.
+        """
+
+        days, last = np.unique(self.dates[::-1], return_index=True)
+        ends = len(self.dates) - last
+
+        if self._days is not None:
+            first_day = days - np.timedelta64(self._days - 1, 'D')
+            starts = np.searchsorted(self.dates, first_day, side='left')
+
+        else:
+            starts = np.maximum(ends - self._window, 0)
+
+        return days, starts, ends
+
+    def party_metrics(self, starts, ends):
+        """Rolling cohesion (Rice index) per party, party separation, and share
+        of party-unity votes, where a majority of Democrats oppose a majority
+        of Republicans.
+        """
+
+        metrics = {}
+        yea_fraction = {}
+
+        for party in self._PARTIES:
+
+            V = self.votes[self._party == party]
+            yeas = (V > 0).sum(axis=0)
+            nays = (V < 0).sum(axis=0)
+            cast = yeas + nays
+            voted = cast > 0
+
+            rice = np.abs(yeas - nays) / np.maximum(cast, 1).astype(float)
+            yea_fraction[party] = yeas / np.maximum(cast, 1).astype(float)
+
+            cumulative = np.cumsum(np.vstack([rice, voted]), axis=1)
+            cumulative = np.hstack([np.zeros((2, 1)), cumulative])
+            rice_sum, n_voted = self.window_sums(cumulative, starts, ends)
+
+            metrics['cohesion_' + party] = rice_sum / np.maximum(n_voted, 1)
+
+        difference = yea_fraction['D'] - yea_fraction['R']
+        unity = ((yea_fraction['D'] - 0.5) * (yea_fraction['R'] - 0.5)) < 0
+
+        cumulative = np.cumsum(np.vstack([np.abs(difference), unity]), axis=1)
+        cumulative = np.hstack([np.zeros((2, 1)), cumulative])
+        separation, unity_votes = self.window_sums(cumulative, starts, ends)
+
+        n_measures = np.maximum(ends - starts, 1)
+        metrics['separation'] = separation / n_measures
+        metrics['unity'] = unity_votes / n_measures
+
+        return metrics
+
+    def low_rank_metrics(self, starts, ends):
+        """Rolling rank-k projection of members. The Gram matrix G = V V^T of
+        the window is updated by adding the columns entering the window and
+        subtracting those leaving it; its leading eigenvectors are refined by
+        a few steps of subspace iteration, warm-started from the previous
+        window. Polarization is the distance between the Democrat and
+        Republican centroids on the first component, over the pooled std.
+        """
+
+        V = self.votes
+        is_dem = self._party == 'D'
+        is_rep = self._party == 'R'
+
+        polarization = np.zeros(len(ends))
+        explained = np.zeros(len(ends))
+
+        start, end = starts[0], ends[0]
+        G = np.dot(V[:, start:end], V[:, start:end].T)
+        eigenvalues, Q = np.linalg.eigh(G)
+        Q = Q[:, ::-1][:, :self._rank]
+
+        for w, (new_start, new_end) in enumerate(zip(starts, ends)):
+
+            if w:
+
+                if new_start < end:
+                    entering = V[:, end:new_end]
+                    leaving = V[:, start:new_start]
+                    G += np.dot(entering, entering.T) - \
+                        np.dot(leaving, leaving.T)
+
+                else:
+                    block = V[:, new_start:new_end]
+                    G = np.dot(block, block.T)
+
+                start, end = new_start, new_end
+
+                for _ in range(self._n_power_iter):
+                    Q, _ = np.linalg.qr(np.dot(G, Q))
+
+            eigenvalues = np.einsum('ij,ij->j', Q, np.dot(G, Q))
+            coordinates = Q * np.sqrt(np.maximum(eigenvalues, 0))
+            first = coordinates[:, 0]
+
+            if is_dem.any() and is_rep.any():
+
+                pooled = np.sqrt(
+                    (first[is_dem].var() + first[is_rep].var()) / 2.)
+                gap = abs(first[is_dem].mean() - first[is_rep].mean())
+                polarization[w] = gap / pooled if pooled > 0 else np.nan
+
+            trace = np.trace(G)
+            explained[w] = eigenvalues[0] / trace if trace > 0 else np.nan
+
+        return {'polarization': polarization, 'explained': explained}
+
+    def compute(self):
+        """Returns a dataframe, indexed by voting day, of the rolling metrics.
+        """
+
+        days, starts, ends = self.windows()
+
+        if not len(days):
+            return pd.DataFrame()
+
+        metrics = self.party_metrics(starts, ends)
+        metrics.update(self.low_rank_metrics(starts, ends))
+        metrics['n_measures'] = ends - starts
+
+        columns = ['n_measures', 'cohesion_D', 'cohesion_R', 'separation',
+                   'unity', 'polarization', 'explained']
+        df = pd.DataFrame(metrics, index=pd.DatetimeIndex(days, name='date'))
+        df['chamber'] = self.chamber
+
+        return df[['chamber'] + columns]
+
+
+class SessionTimeline:
+    """Reads the processed dataframe and measure metadata of a session and
+    writes the per-day polarization curves of both chambers.
+    """
+
+    def __init__(self, session):
+
+        self._ROOT = str(Path(os.getcwd()).parents[1])
+        self._data_path = os.path.join(self._ROOT, 'data/processed/')
+        self._session_number = str(session)
+        self._filehandle = '_'.join([self._session_number, 'measures.csv'])
+        self._measures_file = os.path.join(self._data_path, self._filehandle)
+
+    @property
+    def session_number(self):
+        return self._session_number
+
+    def load_measures(self):
+        """Read the measures.csv written by ../data/make_dataset.py.
+        """
+
+        return pd.read_csv(self._measures_file, encoding='utf-8')
+
+    def build(self, df, window=50, days=None, rank=2):
+        """Returns the timeline of the Senate and House, stacked.
+        """
+
+        measures = self.load_measures()
+        timelines = [Timeline(df, measures, chamber, window=window,
+                              days=days, rank=rank).compute()
+                     for chamber in ['s', 'h']]
+
+        return pd.concat(timelines)
+
+    def to_file(self, df_timeline):
+        """Saves the timeline as ../../data/processed/<session>_timeline.csv.
+        """
+
+        filehandle = '_'.join([self.session_number, 'timeline.csv'])
+        df_timeline.to_csv(os.path.join(self._data_path, filehandle),
+                           encoding='utf-8')
+
+    def plot(self, df_timeline):
+        """Plot polarization and party separation per day for both chambers,
+        in ../../reports/figures/.
+        """
+
+        plt = load_pyplot()
+        f, (senate, house) = plt.subplots(2, sharex=False, sharey=False)
+
+        for ax, chamber, title in [(senate, 's', 'Senate'),
+                                   (house, 'h', 'House')]:
+
+            df = df_timeline[df_timeline.chamber == chamber]
+            ax.plot(df.index, df.polarization, c='k', label='Polarization')
+            twin = ax.twinx()
+            twin.plot(df.index, df.separation, c='m', alpha=0.5,
+                      label='Separation')
+            twin.set_ylim([0, 1])
+            ax.set_title('{} {}'.format(title, self.session_number))
+
+        f.subplots_adjust(hspace=0.4)
+        f.autofmt_xdate()
+
+        today = datetime.date.today().strftime("%Y%m%d")
+        outfile = '_'.join((self.session_number, 'timeline', today))
+        plt.savefig(Features(self.session_number).figure_file(outfile),
+                    bbox_inches='tight')
+        plt.close(f)
+
+
+@click.command()
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--window', default=50,
+              help='Number of measures per window.')
+@click.option('--days', default=None, type=int,
+              help='Window length in days; overrides --window.')
+@click.option('--rank', default=2, help='Rank of the rolling projection.')
+@click.option('--plot', is_flag=True, help='Plot the polarization curves.')
+def main(session, window, days, rank, plot):
+    """ Script to compute rolling-window polarization within a session.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('building polarization timeline for session %s', session)
+
+    df = Features(session).load_records()
+
+    timeline = SessionTimeline(session)
+    df_timeline = timeline.build(df, window=window, days=days, rank=rank)
+    timeline.to_file(df_timeline)
+
+    if plot:
+        timeline.plot(df_timeline)
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+instrument.py
+---------------------
+Functions for recording what each stage of a run costs: wall time, CPU time,
+peak memory and input/output sizes per session and stage, written as a JSON
+and CSV run report in ../../reports/runs/, with an optional cProfile dump.
+"""
+import os
+import sys
+import io
+import csv
+import json
+import time
+import datetime
+import platform
+import resource
+from pathlib import Path
+from contextlib import contextmanager
+
+
+COLUMNS = ['session', 'stage', 'calls', 'wall_s', 'cpu_s', 'peak_rss_mb',
+           'rss_growth_mb', 'input', 'output']
+
+
+def cpu_seconds():
+    """User plus system CPU time of this process.
+    """
+
+    times = os.times()
+    return times[0] + times[1]
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far; ru_maxrss is in KB on
+    Linux and in bytes on macOS.
+    """
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024. ** 2 if sys.platform == 'darwin' else 1024.)
+
+
+def size_of(obj):
+    """Compact description of the size of a stage's input or output: bytes
+    of a file, shape of an array or dataframe, or length of a container.
+    """
+
+    if isinstance(obj, (str, type(u''))) and os.path.isfile(obj):
+        return os.path.getsize(obj)
+
+    if hasattr(obj, 'shape'):
+        return 'x'.join(str(n) for n in obj.shape)
+
+    try:
+        return len(obj)
+
+    except TypeError:
+        return obj
+
+
+class RunReport:
+    """Accumulates one record per (session, stage). A stage entered several
+    times, e.g. once per parsed file, adds up into the same record:
+
+    session  stage  calls  wall_s  cpu_s  peak_rss_mb  rss_growth_mb
+    113      parse  1212   4.210   4.180  88.2         21.3
+    113      svd_s  1      0.412   0.901  214.7        12.0
+
+    with the input and output size of each, e.g. 1212 files and 101x1804 to
+    101x50 arrays.
+    """
+
+    def __init__(self, command, profile=False):
+
+        self._ROOT = str(Path(os.getcwd()).parents[1])
+        self._report_path = os.path.join(self._ROOT, 'reports/runs/')
+        self._command = command
+        self._records = {}
+        self._order = []
+        self._started = datetime.datetime.now()
+        self._wall = time.time()
+        self._profiler = None
+
+        if profile:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @property
+    def records(self):
+        return [self._records[key] for key in self._order]
+
+    def record(self, session, stage):
+
+        key = (str(session), stage)
+
+        if key not in self._records:
+            self._records[key] = {'session': str(session), 'stage': stage,
+                                  'calls': 0, 'wall_s': 0., 'cpu_s': 0.,
+                                  'peak_rss_mb': 0., 'rss_growth_mb': 0.,
+                                  'input': None, 'output': None}
+            self._order.append(key)
+
+        return self._records[key]
+
+    def annotate(self, session, stage, **sizes):
+        """Set the input and/or output size of a stage.
+        """
+
+        self.record(session, stage).update((k, size_of(v))
+                                           for k, v in sizes.items())
+
+    @contextmanager
+    def stage(self, session, stage, **sizes):
+        """Times the body of the with statement as one call of the stage.
+        """
+
+        record = self.record(session, stage)
+        wall, cpu, rss = time.time(), cpu_seconds(), peak_rss_mb()
+
+        try:
+            yield record
+
+        finally:
+            peak = peak_rss_mb()
+            record['calls'] += 1
+            record['wall_s'] += time.time() - wall
+            record['cpu_s'] += cpu_seconds() - cpu
+            record['rss_growth_mb'] += peak - rss
+            record['peak_rss_mb'] = peak
+            record.update((k, size_of(v)) for k, v in sizes.items())
+
+    def to_file(self):
+        """Writes <command>_<timestamp>.json and .csv (and .prof with the
+        cProfile statistics, if profiling) to ../../reports/runs/. Returns
+        the path of the JSON report.
+        """
+
+        if not os.path.isdir(self._report_path):
+            os.makedirs(self._report_path)
+
+        stamp = self._started.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(self._report_path,
+                            '_'.join([self._command, stamp]))
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(base + '.prof')
+
+        report = {'command': self._command, 'argv': sys.argv[1:],
+                  'started': self._started.isoformat(),
+                  'python': platform.python_version(),
+                  'total_wall_s': time.time() - self._wall,
+                  'total_cpu_s': cpu_seconds(),
+                  'peak_rss_mb': peak_rss_mb(), 'stages': self.records}
+
+        with open(base + '.json', 'w') as jfile:
+            json.dump(report, jfile, indent=2, sort_keys=True)
+
+        if sys.version_info[0] > 2:
+            cfile = io.open(base + '.csv', 'w', newline='')
+
+        else:
+            cfile = open(base + '.csv', 'wb')
+
+        with cfile:
+            writer = csv.DictWriter(cfile, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+        return base + '.json'
+
+    def summary(self, n=10):
+        """The n most expensive records by wall time, one per line.
+        """
+
+        records = sorted(self.records, key=lambda r: -r['wall_s'])[:n]
+        return '\n'.join('{session:>5} {stage:<12} {calls:>6} {wall_s:9.3f}s '
+                         '{cpu_s:9.3f}s {peak_rss_mb:8.1f} MB'.format(**r)
+                         for r in records)
+
+
+class NullReport:
+    """Stand-in for RunReport when a class is used without instrumentation.
+    """
+
+    def annotate(self, session, stage, **sizes):
+        pass
+
+    @contextmanager
+    def stage(self, session, stage, **sizes):
+        yield {}
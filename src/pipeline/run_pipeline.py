@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+"""
+run_pipeline.py
+---------------------
+Runs a session end to end, ingest -> matrix -> SVD -> embedding -> plot
+(-> animation), handing in-memory objects from one stage to the next instead
+of round-tripping through the processed CSVs. Every stage caches its output
+in ../../data/interim/pipeline/<session>/ and can be skipped.
+"""
+import os
+import sys
+from pathlib import Path
+import click
+import logging
+import json
+import hashlib
+import pickle
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.extend([os.path.join(_SRC, 'data'), os.path.join(_SRC, 'features'),
+                 os.path.join(_SRC, 'visualization'),
+                 os.path.join(_SRC, 'instrumentation')])
+
+from make_dataset import Congress, Dataset  # noqa: E402
+from build_features import Features, PRECISIONS  # noqa: E402
+from instrument import RunReport, NullReport  # noqa: E402
+
+
+STAGES = ['ingest', 'matrix', 'svd', 'embedding', 'plot', 'animation']
+
+
+class Pipeline:
+    """Runs the stages of one session. A stage's cache key hashes its
+    parameters with the keys of the stages it reads from, so changing an
+    upstream parameter (or the raw data) invalidates everything downstream.
+    """
+
+    def __init__(self, session, skip=(), force=(), use_cache=True,
+                 n_features_SVD=50, animate=False, report=None,
+                 precision='float64'):
+
+        self._ROOT = str(Path(os.getcwd()).parents[1])
+        self._session_number = str(session)
+        self._cache_path = os.path.join(self._ROOT, 'data/interim/pipeline',
+                                        self._session_number)
+        self._skip = set(skip) if animate else set(skip) | {'animation'}
+        self._force = set(force)
+        self._use_cache = use_cache
+        self._n_features_SVD = n_features_SVD
+        self._precision = precision
+        self._keys = {}
+        self._results = {}
+        self._report = report or NullReport()
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def session_number(self):
+        return self._session_number
+
+    def cache_file(self, stage):
+        return os.path.join(self._cache_path, '.'.join([stage, 'pkl']))
+
+    def key(self, stage, params, depends):
+        """Cache key of a stage from its parameters and its inputs' keys.
+        """
+
+        blob = json.dumps([stage, params, [self._keys[d] for d in depends]],
+                          sort_keys=True)
+        self._keys[stage] = hashlib.md5(blob.encode('utf-8')).hexdigest()
+
+        return self._keys[stage]
+
+    def load(self, stage, key):
+        """Returns the cached output of a stage, or None if it is missing or
+        was computed from different inputs.
+        """
+
+        try:
+            with open(self.cache_file(stage), 'rb') as pfile:
+                cached_key, result = pickle.load(pfile)
+
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        return result if cached_key == key else None
+
+    def save(self, stage, key, result):
+
+        if not os.path.isdir(self._cache_path):
+            os.makedirs(self._cache_path)
+
+        with open(self.cache_file(stage), 'wb') as pfile:
+            pickle.dump((key, result), pfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def stage(self, stage, compute, params=None, depends=(), cache=True):
+        """Run (or reuse) one stage. A skipped stage still hands on its cached
+        output when there is one; otherwise it and its dependents are skipped.
+        """
+
+        if any(self._results.get(d) is None for d in depends):
+            self._logger.info('%s: skipped, missing upstream output', stage)
+            self._results[stage] = None
+            return None
+
+        key = self.key(stage, params or {}, depends)
+        result = None
+
+        if self._use_cache and cache and stage not in self._force:
+            result = self.load(stage, key)
+
+        if result is not None:
+            self._logger.info('%s: cached', stage)
+
+        elif stage in self._skip:
+            self._logger.info('%s: skipped', stage)
+
+        else:
+            self._logger.info('%s: running', stage)
+
+            with self._report.stage(self.session_number, stage):
+                result = compute(*[self._results[d] for d in depends])
+
+            if cache:
+                self.save(stage, key, result)
+
+        self._results[stage] = result
+        return result
+
+    def raw_fingerprint(self, congress):
+        """Number and latest modification time of the raw vote files, so the
+        ingest cache is invalidated when new votes land.
+        """
+
+        if congress.archive is not None:
+            return congress.archive.fingerprint()
+
+        n_files, latest = 0, 0.
+
+        for dirpath, _, filenames in os.walk(congress.input_filepath):
+
+            for filename in filenames:
+
+                if filename.endswith('.json'):
+                    n_files += 1
+                    latest = max(latest, os.path.getmtime(
+                        os.path.join(dirpath, filename)))
+
+        return {'n_files': n_files, 'latest': latest}
+
+    def ingest(self):
+        congress = Congress(self.session_number, report=self._report)
+        return congress.get_measures_voted_on()
+
+    def matrix(self, ingested):
+        """Builds the vote matrix, writes the processed CSVs for the other
+        tools, and normalizes names and parties once for the whole run.
+        """
+
+        measures_voted_on, records = ingested
+        dataset = Dataset()
+        dataframe = dataset.construct(measures_voted_on, records,
+                                      dtype=PRECISIONS[self._precision][0])
+        dataset.to_file(self.session_number, dataframe)
+        dataset.measures_to_file(self.session_number, measures_voted_on)
+
+        return Features(self.session_number, data=dataframe.reset_index(),
+                        precision=self._precision).load_records()
+
+    def svd(self, df):
+        features = Features(self.session_number, precision=self._precision)
+        return {chamber: features.transform_SVD(
+                    df, chamber, n_features_SVD=self._n_features_SVD)
+                for chamber in ['s', 'h']}
+
+    def embedding(self, reduced):
+        features = Features(self.session_number, precision=self._precision)
+        embeddings = {}
+
+        for chamber, scale in [('s', 'robust'), ('h', 'standard')]:
+            df, X_trunc = reduced[chamber]
+            embeddings[chamber] = features.transform_tSNE(df, X_trunc,
+                                                          scale=scale)
+            features.embedding_to_file(embeddings[chamber], chamber)
+
+        return embeddings
+
+    def plot(self, embeddings):
+        features = Features(self.session_number)
+        features.plot_2D_tSNE(embeddings['s'], embeddings['h'],
+                              self.session_number)
+        return True
+
+    def animation(self, df, reduced):
+        """t-SNE animation per chamber, reusing the SVD features of the run.
+        """
+
+        import numpy as np
+        import pandas as pd
+        from sklearn.manifold import TSNE
+        from visualize import Animation, load_tsne_animate
+
+        tsneAnimate = load_tsne_animate()
+
+        for chamber in ['s', 'h']:
+
+            df_chamber, X_trunc = reduced[chamber]
+            animation = Animation(self.session_number, chamber,
+                                  data=df_chamber.reset_index(),
+                                  normalized=True)
+            congressmen, majority = animation.load_select_congressmen(chamber)
+
+            df_X = pd.DataFrame(X_trunc, index=df_chamber.index)
+            df_y = df_chamber[['Party', 'State']].reset_index()
+
+            tsne = tsneAnimate(TSNE(random_state=42, learning_rate=1000))
+            tsne.trajectory_dtype = np.dtype(PRECISIONS[self._precision][1])
+            tsne.animate(df_X, df_y, congressmen, animation.session_number,
+                         animation.chamber)
+
+        return True
+
+    def run(self, ingest=None):
+        """Runs the stages; ingest, if given, returns the ingested session in
+        place of a full parse of the raw data (see watch.py).
+        """
+
+        congress = Congress(self.session_number)
+        self.stage('ingest', ingest or self.ingest,
+                   params=self.raw_fingerprint(congress))
+        self.stage('matrix', self.matrix,
+                   params={'precision': self._precision}, depends=['ingest'])
+        self.stage('svd', self.svd,
+                   params={'n_features_SVD': self._n_features_SVD},
+                   depends=['matrix'])
+        self.stage('embedding', self.embedding, depends=['svd'])
+        self.stage('plot', self.plot, depends=['embedding'], cache=False)
+        self.stage('animation', self.animation, depends=['matrix', 'svd'],
+                   cache=False)
+
+        return self._results
+
+
+@click.command()
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--all', is_flag=True,
+              help='Process all available sessions data.')
+@click.option('--skip', multiple=True, type=click.Choice(STAGES),
+              help='Stage to skip; its cached output is still used. '
+                   'Repeatable.')
+@click.option('--force', multiple=True, type=click.Choice(STAGES),
+              help='Stage to recompute even if cached. Repeatable.')
+@click.option('--no-cache', is_flag=True,
+              help='Ignore all cached stage outputs.')
+@click.option('--animate', is_flag=True,
+              help='Also build the t-SNE animations.')
+@click.option('--precision', default='float64',
+              type=click.Choice(sorted(PRECISIONS)),
+              help='float32 stores votes as int8 and SVD features in float32.')
+@click.option('--profile', is_flag=True,
+              help='Also save cProfile statistics of the run.')
+def main(session, all, skip, force, no_cache, animate, precision, profile):
+    """ Runs ingest -> matrix -> SVD -> embedding -> plot for one session
+    (or all of them) in a single process.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('running pipeline')
+
+    report = RunReport('run_pipeline', profile=profile)
+    sessions = [str(x) for x in range(75, 114)] if all else [session]
+
+    for session in sessions:
+
+        logger.info('session %s', session)
+        Pipeline(session, skip=skip, force=force, use_cache=not no_cache,
+                 animate=animate, report=report, precision=precision).run()
+
+    logger.info('run report saved in %s\n%s', report.to_file(),
+                report.summary())
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+
+"""
+watch.py
+---------------------
+Watch mode for the current session: polls ../../data/raw/<session>/ (or the
+session's zip or tar.gz archive) for new vote .json files, waits for a burst
+of them to settle, parses only the new ones, and refreshes the matrix, SVD,
+embedding and figures through the stages of run_pipeline.py. Runs at low
+priority, and keeps its status and lag behind the raw data in
+../../data/interim/watch/<session>_status.json.
+"""
+import os
+import sys
+from pathlib import Path
+import click
+import logging
+import json
+import time
+import pickle
+import datetime
+import tempfile
+from functools import partial
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.extend([os.path.join(_SRC, 'data'), os.path.join(_SRC, 'features'),
+                 os.path.join(_SRC, 'visualization'),
+                 os.path.join(_SRC, 'instrumentation')])
+
+from make_dataset import Congress  # noqa: E402
+from archive import ARCHIVE_ERRORS  # noqa: E402
+from build_features import PRECISIONS  # noqa: E402
+from run_pipeline import Pipeline  # noqa: E402
+
+
+# Thread pools of the numerical libraries, capped before they are imported.
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                    'MKL_NUM_THREADS']
+
+
+def limit_cpu(nice=10, threads=None):
+    """Lowers the priority of this process by nice, and caps the threads of
+    numpy and scikit-learn at threads (None: no cap).
+    """
+
+    if nice and hasattr(os, 'nice'):
+        os.nice(nice)
+
+    if threads:
+
+        for variable in THREAD_VARIABLES:
+            os.environ[variable] = str(threads)
+
+
+def scan(path):
+    """{path relative to path: modification time} of the vote .json files.
+    """
+
+    files = {}
+
+    for dirpath, _, filenames in os.walk(path):
+
+        for filename in filenames:
+
+            if filename.endswith('.json'):
+                full_path = os.path.join(dirpath, filename)
+                files[os.path.relpath(full_path, path)] = \
+                    os.path.getmtime(full_path)
+
+    return files
+
+
+def timestamp(seconds):
+
+    if not seconds:
+        return None
+
+    return datetime.datetime.fromtimestamp(seconds).isoformat()
+
+
+class Watcher:
+    """Keeps one session up to date with its raw data. The parsed votes, and
+    the modification time of every file they come from, are saved after each
+    refresh, so that a restarted watcher only parses what is new:
+
+    ../../data/interim/watch/<session>.pkl
+    = (parsed, failed, measures_voted_on, records, members)
+
+    A file whose modification time changes is parsed again. A file that fails
+    to parse (e.g. still being written) is retried once it changes. When the
+    session's raw data is an archive (see make_dataset.Congress), its members
+    are the files, with the modification times stored in the archive.
+    """
+
+    def __init__(self, session, poll=10., debounce=30., max_delay=300.,
+                 animate=False, precision='float64', archive=None):
+
+        self._ROOT = str(Path(os.getcwd()).parents[1])
+        self._session_number = str(session)
+        self._input_filepath = os.path.join(self._ROOT, 'data/raw/',
+                                            self._session_number)
+        self._watch_path = os.path.join(self._ROOT, 'data/interim/watch/')
+        self._poll = poll
+        self._debounce = debounce
+        self._max_delay = max_delay
+        self._animate = animate
+        self._precision = precision
+        self._congress = Congress(self._session_number, archive=archive)
+        # (fingerprint, member modification times) of the archive, if any.
+        self._listing = None, {}
+        self._parsed = {}
+        self._failed = {}
+        self._status = {'session': self._session_number, 'state': 'starting',
+                        'last_refresh': None, 'refresh_seconds': None,
+                        'last_error': None}
+        self._logger = logging.getLogger(__name__)
+        self.load()
+
+    @property
+    def session_number(self):
+        return self._session_number
+
+    @property
+    def state_file(self):
+        return os.path.join(self._watch_path,
+                            '.'.join([self._session_number, 'pkl']))
+
+    @property
+    def status_file(self):
+        return os.path.join(self._watch_path,
+                            '_'.join([self._session_number, 'status.json']))
+
+    @property
+    def status(self):
+        return self._status
+
+    def load(self):
+        """Restores the votes parsed by a previous watcher, if any.
+        """
+
+        try:
+            with open(self.state_file, 'rb') as pfile:
+                parsed, failed, measures_voted_on, records, members = \
+                    pickle.load(pfile)
+
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return
+
+        self._parsed, self._failed = parsed, failed
+        self._congress.measures_voted_on = measures_voted_on
+        self._congress.Records._records = records
+        self._congress.parser.members.update(members)
+        self._logger.info('restored %d parsed files', len(self._parsed))
+
+    def dump(self, obj, filename, mode='wb', write=pickle.dump, **kwargs):
+        """Writes obj atomically, so that a killed watcher never leaves a
+        partial state or status file.
+        """
+
+        if not os.path.isdir(self._watch_path):
+            os.makedirs(self._watch_path)
+
+        handle, tmp_file = tempfile.mkstemp(dir=self._watch_path)
+
+        with os.fdopen(handle, mode) as tmp:
+            write(obj, tmp, **kwargs)
+
+        os.rename(tmp_file, filename)
+
+    def save(self):
+
+        self.dump((self._parsed, self._failed,
+                   self._congress.measures_voted_on,
+                   self._congress.Records._records,
+                   dict(self._congress.parser.members)),
+                  self.state_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def scan(self):
+        """{vote file: modification time} of the session's raw data. An
+        archive is only listed again once its size or mtime changes; while
+        it cannot be read (e.g. it is being rewritten), the last listing is
+        kept.
+        """
+
+        archive = self._congress.archive
+
+        if archive is None:
+            return scan(self._input_filepath)
+
+        try:
+            fingerprint = archive.fingerprint()
+
+            if fingerprint != self._listing[0]:
+                self._listing = fingerprint, archive.modification_times()
+
+        except ARCHIVE_ERRORS as e:
+            self._logger.warning('%s not listed: %r', archive.filename, e)
+
+        return dict(self._listing[1])
+
+    def loaders(self, pending):
+        """Yields (name, modification time, load) of the pending files, where
+        load() parses the file: oldest first from the extracted tree, or in
+        archive order, in one pass over the archive.
+        """
+
+        parser = self._congress.parser
+
+        if self._congress.archive is None:
+
+            for name, mtime in sorted(pending.items(), key=lambda x: x[1]):
+                yield name, mtime, partial(
+                    parser.load, os.path.join(self._input_filepath, name))
+
+            return
+
+        for name, raw in self._congress.archive.iter_members(set(pending)):
+            yield name, pending[name], partial(parser.loads, raw)
+
+    def pending(self, files):
+        """Files that are new or changed since they were parsed (or failed).
+        """
+
+        return dict((name, mtime) for name, mtime in files.items()
+                    if self._parsed.get(name) != mtime and
+                    self._failed.get(name) != mtime)
+
+    def parse(self, pending):
+        """Adds the votes of the pending files to the session. Returns the
+        number of files parsed.
+        """
+
+        n_parsed = 0
+
+        for name, mtime, load in self.loaders(pending):
+
+            try:
+                vote = load()
+
+            except (IOError, OSError, ValueError, KeyError) as e:
+                self._logger.warning('%s not parsed: %r', name, e)
+                self._failed[name] = mtime
+                continue
+
+            self._congress.add_vote(vote)
+            self._parsed[name] = mtime
+            self._failed.pop(name, None)
+            n_parsed += 1
+
+        return n_parsed
+
+    def ingested(self):
+        """Measures and records of the parsed votes, as Pipeline.ingest.
+        """
+
+        return self._congress.sort_measures(), self._congress.Records._records
+
+    def refresh(self, pending):
+        """Parses the pending files and refreshes everything downstream.
+        """
+
+        start = time.time()
+        n_parsed = self.parse(pending)
+        self.save()
+        self._logger.info('parsed %d of %d new files', n_parsed, len(pending))
+
+        if n_parsed:
+            Pipeline(self._session_number, animate=self._animate,
+                     precision=self._precision).run(ingest=self.ingested)
+
+        self._status.update(last_refresh=timestamp(time.time()),
+                            refresh_seconds=round(time.time() - start, 3),
+                            last_error=None)
+
+    def write_status(self, state, files, pending):
+        """Status of the watcher, with its lag: how long the oldest raw file
+        not parsed yet has been waiting (0 when up to date).
+        """
+
+        now = time.time()
+        latest_raw = max(files.values()) if files else None
+        latest_parsed = max(self._parsed.values()) if self._parsed else None
+        lag = round(now - min(pending.values()), 3) if pending else 0.
+
+        self._status.update(
+            state=state, updated=timestamp(now), files=len(files),
+            parsed=len(self._parsed), pending=len(pending),
+            failed=sorted(self._failed), latest_raw=timestamp(latest_raw),
+            latest_parsed=timestamp(latest_parsed), lag_seconds=lag)
+
+        self.dump(self._status, self.status_file, mode='w', write=json.dump,
+                  indent=2, sort_keys=True)
+
+    def watch(self, once=False):
+        """Polls every poll seconds. New files are parsed once none has
+        arrived for debounce seconds, or once the first of them has waited
+        max_delay seconds, so that a steady stream still gets refreshed.
+        With once, refreshes whatever is pending and returns.
+        """
+
+        files, waiting, changed = {}, {}, None
+
+        while True:
+
+            files = self.scan()
+            pending = self.pending(files)
+            now = time.time()
+
+            if pending != waiting:
+                waiting, changed = pending, now
+
+            if pending and (once or now - changed >= self._debounce or
+                            now - min(pending.values()) >= self._max_delay):
+
+                self.write_status('refreshing', files, pending)
+
+                try:
+                    self.refresh(pending)
+
+                except Exception as e:
+
+                    if once:
+                        raise
+
+                    self._logger.exception('refresh failed')
+                    self._status['last_error'] = repr(e)
+
+                files = self.scan()
+                pending = self.pending(files)
+                waiting, changed = pending, time.time()
+
+            self.write_status('waiting' if pending else 'idle', files, pending)
+
+            if once:
+                return
+
+            time.sleep(self._poll)
+
+
+@click.command()
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--poll', default=10.,
+              help='Seconds between scans of the raw data.')
+@click.option('--debounce', default=30.,
+              help='Seconds without new files before a refresh.')
+@click.option('--max-delay', default=300.,
+              help='Seconds a new file waits at most.')
+@click.option('--nice', default=10,
+              help='Lower the priority of the watcher by this much.')
+@click.option('--threads', default=1,
+              help='Threads of numpy and scikit-learn (0: no cap).')
+@click.option('--animate', is_flag=True,
+              help='Also refresh the t-SNE animations.')
+@click.option('--precision', default='float64',
+              type=click.Choice(sorted(PRECISIONS)),
+              help='float32 stores votes as int8 and SVD features in float32.')
+@click.option('--archive', default=None, type=click.Path(exists=True),
+              help='zip or tar.gz of the session\'s raw data to watch '
+                   'instead of ../../data/raw/<session>/.')
+@click.option('--once', is_flag=True,
+              help='Refresh whatever is new, then exit.')
+def main(session, poll, debounce, max_delay, nice, threads, animate, precision,
+         archive, once):
+    """ Watches ../../data/raw/<session>/ (or the session's archive) and keeps
+    the processed data, embeddings and figures of the session up to date.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('watching session %s', session)
+
+    limit_cpu(nice, threads)
+    watcher = Watcher(session, poll=poll, debounce=debounce,
+                      max_delay=max_delay, animate=animate,
+                      precision=precision, archive=archive)
+
+    try:
+        watcher.watch(once=once)
+
+    except KeyboardInterrupt:
+        logger.info('stopped; status in %s', watcher.status_file)
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+load_test.py
+---------------------
+Fires concurrent requests at a running serve.py and reports latency
+percentiles (Python 3).
+"""
+import os
+import click
+import logging
+import json
+import time
+import asyncio
+import random
+import numpy as np
+
+
+async def fetch(host, port, path):
+    """One GET request; returns (status, seconds).
+    """
+
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    request = 'GET {} HTTP/1.0\r\nHost: {}\r\n\r\n'.format(path, host)
+    writer.write(request.encode('latin-1'))
+    await writer.drain()
+
+    headers = await reader.readuntil(b'\r\n\r\n')
+    length = [int(line.split(b':')[1]) for line in headers.split(b'\r\n')
+              if line.lower().startswith(b'content-length')][0]
+    await reader.readexactly(length)
+    writer.close()
+    status = int(headers.split(b' ', 2)[1])
+
+    return status, time.perf_counter() - start
+
+
+async def run(host, port, paths, n_requests, concurrency):
+    """Issue n_requests drawn from paths, at most `concurrency` at a time.
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(path):
+        async with semaphore:
+            return await fetch(host, port, path)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[bounded(random.choice(paths))
+                                     for _ in range(n_requests)])
+
+    return results, time.perf_counter() - start
+
+
+def build_paths(session, members, chamber):
+    """Mix of the three query types for one session.
+    """
+
+    paths = ['/sessions/{}/embedding?chamber={}'.format(session, chamber)]
+
+    for name in members:
+        paths.append('/sessions/{}/members/{}/votes'.format(session, name))
+
+    for a, b in zip(members, members[1:]):
+        paths.append('/sessions/{}/agreement?a={}&b={}'.format(session, a, b))
+
+    return paths
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', default=8765)
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--chamber', default='s',
+              help='Which chamber? s for senate, h for house')
+@click.option('--members', default='Reid,Mcconnell,Sanders,Warren',
+              help='Comma separated member names to query.')
+@click.option('--requests', 'n_requests', default=1000,
+              help='Total number of requests.')
+@click.option('--concurrency', default=32, help='Requests in flight at once.')
+def main(host, port, session, chamber, members, n_requests, concurrency):
+    """ Load test for serve.py; prints p50/p99 latency as JSON.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('load testing http://%s:%s', host, port)
+
+    paths = build_paths(session, members.split(','), chamber)
+
+    # Warm the session and embedding caches so that the numbers reflect
+    # steady-state serving rather than the first disk read.
+    asyncio.run(run(host, port, paths, len(paths), 1))
+
+    results, elapsed = asyncio.run(run(host, port, paths, n_requests,
+                                       concurrency))
+    latencies = np.array([seconds for _, seconds in results]) * 1000.
+
+    print(json.dumps({
+        'requests': n_requests,
+        'concurrency': concurrency,
+        'errors': sum(1 for status, _ in results if status != 200),
+        'throughput_rps': round(n_requests / elapsed, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'max_ms': round(float(latencies.max()), 2),
+    }, indent=2))
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
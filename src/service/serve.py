@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+"""
+serve.py
+---------------------
+A small local HTTP service for looking up member vote histories, pairwise
+agreement and t-SNE coordinates from the processed sessions, without
+re-running ../features/build_features.py. Runs offline on asyncio, and needs
+Python 3.7 or later (asyncio.run), unlike the rest of the package.
+
+    GET /sessions/<session>/members/<name>/votes
+    GET /sessions/<session>/agreement?a=<name>&b=<name>
+    GET /sessions/<session>/embedding?chamber=<s|h>
+    GET /health
+"""
+import os
+import sys
+from pathlib import Path
+import click
+import logging
+import json
+import asyncio
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs, unquote
+import numpy as np
+import pandas as pd
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.extend([os.path.join(_SRC, 'features'), os.path.join(_SRC, 'data')])
+from normalize import NameIndex, normalize_records  # noqa: E402
+
+
+def json_value(value):
+    """value, or None where it is missing (NaN), which JSON cannot encode.
+    """
+
+    return None if pd.isnull(value) else value
+
+
+class Session:
+    """Decoded vote matrix of one session: an int8 matrix of votes
+    (1 yea, 0 nay, -1 not cast) with a name -> row index.
+    """
+
+    def __init__(self, session_number, df, measures=None):
+
+        self.session_number = session_number
+        df = normalize_records(df)
+        self.names = df.Name.tolist()
+        self.party = np.asarray(df.Party)
+        self.state = df.State.values
+        self.chamber = df.Chamber.values
+        self.vote_ids = df.columns.tolist()[4:]
+        self.votes = df[self.vote_ids].values.astype(np.int8)
+        self.rows = NameIndex(self.names)
+        self.dates = {}
+
+        if measures is not None:
+            self.dates = measures.set_index('vote_id').date.to_dict()
+
+    @classmethod
+    def from_file(cls, data_path, session_number):
+        """Read <session>_dataframe.csv, and <session>_measures.csv if present.
+        """
+
+        filehandle = '_'.join([session_number, 'dataframe.csv'])
+        df = pd.read_csv(os.path.join(data_path, filehandle), encoding='utf-8')
+
+        measures_file = os.path.join(
+            data_path, '_'.join([session_number, 'measures.csv']))
+        measures = None
+
+        if os.path.exists(measures_file):
+            measures = pd.read_csv(measures_file, encoding='utf-8')
+
+        return cls(session_number, df, measures)
+
+    def row(self, name):
+
+        try:
+            return self.rows[name]
+
+        except KeyError:
+            raise LookupError('No member named {} in session {}'.format(
+                name, self.session_number))
+
+    def member_votes(self, name):
+        """Votes cast by one member, in date order.
+        """
+
+        i = self.row(name)
+        cast = np.flatnonzero(self.votes[i] >= 0)
+
+        return {'name': self.names[i], 'party': json_value(self.party[i]),
+                'state': json_value(self.state[i]),
+                'chamber': self.chamber[i],
+                'votes': [{'vote_id': self.vote_ids[j],
+                           'date': self.dates.get(self.vote_ids[j]),
+                           'vote': int(self.votes[i, j])} for j in cast]}
+
+    def agreement(self, name_a, name_b):
+        """Share of measures, among those both members voted on, where they
+        cast the same vote.
+        """
+
+        a, b = self.votes[self.row(name_a)], self.votes[self.row(name_b)]
+        both = (a >= 0) & (b >= 0)
+        n_common = int(both.sum())
+        n_agree = int(((a == b) & both).sum())
+
+        return {'a': name_a, 'b': name_b, 'n_common': n_common,
+                'n_agree': n_agree,
+                'agreement': float(n_agree) / n_common if n_common else None}
+
+
+def compute_embedding(session_number, chamber):
+    """Runs in a worker process: load the saved t-SNE coordinates of a
+    chamber, or compute and save them with build_features.Features.
+    """
+
+    from build_features import Features
+
+    features = Features(session_number)
+
+    if os.path.exists(features.embedding_file(chamber)):
+        df_tSNE = features.load_embedding(chamber)
+
+    else:
+        scale = 'robust' if chamber == 's' else 'standard'
+        df_tSNE = features.transform_SVD_tSNE(features.load_records(),
+                                              chamber=chamber, scale=scale)
+        features.embedding_to_file(df_tSNE, chamber)
+
+    return [{'name': name, 'party': json_value(row.Party),
+             'state': json_value(row.State),
+             'x': float(row[0]), 'y': float(row[1])}
+            for name, row in df_tSNE.iterrows()]
+
+
+class LRUCache:
+    """Least-recently-used cache of decoded sessions. Concurrent requests for
+    a session being loaded wait on the same future instead of loading twice.
+    """
+
+    def __init__(self, capacity):
+
+        self._capacity = capacity
+        self._items = OrderedDict()
+
+    async def get(self, key, load):
+
+        try:
+            future = self._items.pop(key)
+
+        except KeyError:
+            future = asyncio.ensure_future(load())
+
+        self._items[key] = future
+
+        while len(self._items) > self._capacity:
+            self._items.popitem(last=False)
+
+        try:
+            return await asyncio.shield(future)
+
+        except Exception:
+            self._items.pop(key, None)
+            raise
+
+
+class QueryService:
+    """Routes requests to the session cache; disk reads go to a thread pool
+    and embeddings to a process pool so the event loop never blocks on them.
+    """
+
+    def __init__(self, cache_size=8, workers=2):
+
+        self._ROOT = str(Path(os.getcwd()).parents[1])
+        self._data_path = os.path.join(self._ROOT, 'data/processed/')
+        self._sessions = LRUCache(cache_size)
+        self._embeddings = LRUCache(cache_size * 2)
+        self._threads = ThreadPoolExecutor(max_workers=workers)
+        # Spawned rather than forked, so that workers do not inherit open
+        # client sockets (and the locks held by the disk threads).
+        self._processes = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'))
+
+    async def session(self, session_number):
+
+        loop = asyncio.get_event_loop()
+
+        def load():
+            return loop.run_in_executor(self._threads, Session.from_file,
+                                        self._data_path, session_number)
+
+        return await self._sessions.get(session_number, load)
+
+    async def embedding(self, session_number, chamber):
+
+        loop = asyncio.get_event_loop()
+
+        def load():
+            return loop.run_in_executor(self._processes, compute_embedding,
+                                        session_number, chamber)
+
+        return await self._embeddings.get((session_number, chamber), load)
+
+    async def route(self, path, query):
+        """Returns (status, body) for a GET request.
+        """
+
+        parts = [unquote(p) for p in path.strip('/').split('/')]
+
+        if parts == ['health']:
+            return 200, {'status': 'ok'}
+
+        if len(parts) < 3 or parts[0] != 'sessions':
+            return 404, {'error': 'unknown path {}'.format(path)}
+
+        session_number = parts[1]
+
+        if len(parts) == 5 and parts[2] == 'members' and parts[4] == 'votes':
+            session = await self.session(session_number)
+            return 200, session.member_votes(parts[3])
+
+        if parts[2:] == ['agreement']:
+            session = await self.session(session_number)
+            return 200, session.agreement(query['a'][0], query['b'][0])
+
+        if parts[2:] == ['embedding']:
+            chamber = query.get('chamber', ['s'])[0]
+            members = await self.embedding(session_number, chamber)
+            return 200, {'session': session_number, 'chamber': chamber,
+                         'members': members}
+
+        return 404, {'error': 'unknown path {}'.format(path)}
+
+    async def handle(self, reader, writer):
+        """Minimal HTTP/1.0-style handler: one GET per connection.
+        """
+
+        try:
+            request_line = await reader.readline()
+
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+
+            method, target = request_line.decode('latin-1').split()[:2]
+            url = urlsplit(target)
+
+            if method != 'GET':
+                status, body = 405, {'error': 'only GET is supported'}
+
+            else:
+                try:
+                    status, body = await self.route(url.path,
+                                                    parse_qs(url.query))
+
+                except (LookupError, IOError) as e:
+                    status, body = 404, {'error': str(e)}
+
+                except Exception:
+                    logging.getLogger(__name__).exception(
+                        'error answering %s', target)
+                    status, body = 500, {'error': 'internal error'}
+
+        except ValueError:
+            status, body = 400, {'error': 'malformed request'}
+
+        payload = json.dumps(body).encode('utf-8')
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+                  405: 'Method Not Allowed',
+                  500: 'Internal Server Error'}[status]
+        header = ('HTTP/1.0 {} {}\r\nContent-Type: application/json\r\n'
+                  'Content-Length: {}\r\nConnection: close\r\n\r\n'
+                  .format(status, reason, len(payload)))
+        writer.write(header.encode('latin-1') + payload)
+
+        try:
+            await writer.drain()
+
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+
+        server = await asyncio.start_server(self.handle, host, port)
+
+        async with server:
+            await server.serve_forever()
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1', help='Interface to bind.')
+@click.option('--port', default=8765, help='Port to listen on.')
+@click.option('--cache-size', default=8,
+              help='Number of decoded sessions kept in memory.')
+@click.option('--workers', default=2,
+              help='Size of the disk and embedding worker pools.')
+def main(host, port, cache_size, workers):
+    """ Serve queries over the processed sessions in ../../data/processed/.
+    """
+    if sys.version_info < (3, 7):
+        raise click.ClickException('serve.py needs Python 3.7 or later')
+
+    logger = logging.getLogger(__name__)
+    logger.info('serving processed sessions on http://%s:%s', host, port)
+
+    service = QueryService(cache_size=cache_size, workers=workers)
+    asyncio.run(service.serve(host, port))
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
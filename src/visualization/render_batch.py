@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+"""
+render_batch.py
+---------------------
+Renders the senate/house t-SNE figure of many sessions from the embeddings
+saved by build_features. Every worker process builds the figure and its
+artists once, on an Agg canvas outside of pyplot, and per session only updates
+their offsets, colors, titles and legend before saving to
+../../reports/figures/<session>_senate_house_<date>.<format>.
+"""
+import os
+import sys
+import click
+import logging
+import datetime
+import time
+from collections import OrderedDict
+import numpy as np
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.extend([os.path.join(_SRC, 'instrumentation'),
+                 os.path.join(_SRC, 'features'), os.path.join(_SRC, 'data')])
+from instrument import RunReport  # noqa: E402
+from normalize import NameIndex  # noqa: E402
+
+# matplotlib and pandas are imported by the workers, so that --help starts
+# quickly and the parent process stays small.
+
+FORMATS = ['png', 'svg', 'pdf']
+
+# Same parties, colors and markers as Features.plot_2D_tSNE; parties are
+# drawn in this order, so Republicans stay on top of Democrats.
+PARTY_COLORS = OrderedDict([('D', 'b'), ('R', 'r'), ('I', 'm')])
+PARTY_LABELS = ['Dem', 'Reb', 'Ind']
+MARKERS = {'s': '+ x * ^ 1 3 4 8'.split(), 'h': 'v < > D s * d p'.split()}
+
+_figure = None
+
+
+class SessionFigure:
+    """The two-panel figure of plot_2D_tSNE, built once and redrawn for each
+    session: every chamber has one scatter of its members, colored by party,
+    and one artist per highlighted-member marker.
+    """
+
+    def __init__(self, marker='.', alpha=0.5):
+
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.colors import colorConverter
+        from matplotlib.lines import Line2D
+
+        self._figure = Figure()
+        FigureCanvasAgg(self._figure)
+        self._figure.subplots_adjust(hspace=0.3)
+        self._colors = np.array([colorConverter.to_rgba(c, alpha)
+                                 for c in PARTY_COLORS.values()])
+        self._axes, self._points, self._members = {}, {}, {}
+
+        for i, chamber in enumerate(['s', 'h']):
+
+            axes = self._figure.add_subplot(2, 1, i + 1)
+            axes.axis('off')
+            self._axes[chamber] = axes
+            self._points[chamber] = axes.scatter([0.], [0.], marker=marker,
+                                                 alpha=alpha)
+            self._members[chamber] = [axes.scatter([0.], [0.], s=75, marker=m,
+                                                   c='black')
+                                      for m in MARKERS[chamber]]
+
+        self._parties = [Line2D([], [], linestyle='none', marker=marker,
+                                color=c, alpha=alpha)
+                         for c in PARTY_COLORS.values()]
+        self._legend = None
+
+    @property
+    def figure(self):
+        return self._figure
+
+    def update_chamber(self, chamber, df_tSNE, members):
+        """Moves the points of a chamber to the coordinates of df_tSNE (as
+        returned by Features.load_embedding) and highlights members. Returns
+        the legend handles and labels of the highlighted members.
+        """
+
+        party = np.asarray(df_tSNE.Party)
+        coordinates = df_tSNE[[0, 1]].values
+        codes = np.full(len(party), len(PARTY_COLORS))
+
+        for code, p in enumerate(PARTY_COLORS):
+            codes[party == p] = code
+
+        order = np.argsort(codes[codes < len(PARTY_COLORS)], kind='mergesort')
+        order = np.flatnonzero(codes < len(PARTY_COLORS))[order]
+        points = self._points[chamber]
+        points.set_offsets(coordinates[order])
+        points.set_color(self._colors[codes[order]])
+
+        axes = self._axes[chamber]
+        low, high = coordinates.min(axis=0), coordinates.max(axis=0)
+        margin = 0.05 * (high - low)
+        axes.set_xlim(low[0] - margin[0], high[0] + margin[0])
+        axes.set_ylim(low[1] - margin[1], high[1] + margin[1])
+
+        rows = NameIndex(df_tSNE.index)
+        members = [m for m in members or []
+                   if m in rows][:len(MARKERS[chamber])]
+        handles, labels = [], []
+
+        for artist, member in zip(self._members[chamber], members):
+
+            artist.set_offsets(coordinates[[rows[member]]])
+            handles.append(artist)
+            labels.append('{} ({})'.format(member, party[rows[member]]))
+
+        for p, artist in enumerate(self._members[chamber]):
+            artist.set_visible(p < len(members))
+
+        return handles, labels
+
+    def render(self, features, formats=('png',)):
+        """Redraws the figure for the session of features from its saved
+        embeddings and saves it in every format, in features.output_path.
+        Returns the saved paths.
+        """
+
+        handles, labels = list(self._parties), list(PARTY_LABELS)
+
+        for chamber, members, majority, title in [
+                ('s', features.sens, features.senate_majority, 'Senate'),
+                ('h', features.reps, features.house_majority, 'House')]:
+
+            chamber_handles, chamber_labels = self.update_chamber(
+                chamber, features.load_embedding(chamber), members)
+            handles.extend(chamber_handles)
+            labels.extend(chamber_labels)
+            self._axes[chamber].set_title('{} {}'.format(majority, title))
+
+        if self._legend is not None:
+            self._legend.remove()
+
+        self._legend = self._figure.legend(
+            handles, labels,
+            title='{}: {}'.format('Session', features.session_number),
+            scatterpoints=1, numpoints=1, loc='upper left', prop={'size': 8},
+            labelspacing=0.5, bbox_to_anchor=(0.01, 0.7), fancybox=True,
+            shadow=True, borderaxespad=0., ncol=1, fontsize=10)
+
+        if not os.path.isdir(features.output_path):
+            os.makedirs(features.output_path)
+
+        today = datetime.date.today().strftime("%Y%m%d")
+        outfile = '_'.join((str(features.session_number), 'senate_house',
+                            today))
+        paths = []
+
+        for fmt in formats:
+            paths.append(os.path.join(features.output_path,
+                                      '.'.join([outfile, fmt])))
+            self._figure.savefig(paths[-1], format=fmt, bbox_inches='tight')
+
+        return paths
+
+
+def _render(args):
+    """Worker: renders one session on the process' SessionFigure. Returns
+    (session, saved paths, seconds, error).
+    """
+
+    global _figure
+
+    session, formats = args
+    start = time.time()
+
+    from build_features import Features
+
+    if _figure is None:
+        _figure = SessionFigure()
+
+    try:
+        # Only the saved embeddings are read, not the vote records.
+        features = Features(session)
+        paths = _figure.render(features, formats)
+
+    except (IOError, OSError) as e:
+        return session, [], time.time() - start, str(e)
+
+    return session, paths, time.time() - start, None
+
+
+def render_sessions(sessions, formats=('png',), n_jobs=1):
+    """Renders sessions, in n_jobs worker processes (all CPUs if n_jobs is
+    0 or less). Yields (session, saved paths, seconds, error) as they finish.
+    """
+
+    tasks = [(str(session), tuple(formats)) for session in sessions]
+
+    if n_jobs <= 0:
+        from multiprocessing import cpu_count
+        n_jobs = cpu_count()
+
+    n_jobs = min(n_jobs, len(tasks))
+
+    if n_jobs <= 1:
+
+        for task in tasks:
+            yield _render(task)
+
+        return
+
+    from multiprocessing import Pool
+
+    pool = Pool(n_jobs)
+
+    try:
+
+        for result in pool.imap_unordered(_render, tasks):
+            yield result
+
+    finally:
+        pool.terminate()
+
+
+@click.command()
+@click.option('--session', default='113',
+              help='Which session of Congress? (int)')
+@click.option('--all', is_flag=True,
+              help='Render all sessions with saved embeddings.')
+@click.option('--format', 'formats', multiple=True, default=['png'],
+              type=click.Choice(FORMATS),
+              help='Output format; repeat for several.')
+@click.option('--n-jobs', default=0,
+              help='Worker processes (0 for one per CPU).')
+@click.option('--profile', is_flag=True,
+              help='Also save cProfile statistics of the run.')
+def main(session, all, formats, n_jobs, profile):
+    """ Script to render the senate/house t-SNE figures from saved embeddings
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('rendering figures from saved embeddings')
+
+    report = RunReport('render_batch', profile=profile)
+    sessions = [str(x) for x in range(75, 114)] if all else [session]
+
+    for session, paths, seconds, error in render_sessions(sessions, formats,
+                                                          n_jobs):
+
+        if error:
+            logger.warning('session %s not rendered: %s', session, error)
+            continue
+
+        record = report.record(session, 'render')
+        record['calls'] += 1
+        record['wall_s'] += seconds
+        report.annotate(session, 'render', output=paths)
+
+    logger.info('run report saved in %s\n%s', report.to_file(),
+                report.summary())
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    project_dir = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+
+    main()
@@ -6,57 +6,77 @@ visualize.py
 Functions for creating animated t-SNE.
 """
 import os
+import sys
 from pathlib import Path
 import click
 import logging
 import json
 import datetime
-import unicodedata as ucd
 from collections import defaultdict, OrderedDict
 import numpy as np
-import pandas as pd
-import sklearn
 from numpy import linalg
-from sklearn import preprocessing
-from sklearn.decomposition import TruncatedSVD
-from sklearn.manifold import TSNE
-from sklearn_pandas import DataFrameMapper
-from sklearn.preprocessing import StandardScaler, RobustScaler
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-from tsne_animate import tsneAnimate
-import matplotlib.animation as animation
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.extend([os.path.join(_SRC, 'instrumentation'),
+                 os.path.join(_SRC, 'features'), os.path.join(_SRC, 'data')])
+from instrument import RunReport, NullReport  # noqa: E402
+from build_features import Features, PRECISIONS, load_pyplot  # noqa: E402
+from normalize import NameIndex, normalize_records  # noqa: E402
+
+# pandas, scikit-learn, sklearn_pandas, matplotlib and tsne_animate are
+# imported where they are used, so that --help starts quickly.
+
+
+def load_tsne_animate():
+    """Import tsneAnimate on first use, patched with getSteps and animate.
+    """
+
+    from tsne_animate import tsneAnimate
+
+    tsneAnimate.getSteps = getSteps
+    tsneAnimate.animate = animate
+
+    return tsneAnimate
 
 
 def getSteps(self, X, y):
     # based on https://github.com/oreillymedia/t-SNE-tutorial
+    import sklearn.manifold.t_sne
+
     old_grad = sklearn.manifold.t_sne._gradient_descent
     positions = []
+    # Optional convergence.Convergence: the animation ends where it stops.
+    convergence = getattr(self, 'convergence', None)
 
     def _gradient_descent(objective, p0, it, n_iter, objective_error=None,
                           n_iter_check=1, n_iter_without_progress=50,
                           momentum=0.5, learning_rate=1000.0, min_gain=0.01,
                           min_grad_norm=1e-7, min_error_diff=1e-7, verbose=0,
                           args=None, kwargs=None):
-        if args is None:
-            args = []
-        if kwargs is None:
-            kwargs = {}
+        args = [] if args is None else args
+        kwargs = {} if kwargs is None else kwargs
 
         p = p0.copy().ravel()
+        first, final = _begin_stage(convergence, it, n_iter, n_exaggeration)
         update = np.zeros_like(p)
         gains = np.ones_like(p)
         error = np.finfo(np.float).max
         best_error = np.finfo(np.float).max
         best_iter = 0
+        i = it - 1
 
-        for i in range(it, n_iter):
+        for i in range(first, n_iter):
             # We save the current position.
-            positions.append(p.copy())
+            positions.append(p.astype(getattr(self, 'trajectory_dtype',
+                                              np.float64)))
 
             new_error, grad = objective(p, *args, **kwargs)
             grad_norm = linalg.norm(grad)
 
+            if convergence is not None and convergence.update(
+                    i, new_error, grad, final=final):
+                break
+
             inc = update * grad >= 0.0
             dec = np.invert(inc)
             gains[inc] += 0.05
@@ -101,22 +121,73 @@ def getSteps(self, X, y):
 
         return p, error, i
 
+    from affinities import fit_transform
+
+    # Counted before the optimizer is replaced below.
+    n_exaggeration = _reset_convergence(convergence)
+
     # Replace old gradient func
     sklearn.manifold.t_sne._gradient_descent = _gradient_descent
-    X_proj = self.tsne.fit_transform(X)
+    fit_transform(self.tsne, X)
     self.isfit = True
     # return old gradient descent back
     sklearn.manifold.t_sne._gradient_descent = old_grad
     return positions
 
-tsneAnimate.getSteps = getSteps
 
+def _reset_convergence(convergence):
+    """Resets convergence (if any) for a new fit of getSteps; returns the
+    number of early exaggeration stages of the fit.
+    """
+
+    if convergence is None:
+        return None
+
+    from convergence import exaggeration_stages
+
+    n_exaggeration = exaggeration_stages()
+    convergence.reset()
+
+    return n_exaggeration
+
+
+def _begin_stage(convergence, it, n_iter, n_exaggeration):
+    """(first iteration, final stage) of a gradient descent stage of
+    getSteps. Once convergence has stopped the run, the first iteration is
+    n_iter, so that the stage records no more frames.
+    """
+
+    if convergence is None:
+        return it, False
+
+    final = convergence.begin_stage(n_iter, n_exaggeration)
+
+    if convergence.reason is not None:
+        return n_iter, final
 
-def animate(self, X, y, congressmen, session_number, chamber):
+    return it, final
 
-    pos = self.getSteps(X, y)
+
+def animate(self, X, y, congressmen, session_number, chamber,
+            writer='imagemagick', report=None):
+
+    plt = load_pyplot()
+    from matplotlib.animation import FuncAnimation
+
+    report = report or NullReport()
+
+    with report.stage(session_number, 'tsne_steps', input=X):
+        pos = self.getSteps(X, y)
     party_colors = {i: 'b' if i == 'D' else 'r' if i == 'R' else 'm' for i in set(y.Party)}
 
+    # Party masks and rows of the highlighted members are looked up once,
+    # not in every frame.
+    party = np.asarray(y['Party'])
+    party_masks = dict((k, party == k) for k in party_colors)
+    names = NameIndex(y['Name'])
+    rows = dict((j, [names[j]] if j in names else [])
+                for j in congressmen or [])
+
     last_iter = pos[len(pos) - 1].reshape(-1, 2)
     lims = np.max(last_iter, axis=0), np.min(last_iter, axis=0)
     fig = plt.figure()
@@ -137,14 +208,14 @@ def animate(self, X, y, congressmen, session_number, chamber):
     def getDots(A, B, X, y, alpha, congressmen):
         dots_list = []
 
-        for k, v in party_colors.iteritems():
-            a, b = A[y['Party'] == k], B[y['Party'] == k]
+        for k, v in party_colors.items():
+            a, b = A[party_masks[k]], B[party_masks[k]]
             dots, = ax.plot(b, a, 'o', color=v, alpha=alpha)
             dots_list.append(dots)
 
         if congressmen:
             for j in congressmen:
-                a, b = A[y['Name'] == j], B[y['Name'] == j]
+                a, b = A[rows[j]], B[rows[j]]
                 dots, = ax.plot(b, a, '*', markersize=20, color='black')
                 dots_list.append(dots)
 
@@ -158,9 +229,10 @@ def animate(self, X, y, congressmen, session_number, chamber):
 
     def update(i):
 
-        for j in enumerate(party_colors.iteritems()):
-            a, b = np.array(list(zip(*pos[i].reshape(-1, 2))))
-            a, b = a[y['Party'] == j[1][0]], b[y['Party'] == j[1][0]]
+        A, B = pos[i].reshape(-1, 2).T
+
+        for j in enumerate(party_colors.items()):
+            a, b = A[party_masks[j[1][0]]], B[party_masks[j[1][0]]]
             dots_list[j[0]].set_xdata(a)
             dots_list[j[0]].set_ydata(b)
             dots_list[j[0]].set_color(j[1][1])
@@ -169,8 +241,7 @@ def animate(self, X, y, congressmen, session_number, chamber):
         if congressmen:
             num_cmen = len(congressmen)
             for k, j in enumerate(congressmen):
-                a, b = np.array(list(zip(*pos[i].reshape(-1, 2))))
-                a, b = a[y['Name'] == j.title()], b[y['Name'] == j.title()]
+                a, b = A[rows[j]], B[rows[j]]
 
                 annotations_dict[j].xy = (a, b)
                 annotation_list.append(annotations_dict[j])
@@ -190,18 +261,22 @@ def animate(self, X, y, congressmen, session_number, chamber):
 
     today = datetime.date.today().strftime("%Y%m%d")
     outfile = '_'.join((session_number, chamber, today))
-    outfile = '.'.join((outfile, 'gif'))
-    anim.save(outfile, dpi=80, writer='imagemagick')
-    plt.close(fig)
+    outfile = Features(session_number).figure_file(
+        '.'.join((outfile, 'gif')))
+
+    with report.stage(session_number, 'gif', input=frames):
+        anim.save(outfile, dpi=80, writer=writer)
 
-tsneAnimate.animate = animate
+    report.annotate(session_number, 'gif', output=outfile)
+    plt.close(fig)
 
 
 class Animation:
     """Class used to build animated gifs for t-SNE.
     """
 
-    def __init__(self, session_number, chamber):
+    def __init__(self, session_number, chamber, data=None, normalized=False,
+                 precision='float64'):
 
         self._ROOT = str(Path(os.getcwd()).parents[1])
         self._input_data_path = os.path.join(self._ROOT, 'data/processed/')
@@ -210,7 +285,18 @@ class Animation:
         self._chamber = 'Senate' if chamber == 's' else 'House'
         self._filehandle = '_'.join([str(self._session_number), 'dataframe.csv'])
         self._input_file = os.path.join(self._input_data_path, self._filehandle)
-        self._data = pd.read_csv(self._input_file, encoding='utf-8')
+        self._normalized = normalized
+        self._vote_dtype, self._dtype = PRECISIONS[precision]
+
+        if data is None:
+            import pandas as pd
+            header = pd.read_csv(self._input_file, encoding='utf-8',
+                                 nrows=0).columns
+            data = pd.read_csv(self._input_file, encoding='utf-8',
+                               dtype={col: self._vote_dtype
+                                      for col in header[4:]})
+
+        self._data = data
         # self._sens, self._reps, self._senate_majority, self._house_majority = self.load_select_congressmen()
         # self._congressmen, self._majority = self.load_select_congressmen(chamber)
 
@@ -222,6 +308,10 @@ class Animation:
     def supplemental_path(self):
         return self._supplemental_path
 
+    @property
+    def dtype(self):
+        return self._dtype
+
     @property
     def session_number(self):
         return self._session_number
@@ -236,18 +326,12 @@ class Animation:
         """
 
         df = self.data
-        df.Name = df.Name.map(lambda x: ucd.normalize('NFKD', x.title()))
-        df.Party = df.Party.map({'Democrat': 'D', 'D': 'D',
-                                 'Ind. Democrat': 'ID', 'ID': 'ID',
-                                 'Republican': 'R', 'R': 'R',
-                                 'Independent': 'I', 'I': 'I',
-                                 'Progressive': 'P',
-                                 'Farmer-Labor': 'F',
-                                 'American Labor': 'AL'})
-        df_chamber = df[df.Chamber == chamber]
-        # print(df[df.Party.isnull()])
-
-        return df_chamber
+
+        if not self._normalized:
+            df = normalize_records(df)
+            self._normalized = True
+
+        return df[df.Chamber == chamber]
 
     def load_select_congressmen(self, chamber):
         """Load congressmen presets in select_congressmen.json to be plotted.
@@ -280,15 +364,26 @@ class Animation:
         return congressmen, majority
 
     @staticmethod
-    def transform(df, option, n_features_SVD=50, n_components=2, scale=None):
+    def transform(df, option, n_features_SVD=50, n_components=2, scale=None,
+                  dtype='float64'):
         """
         option = 'svd' : Transform 1800+ features (measures/bills) to 50 features using
         truncated singular value decomposition (SVD).
 
         option = 'tsne': Transform 50 features using t-distributed stochastic neighbor
         embedding (t-SNE).
+
+        The votes are converted to dtype (e.g. float32) before the transform.
         """
 
+        import pandas as pd
+        from sklearn import preprocessing
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.manifold import TSNE
+        from sklearn_pandas import DataFrameMapper
+        from sklearn.preprocessing import StandardScaler, RobustScaler
+        from affinities import fit_transform
+
         cols = df.columns.tolist()
         data_cols = df.columns.tolist()[4:]
 
@@ -296,9 +391,12 @@ class Animation:
 
             if option == 'svd':
 
-                svd = TruncatedSVD(n_features_SVD)
+                # Same SVD features as Features.transform_SVD, so that the
+                # animation reuses the affinities of the static plot.
+                svd = TruncatedSVD(n_features_SVD, random_state=0)
                 svd_mapper = DataFrameMapper([(data_cols, svd)])
-                X_transform = svd_mapper.fit_transform(df.copy())
+                X_transform = svd_mapper.fit_transform(
+                    df[data_cols].astype(dtype))
 
             if option == 'tsne':
 
@@ -307,7 +405,7 @@ class Animation:
                 np.set_printoptions(suppress=True)
 
                 X_data = df.ix[:, 3:].as_matrix()
-                X_transform = TSNE(random_state=RS).fit_transform(X_data)
+                X_transform = fit_transform(TSNE(random_state=RS), X_data)
 
         else:
 
@@ -323,7 +421,8 @@ class Animation:
 
                 X_transform = RobustScaler().fit_transform(X_transform)
 
-        df_X_transform = pd.DataFrame(X_transform, index=df.index)
+        df_X_transform = pd.DataFrame(X_transform.astype(dtype, copy=False),
+                                      index=df.index)
         df_transform = pd.concat([df[['Name', 'Party', 'State']], df_X_transform], axis=1)
 
         le = preprocessing.LabelEncoder()
@@ -336,40 +435,66 @@ class Animation:
 @click.option('--session', default=113, help='Which session of Congress? (int)')
 @click.option('--chamber', help='Which chamber? s for senate, h for house')
 @click.option('--scale', default='robust', help='What scale? standard or robust?')
-@click.option('--all', is_flag=True, help='Process all available sessions data.')
-def main(session, chamber, scale, all):
+@click.option('--all', is_flag=True,
+              help='Process all available sessions data.')
+@click.option('--precision', default='float64',
+              type=click.Choice(sorted(PRECISIONS)),
+              help='float32 stores votes as int8 and SVD features in float32.')
+@click.option('--tol', default=None, type=float,
+              help='End the animation once the KL divergence improves by '
+                   'less than this.')
+@click.option('--max-iter', default=None, type=int,
+              help='Iteration (frame) budget per session.')
+@click.option('--max-seconds', default=None, type=float,
+              help='Wall-clock budget of the t-SNE of each session.')
+@click.option('--profile', is_flag=True,
+              help='Also save cProfile statistics of the run.')
+def main(session, chamber, scale, all, precision, tol, max_iter, max_seconds,
+         profile):
     """ Script to create t-SNE animation.
     """
     logger = logging.getLogger(__name__)
     logger.info('making final data set from raw data')
 
-    if all:
+    from sklearn.manifold import TSNE
+    from convergence import from_options
+    tsneAnimate = load_tsne_animate()
+
+    report = RunReport('visualize', profile=profile)
+    convergence = from_options(tol, max_iter, max_seconds)
+    sessions = [str(x) for x in range(75, 114)] if all else [str(session)]
 
+    if all:
         print('Building gif for: ')
 
-        for x in range(75, 114):
+    for session in sessions:
 
-            session = str(x)
+        if all:
             print(session)
-            animation = Animation(session, chamber)
-            congressmen, majority = animation.load_select_congressmen(chamber)
 
+        with report.stage(session, 'load'):
+            animation = Animation(session, chamber, precision=precision)
+            congressmen, majority = animation.load_select_congressmen(chamber)
             df = animation.load_data(chamber=chamber)
-            df_X, df_y = animation.transform(df, option='svd')
 
-            tsne = tsneAnimate(TSNE(random_state=42, learning_rate=1000))
-            tsne.animate(df_X, df_y, congressmen, animation.session_number, animation.chamber)
+        with report.stage(session, 'svd', input=df):
+            df_X, df_y = animation.transform(df, option='svd',
+                                             dtype=animation.dtype)
 
-    else:
+        report.annotate(session, 'svd', output=df_X)
 
-        animation = Animation(session, chamber)
-        congressmen, majority = animation.load_select_congressmen(chamber)
+        tsne = tsneAnimate(TSNE(random_state=42, learning_rate=1000))
+        tsne.trajectory_dtype = np.dtype(animation.dtype)
+        tsne.convergence = convergence
+        tsne.animate(df_X, df_y, congressmen, animation.session_number,
+                     animation.chamber, report=report)
 
-        df = animation.load_data(chamber=chamber)
-        df_X, df_y = animation.transform(df, option='svd')
+        if convergence is not None:
+            logger.info('%s %s t-SNE: %s', session, chamber,
+                        convergence.summary())
 
-        tsne = tsneAnimate(TSNE(random_state=42, learning_rate=1000))
-        tsne.animate(df_X, df_y, congressmen, animation.session_number, animation.chamber)
+    logger.info('run report saved in %s\n%s', report.to_file(),
+                report.summary())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+conftest.py
+---------------------
+Fixtures shared by the tests: src/ on the import path, as the scripts put
+it, and a scratch project tree with a synthetic session to run them in.
+"""
+import os
+import sys
+import json
+import pytest
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                    'src')
+sys.path.extend([os.path.join(_SRC, directory) for directory in
+                 ['data', 'features', 'visualization', 'pipeline',
+                  'instrumentation']])
+
+SESSION = '900'
+
+
+@pytest.fixture
+def project(tmpdir, monkeypatch):
+    """Project-shaped scratch tree. Tests run from its src/features/, as
+    the scripts run from their own directory and find ../../data from there.
+    """
+
+    root = str(tmpdir)
+
+    for directory in ['data/raw', 'data/interim', 'data/processed',
+                      'data/supplemental', 'reports/figures', 'src/data',
+                      'src/features', 'src/visualization', 'src/pipeline']:
+        os.makedirs(os.path.join(root, directory))
+
+    filename = os.path.join(root, 'data/supplemental/select_congressmen.json')
+
+    with open(filename, 'w') as jfile:
+        json.dump({}, jfile)
+
+    monkeypatch.chdir(os.path.join(root, 'src', 'features'))
+
+    return root
+
+
+@pytest.fixture
+def synthetic(project):
+    """A tiny synthetic session, written to ../../data/raw/<SESSION>/.
+    """
+
+    from make_synthetic import SyntheticCongress, PRESETS
+
+    congress = SyntheticCongress(SESSION, **PRESETS['tiny'])
+    congress.to_files(os.path.join(project, 'data/raw'))
+
+    return congress
+
+
+@pytest.fixture
+def processed(synthetic):
+    """The synthetic session parsed and written to ../../data/processed/,
+    as make_dataset.py does. Returns the dataframe.
+    """
+
+    from make_dataset import Congress, Dataset
+
+    measures_voted_on, records = Congress(SESSION).get_measures_voted_on()
+    dataframe = Dataset().construct(measures_voted_on, records)
+    Dataset().to_file(SESSION, dataframe)
+    Dataset().measures_to_file(SESSION, measures_voted_on)
+
+    return dataframe
+
+
+@pytest.fixture
+def records(processed):
+    """Normalized records of the processed session, as
+    Features.load_records returns them.
+    """
+
+    from build_features import Features
+
+    return Features(SESSION).load_records()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_affinities.py
+---------------------
+Embeddings fitted with cached affinities are those of a plain t-SNE.
+"""
+import os
+import numpy as np
+import scipy.sparse as sp
+import pytest
+
+
+def make_tsne():
+
+    from sklearn.manifold import TSNE
+
+    return TSNE(n_components=2, perplexity=10., random_state=0)
+
+
+@pytest.fixture
+def X():
+    return np.random.RandomState(0).normal(size=(60, 5))
+
+
+def test_fit_transform_matches_plain_tsne(project, X):
+
+    from affinities import fit_transform
+
+    expected = make_tsne().fit_transform(X)
+
+    np.testing.assert_array_equal(fit_transform(make_tsne(), X), expected)
+    # Again, from the cache where it is supported.
+    np.testing.assert_array_equal(fit_transform(make_tsne(), X), expected)
+
+
+def test_affinities_are_cached(project, X):
+
+    from affinities import Affinities
+
+    affinities = Affinities(X, perplexity=10.).get()
+    assert os.path.isfile(affinities.cache_file)
+
+    cached = Affinities(X, perplexity=10.)
+    assert cached.load()
+    dense = [P.toarray() if sp.issparse(P) else P
+             for P in [cached.P, affinities.P]]
+    np.testing.assert_array_equal(*dense)
+    np.testing.assert_array_equal(cached.neighbors[1], affinities.neighbors[1])
+
+
+def test_cached_fits_skip_the_affinities(project, X, monkeypatch):
+
+    import affinities
+    from visualize import getSteps
+
+    class Steps(object):
+        tsne = make_tsne()
+
+    expected = make_tsne().fit_transform(X)
+    expected_steps = getSteps(Steps(), X, None)
+    affinities.Affinities(X, perplexity=10.).get()
+
+    def recompute(*args, **kwargs):
+        raise AssertionError('P was not taken from the cache')
+
+    monkeypatch.setitem(affinities._originals, '_joint_probabilities_nn',
+                        recompute)
+
+    np.testing.assert_array_equal(affinities.fit_transform(make_tsne(), X),
+                                  expected)
+    # getSteps' own gradient descent runs on the cached P as well.
+    steps = getSteps(Steps(), X, None)
+    assert len(steps) == len(expected_steps)
+    np.testing.assert_array_equal(steps[-1], expected_steps[-1])
+
+
+def test_unsupported_layout_falls_back(project, X, monkeypatch):
+
+    import affinities
+
+    monkeypatch.setattr(affinities, 'supported', lambda: False)
+
+    with affinities.Affinities(X, perplexity=10.).fitting() as cache:
+        Y = make_tsne().fit_transform(X)
+
+    assert not os.path.exists(os.path.dirname(cache.cache_file))
+    np.testing.assert_array_equal(Y, make_tsne().fit_transform(X))
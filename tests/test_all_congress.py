@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_all_congress.py
+---------------------
+The streamed, block-wise SVD of all_congress.py against a dense SVD of the
+combined vote matrix, and its checkpoints.
+"""
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import pytest
+
+
+@pytest.fixture
+def sessions(project):
+    """Two processed synthetic sessions, 900 and 901.
+    """
+
+    from make_synthetic import SyntheticCongress, PRESETS
+    from make_dataset import Congress, Dataset
+
+    for seed, session in enumerate(['900', '901']):
+
+        SyntheticCongress(session, seed=seed, **PRESETS['tiny']).to_files(
+            os.path.join(project, 'data/raw'))
+        measures_voted_on, records = Congress(session).get_measures_voted_on()
+        Dataset().to_file(session, Dataset().construct(measures_voted_on,
+                                                       records))
+
+    return ['900', '901']
+
+
+def dense(blocks):
+    return sp.hstack(list(blocks.blocks())).toarray()
+
+
+def test_block_svd_matches_dense(sessions):
+
+    from all_congress import SparseBlocks, BlockRandomizedSVD
+
+    blocks = SparseBlocks(sessions)
+    blocks.build()
+    A = dense(blocks)
+
+    # With as many samples as rows, the range finder spans all of A.
+    svd = BlockRandomizedSVD(n_components=5, oversample=len(A) - 5)
+    US = svd.fit_transform(blocks.blocks, len(A))
+
+    U, S, _ = np.linalg.svd(A, full_matrices=False)
+    np.testing.assert_allclose(np.abs(US), np.abs(U[:, :5] * S[:5]),
+                               atol=1e-8)
+
+
+def test_interrupted_svd_resumes(sessions, tmpdir):
+
+    from all_congress import SparseBlocks, BlockRandomizedSVD
+
+    blocks = SparseBlocks(sessions)
+    blocks.build()
+    n_rows = len(blocks.members)
+    expected = BlockRandomizedSVD(n_components=5).fit_transform(
+        blocks.blocks, n_rows)
+
+    def interrupted():
+
+        for b, block in enumerate(blocks.blocks()):
+
+            if b == 1:
+                raise KeyboardInterrupt
+
+            yield block
+
+    state_file = str(tmpdir.join('state.npz'))
+
+    with pytest.raises(KeyboardInterrupt):
+        svd = BlockRandomizedSVD(n_components=5, state_file=state_file)
+        svd.fit_transform(interrupted, n_rows)
+
+    resumed = BlockRandomizedSVD(n_components=5, state_file=state_file)
+    np.testing.assert_allclose(resumed.fit_transform(blocks.blocks, n_rows),
+                               expected)
+
+
+def test_session_ranges_do_not_share_checkpoints(sessions):
+
+    from all_congress import AllCongress
+
+    first = AllCongress(first=900, last=900, n_features_SVD=5)
+    X_first = first.transform_SVD()
+    both = AllCongress(first=900, last=901, n_features_SVD=5)
+    X_both = both.transform_SVD()
+
+    assert first.blocks.work_path != both.blocks.work_path
+    assert X_first.shape == X_both.shape
+    assert not np.allclose(np.abs(X_first), np.abs(X_both))
+    assert (both.blocks.members.to_frame().Last == '901').all()
+
+
+def test_new_sessions_refresh_the_features(sessions, project):
+
+    from all_congress import AllCongress
+
+    later = os.path.join(project, 'data/processed/901_dataframe.csv')
+    os.rename(later, later + '.later')
+    AllCongress(first=900, last=901, n_features_SVD=5).transform_SVD()
+    os.rename(later + '.later', later)
+
+    X = AllCongress(first=900, last=901, n_features_SVD=5).transform_SVD()
+    restarted = AllCongress(first=900, last=901, n_features_SVD=5)
+    restarted.restart()
+
+    np.testing.assert_allclose(X, restarted.transform_SVD())
+
+
+def test_plot_is_saved_with_the_figures(project):
+
+    from build_features import Features
+    from all_congress import AllCongress
+
+    df_tSNE = pd.DataFrame(np.random.RandomState(0).randn(6, 2))
+    df_tSNE['Party'] = ['D', 'R', 'I'] * 2
+    df_tSNE['Chamber'] = ['s', 'h'] * 3
+    AllCongress(first=900, last=901, n_features_SVD=5).plot(df_tSNE)
+
+    assert [name.split('_')[1]
+            for name in os.listdir(Features(900).output_path)] == \
+        ['Congress']
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_archive.py
+---------------------
+A session read from a zip or tar.gz archive gives the dataframe of the same
+session read from its extracted tree.
+"""
+import os
+import shutil
+import tarfile
+import zipfile
+import pytest
+
+from conftest import SESSION
+
+
+def parse(**kwargs):
+
+    from make_dataset import Congress, Dataset
+
+    congress = Congress(SESSION, **kwargs)
+    measures_voted_on, records = congress.get_measures_voted_on()
+
+    return Dataset().construct(measures_voted_on, records)
+
+
+def sort(df):
+
+    return df.sort_index().sort_index(axis=1)
+
+
+def write_archive(raw, extension):
+
+    filename = os.path.join(raw, SESSION + extension)
+
+    if extension == '.zip':
+
+        with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zfile:
+
+            for directory, _, files in os.walk(os.path.join(raw, SESSION)):
+
+                for name in files:
+                    path = os.path.join(directory, name)
+                    zfile.write(path, os.path.relpath(path, raw))
+
+    else:
+
+        with tarfile.open(filename, 'w:gz') as tfile:
+            tfile.add(os.path.join(raw, SESSION), arcname=SESSION)
+
+    return filename
+
+
+@pytest.mark.parametrize('extension', ['.zip', '.tar.gz'])
+def test_archive_matches_extracted_tree(synthetic, project, extension):
+
+    raw = os.path.join(project, 'data/raw')
+    expected = parse()
+    filename = write_archive(raw, extension)
+
+    df = parse(archive=filename)
+
+    assert sort(df).equals(sort(expected))
+
+    # Without the extracted tree, the archive is found on its own.
+    shutil.rmtree(os.path.join(raw, SESSION))
+    df = parse()
+
+    assert sort(df).equals(sort(expected))
+
+
+def test_directory_of_archives(synthetic, project, tmpdir):
+
+    from click.testing import CliRunner
+    from archive import session_archive
+    from make_dataset import main
+
+    raw = os.path.join(project, 'data/raw')
+    expected = parse()
+    archives = str(tmpdir.mkdir('archives'))
+    filename = os.path.join(archives, SESSION + '.zip')
+    shutil.move(write_archive(raw, '.zip'), filename)
+
+    assert session_archive(archives, SESSION) == filename
+    assert session_archive(filename, SESSION) == filename
+    assert session_archive(archives, '901') is None
+    assert sort(parse(archive=session_archive(archives, SESSION))).equals(
+        sort(expected))
+
+    # A single archive cannot hold every session.
+    result = CliRunner().invoke(main, ['--all', '--archive', filename])
+    assert result.exit_code == 2
+    assert '--archive with --all' in result.output
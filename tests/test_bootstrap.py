@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_bootstrap.py
+---------------------
+Every resample of Bootstrap, from its weights, against the statistics
+recomputed directly on the vote matrix with each measure repeated as many
+times as it was drawn.
+"""
+import numpy as np
+
+
+def statistics(X, party):
+    """Agreement of member 0 with every other member, cohesion per party
+    code and distance of every member to its party centroid, on X.
+    """
+
+    yea, nay = (X == 1), (X == 0)
+    cast = yea | nay
+
+    both = cast[0] & cast[1:]
+    same = ((yea[0] & yea[1:]) | (nay[0] & nay[1:])) & both
+    agreement = same.sum(axis=1) / np.maximum(both.sum(axis=1), 1.)
+
+    cohesion, distance = {}, np.full(len(X), np.nan)
+    votes = np.where(yea, 1., np.where(nay, -1., 0.))
+
+    for p in set(party[party >= 0]):
+
+        members = party == p
+        yeas, nays = yea[members].sum(axis=0), nay[members].sum(axis=0)
+        voted = yeas + nays > 0
+        cohesion[p] = (np.abs(yeas - nays)[voted] /
+                       (yeas + nays)[voted].astype(float)).mean()
+
+        centroid = votes[members].sum(axis=0) / np.maximum(
+            cast[members].sum(axis=0), 1)
+
+        for i in np.flatnonzero(members):
+            squared = ((votes[i] - centroid) ** 2)[cast[i]]
+            distance[i] = np.sqrt(squared.mean())
+
+    return agreement, cohesion, distance
+
+
+def test_resamples_match_replicated_columns(records):
+
+    from bootstrap import Bootstrap
+    from chamber import chamber_votes
+
+    bootstrap = Bootstrap(records, 'h', n_resamples=5, random_state=1)
+    df, X, cast = chamber_votes(records, 'h')
+    X = X[:, cast]
+    party = bootstrap._party
+
+    pairs = [(0, other) for other in range(1, len(X))]
+    agreement = bootstrap.agreement(pairs)
+    cohesion = bootstrap.cohesion()
+    distance = bootstrap.distance()
+
+    counts = np.hstack([np.ones((X.shape[1], 1)), bootstrap.weights])
+
+    for r, count in enumerate(counts.T):
+
+        columns = np.repeat(np.arange(X.shape[1]), count.astype(int))
+        expected = statistics(X[:, columns], party)
+
+        np.testing.assert_allclose(agreement[:, r], expected[0])
+
+        for p, value in expected[1].items():
+            assert np.isclose(cohesion[p, r], value)
+
+        np.testing.assert_allclose(distance[:, r], expected[2])
+
+
+def test_agreement_of_every_pair_in_blocks(records):
+
+    from bootstrap import Bootstrap
+
+    bootstrap = Bootstrap(records, 's', n_resamples=20)
+    names = bootstrap._names
+    a, b = np.triu_indices(len(names), 1)
+    expected = bootstrap.agreement(np.column_stack([a, b]))
+
+    df = bootstrap.compute(block_size=7)
+    agreement = df[df.statistic == 'agreement']
+
+    assert agreement.subject.tolist() == \
+        ['|'.join([names[i], names[j]]) for i, j in zip(a, b)]
+    np.testing.assert_allclose(agreement.estimate, expected[:, 0])
+    np.testing.assert_allclose(agreement['std'], expected[:, 1:].std(axis=1))
+
+    selected = bootstrap.compute(members=[names[0]])
+    assert (selected.statistic == 'agreement').sum() == len(names) - 1
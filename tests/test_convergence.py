@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_convergence.py
+---------------------
+Convergence is only judged after early exaggeration, and a stopped run ends
+there, in scikit-learn's optimizer as in the animation's.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def X():
+    return np.random.RandomState(0).normal(size=(60, 5))
+
+
+def exaggerated_iterations():
+    """Iterations run with early exaggeration: 100, in two stages, before
+    scikit-learn 0.19, and 250 since.
+    """
+
+    from convergence import exaggeration_stages
+
+    return 100 if exaggeration_stages() == 2 else 250
+
+
+def test_converged_only_after_exaggeration(X):
+
+    from sklearn.manifold import TSNE
+    from convergence import Convergence
+
+    convergence = Convergence(tol=1., n_iter_check=25)
+
+    with convergence.monitoring():
+        TSNE(perplexity=10., random_state=0).fit_transform(X)
+
+    assert convergence.reason == 'converged'
+    assert convergence.history
+    assert min(check[0] for check in convergence.history) > \
+        exaggerated_iterations()
+
+
+def test_budget_stops_during_exaggeration(X):
+
+    from sklearn.manifold import TSNE
+    from convergence import Convergence
+
+    convergence = Convergence(tol=None, max_iter=30)
+
+    with convergence.monitoring():
+        TSNE(perplexity=10., random_state=0).fit_transform(X)
+
+    assert convergence.reason == 'max_iter'
+    assert convergence.n_iter == 30
+    assert not convergence.history
+
+
+def test_stopped_animation_records_no_extra_frames(X):
+
+    pytest.importorskip('tsne_animate')
+
+    from sklearn.manifold import TSNE
+    from convergence import Convergence
+    from visualize import load_tsne_animate
+
+    tsne = load_tsne_animate()(TSNE(perplexity=10., random_state=0))
+    tsne.convergence = Convergence(tol=None, max_iter=30)
+    positions = tsne.getSteps(X, pd.Series(['D'] * len(X)))
+
+    assert tsne.convergence.reason == 'max_iter'
+    assert len(positions) == 30
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_export_db.py
+---------------------
+A processed session exported to SQLite, in long format, reads back as the
+vote matrix, measures and embedding it was exported from; exporting it
+again replaces its rows.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+from conftest import SESSION
+
+
+def test_export_round_trip(processed, project):
+
+    from export_db import VoteDatabase, read_session
+    from normalize import normalize_names
+
+    data_path = os.path.join(project, 'data/processed')
+    df, measures, _ = read_session(data_path, SESSION)
+    senate = df[df.Chamber == 's']
+    embedding = pd.DataFrame(np.arange(2. * len(senate)).reshape(-1, 2),
+                             index=senate.Name)
+    database = VoteDatabase(os.path.join(project, 'usvotes.sqlite'))
+
+    counts = database.export_session(SESSION, df, measures, {'s': embedding})
+
+    vote_ids = df.columns.tolist()[4:]
+    votes = df[vote_ids].values
+    names = normalize_names(df.Name).tolist()
+
+    assert counts == {'members': len(df), 'measures': len(measures),
+                      'votes': int((votes >= 0).sum()),
+                      'embeddings': len(senate)}
+    assert counts == database.export_session(SESSION, df, measures,
+                                             {'s': embedding})
+
+    # The votes table, pivoted back into a (members x measures) matrix.
+    rows = database.connection.execute(
+        'SELECT m.name, v.vote_id, v.value FROM votes v '
+        'JOIN members m USING (member_id)').fetchall()
+    matrix = pd.DataFrame(rows, columns=['name', 'vote_id', 'value']).pivot(
+        index='name', columns='vote_id', values='value')
+    matrix = matrix.reindex(index=names, columns=vote_ids).fillna(-1)
+
+    np.testing.assert_array_equal(matrix.values, votes)
+
+    exported = database.connection.execute(
+        'SELECT vote_id, date, result, chamber FROM measures '
+        'ORDER BY date, vote_id').fetchall()
+    expected = measures.sort_values(['date', 'vote_id'])
+
+    assert exported == [tuple(row) for row in expected.values.tolist()]
+
+    coordinates = database.connection.execute(
+        'SELECT m.name, e.x, e.y FROM embeddings e '
+        'JOIN members m USING (member_id) ORDER BY e.x').fetchall()
+
+    assert coordinates == [(name, x, y) for name, (x, y) in zip(
+        normalize_names(senate.Name), embedding.values.tolist())]
+
+    # One member's votes, in date order.
+    name = names[0]
+    dates = dict(zip(measures.vote_id, measures.date))
+    cast = [(int(SESSION), dates[vote_id], vote_id, int(value))
+            for vote_id, value in zip(vote_ids, votes[0]) if value >= 0]
+
+    rows = database.member_votes(name)
+
+    assert sorted(rows) == sorted(cast)
+    assert [row[1] for row in rows] == sorted(row[1] for row in cast)
+
+    database.close()
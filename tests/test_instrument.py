@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_instrument.py
+---------------------
+An instrumented parse gives the session of an uninstrumented one, with one
+record per stage that adds up every call, and the saved JSON and CSV reports
+hold those records.
+"""
+import os
+import csv
+import json
+
+from conftest import SESSION
+
+
+def test_report_adds_up_calls(synthetic, project):
+
+    from make_dataset import Congress
+    from make_synthetic import PRESETS
+    from instrument import RunReport
+
+    report = RunReport('make_dataset')
+    measures_voted_on, records = Congress(
+        SESSION, report=report).get_measures_voted_on()
+    expected = Congress(SESSION).get_measures_voted_on()
+
+    assert (measures_voted_on, records) == expected
+
+    stages = dict((r['stage'], r) for r in report.records)
+    n_votes = len(measures_voted_on)
+
+    assert sorted(stages) == ['parse', 'records']
+    # One call per file, and the last one finding no file left.
+    assert stages['parse']['calls'] == PRESETS['tiny']['measures'] + 1
+    assert stages['records']['calls'] == n_votes
+    assert stages['records']['input'] == n_votes
+    assert stages['records']['output'] == len(records)
+
+    filename = report.to_file()
+
+    assert os.path.dirname(filename) == os.path.join(project, 'reports/runs')
+
+    with open(filename) as jfile:
+        assert json.load(jfile)['stages'] == report.records
+
+    with open(filename[:-len('json')] + 'csv') as cfile:
+        rows = list(csv.DictReader(cfile))
+
+    assert [(r['stage'], int(r['calls'])) for r in rows] == \
+        [(r['stage'], r['calls']) for r in report.records]
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_make_synthetic.py
+---------------------
+A seed gives the same session every time, written either as a tree of
+files or as a zip, and every member of a chamber is in exactly one of the
+answers of each of its votes.
+"""
+import os
+import json
+import zipfile
+
+from conftest import SESSION
+
+
+def test_seeded_tree_and_zip_match(project):
+
+    from make_synthetic import SyntheticCongress, PRESETS
+
+    raw = os.path.join(project, 'data/raw')
+    SyntheticCongress(SESSION, **PRESETS['tiny']).to_files(raw)
+    filename = SyntheticCongress(SESSION, **PRESETS['tiny']).to_files(
+        raw, archive=True)
+
+    with zipfile.ZipFile(filename) as zfile:
+
+        names = zfile.namelist()
+
+        assert len(names) == PRESETS['tiny']['measures']
+
+        for name in names:
+
+            with open(os.path.join(raw, name)) as jfile:
+                assert json.loads(zfile.read(name).decode('utf-8')) == \
+                    json.load(jfile)
+
+
+def test_every_member_answers_once():
+
+    from make_synthetic import SyntheticCongress, PRESETS
+
+    congress = SyntheticCongress(SESSION, **PRESETS['tiny'])
+    ids = dict((chamber, sorted(r['id'] for r in members['records']))
+               for chamber, members in congress.members.items())
+    keys = set()
+
+    for data in congress.measures():
+
+        entries = [e for answer in data['votes'].values() for e in answer
+                   if e != 'VP']
+        yeas = [key for key in ['Yea', 'Aye'] if key in data['votes']]
+        nays = [key for key in ['Nay', 'No'] if key in data['votes']]
+        n_yea, n_nay = len(data['votes'][yeas[0]]), \
+            len(data['votes'][nays[0]])
+        keys.add((yeas[0], nays[0]))
+
+        assert sorted(e['id'] for e in entries) == ids[data['chamber']]
+        assert data['result'] == ('Passed' if n_yea > n_nay else 'Failed')
+
+        if data['chamber'] == 's':
+            assert yeas == ['Yea'] and nays == ['Nay']
+
+    assert keys == set([('Yea', 'Nay'), ('Aye', 'No')])
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_measures.py
+---------------------
+Measure analytics: partisanship against a recount of the votes, and the
+rankings written alongside them.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+from conftest import SESSION
+
+
+def test_measures_analysis(records, project):
+
+    from build_features import Features
+
+    features = Features(SESSION)
+    features.transform_SVD(records, 'h', n_features_SVD=5)
+    features.analyze_measures(records, n_clusters=3)
+
+    df = pd.read_csv(os.path.join(project, 'data/processed',
+                                  SESSION + '_h_measures_analysis.csv'),
+                     encoding='utf-8').set_index('vote_id')
+    house = records[records.Chamber == 'h']
+
+    for vote_id, row in df.iterrows():
+
+        votes = house[[vote_id, 'Party']]
+
+        for party in ['D', 'R']:
+            cast = votes[(votes.Party == party) & (votes[vote_id] >= 0)]
+            assert np.isclose(row['yea_' + party], (cast[vote_id] == 1).mean())
+
+    # The top 10 of each list: no other measure ranks strictly higher.
+    divisive = df.dropna(subset=['divisive_rank']).sort_values(
+        'divisive_rank')
+    assert divisive.divisive_rank.tolist() == list(range(1, 11))
+    assert divisive.partisanship.is_monotonic_decreasing
+    assert (df.partisanship > divisive.partisanship.min()).sum() < 10
+
+    bipartisan = df.dropna(subset=['bipartisan_rank'])
+    assert len(bipartisan) == 10
+    assert (df.partisanship < bipartisan.partisanship.max()).sum() < 10
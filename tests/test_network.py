@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_network.py
+---------------------
+The co-voting graph, built a block of members at a time, against agreement
+rates counted pair by pair, and the modularity of its communities against
+the Newman-Girvan sum over all pairs.
+"""
+import numpy as np
+import pytest
+
+
+def pairwise(records, chamber, threshold, min_common):
+    """Dense adjacency matrix, from a plain loop over pairs of members.
+    """
+
+    X = records[records.Chamber == chamber].iloc[:, 3:].values
+    n = X.shape[0]
+    A = np.zeros((n, n))
+
+    for i in range(n):
+
+        for j in range(i + 1, n):
+
+            both = (X[i] >= 0) & (X[j] >= 0)
+            common = both.sum()
+            rate = (X[i][both] == X[j][both]).sum() / float(max(common, 1))
+
+            if rate >= threshold and common >= min_common:
+                A[i, j] = A[j, i] = rate
+
+    return A
+
+
+@pytest.mark.parametrize('chamber', ['s', 'h'])
+def test_blockwise_graph_matches_pairwise(records, chamber):
+
+    from network import CoVotingGraph
+
+    expected = pairwise(records, chamber, 0.6, 10)
+
+    assert expected.any()
+
+    for block_size in [7, 256]:
+
+        graph = CoVotingGraph(records, chamber, threshold=0.6,
+                              min_common=10, block_size=block_size)
+        np.testing.assert_allclose(graph.adjacency.toarray(), expected,
+                                   rtol=1e-6)
+
+
+def test_modularity_matches_pairwise_sum(records):
+
+    from network import CoVotingGraph, louvain, modularity
+
+    A = CoVotingGraph(records, 'h', threshold=0.6).adjacency
+    communities = louvain(A)
+    dense = A.toarray()
+    k = dense.sum(axis=1)
+    m2 = k.sum()
+    same = communities[:, None] == communities[None, :]
+    expected = ((dense - np.outer(k, k) / m2) * same).sum() / m2
+
+    assert len(set(communities)) > 1
+    assert np.isclose(modularity(A, communities), expected)
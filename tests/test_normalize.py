@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_normalize.py
+---------------------
+Names and parties normalized once per distinct value match the element-wise
+maps that Features.load_records applied before normalize.py, and NameIndex
+finds the rows that boolean scans of the index find.
+"""
+import unicodedata as ucd
+import numpy as np
+import pandas as pd
+
+
+NAMES = [u'SANDERS', u'mcconnell', u'Peña', u'Peña', u'Nuñez', u'reid',
+         u'SANDERS', u'Velázquez']
+PARTIES = ['Democrat', 'D', 'Republican', 'R', 'Independent', 'I',
+           'Democrat', 'Republican']
+
+
+def test_records_match_elementwise_maps():
+
+    from normalize import normalize_records
+
+    df = pd.DataFrame({'Name': NAMES, 'Party': PARTIES, 'State': 'VT',
+                       'Chamber': 's', 'h1-113.2013': 1})
+    expected = df.set_index('Name')
+    expected.index = expected.index.map(
+        lambda x: ucd.normalize('NFKD', x.title()))
+    expected.Party = expected.Party.map({'Democrat': 'D', 'D': 'D',
+                                         'Republican': 'R', 'R': 'R',
+                                         'Independent': 'I', 'I': 'I'})
+
+    records = normalize_records(df.set_index('Name'))
+
+    assert records.index.tolist() == expected.index.tolist()
+    assert records.Party.astype(object).tolist() == expected.Party.tolist()
+    assert normalize_records(df).Name.tolist() == expected.index.tolist()
+
+
+def test_unknown_parties_are_missing():
+
+    from normalize import normalize_parties
+
+    parties = normalize_parties(['Whig', 'Democrat', None, 'Farmer-Labor'])
+
+    assert pd.isnull(parties[0]) and pd.isnull(parties[2])
+    assert [parties[1], parties[3]] == ['D', 'F']
+
+
+def test_name_index_matches_boolean_scans():
+
+    from normalize import NameIndex, normalize_names
+
+    index = pd.Index(normalize_names(NAMES[:3] + NAMES[4:6]))
+    rows = NameIndex(index)
+
+    for name in NAMES[:-1]:
+
+        scan = np.flatnonzero(index == ucd.normalize('NFKD', name.title()))
+
+        assert name in rows
+        assert rows[name] == scan[0]
+
+    assert NAMES[-1] not in rows
+    np.testing.assert_array_equal(rows.rows([u'reid', u'SANDERS']),
+                                  [4, 0])
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_parsers.py
+---------------------
+VoteParser, with every JSON backend installed, reads the members and votes
+that make_dataset read from each file before parsers.py (the legacy parser
+of benchmarks/ingest.py).
+"""
+import os
+import sys
+import glob
+import json
+import pytest
+
+from conftest import SESSION
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'benchmarks'))
+
+
+def parsed(parser, raw):
+    """The (name, id, party, state) of every yea then nay of a raw file, as
+    legacy_parse returns them.
+    """
+
+    vote = parser.loads(raw)
+
+    if vote is None:
+        return None
+
+    members = [parser.members[key] for key in vote.yeas + vote.nays]
+
+    return [(m.name, m.congress_id, m.party, m.state) for m in members]
+
+
+@pytest.mark.parametrize('backend', ['orjson', 'ujson', 'simplejson',
+                                     'json'])
+def test_parser_matches_legacy_parse(synthetic, project, backend):
+
+    from parsers import VoteParser
+    from ingest import legacy_parse
+
+    pytest.importorskip(backend)
+
+    parser = VoteParser(backend)
+    pattern = os.path.join(project, 'data/raw', SESSION, 'votes', '*', '*',
+                           'data.json')
+    filenames = sorted(glob.glob(pattern))
+    abstain = {'vote_id': 'h0-900.2013', 'date': '2013-01-01',
+               'result': 'Passed', 'chamber': 'h',
+               'votes': {'Present': [], 'Not Voting': []}}
+    raws = [json.dumps(abstain).encode('utf-8')]
+
+    assert filenames
+
+    for filename in filenames:
+
+        with open(filename, 'rb') as jfile:
+            raws.append(jfile.read())
+
+    for raw in raws:
+        assert parsed(parser, raw) == legacy_parse(raw)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_pivotal.py
+---------------------
+Close votes and swing members against a brute-force recount, one measure
+and one member at a time.
+"""
+import pytest
+
+
+def recount(records, chamber, close):
+    """Per-measure and per-member counts, from plain loops over the votes.
+    """
+
+    from normalize import PARTY_CODES
+
+    members = records[records.Chamber == chamber]
+    measures, counts = {}, {}
+
+    for vote_id in members.columns[3:]:
+
+        votes = dict((name, vote) for name, vote
+                     in zip(members.index, members[vote_id]) if vote >= 0)
+
+        if not votes:
+            continue
+
+        yeas = sum(1 for vote in votes.values() if vote == 1)
+        nays = len(votes) - yeas
+        position = {}
+
+        for party in set(members.Party):
+            party_votes = [votes[name] for name in votes
+                           if members.Party[name] == party]
+            balance = sum(1 if vote == 1 else -1 for vote in party_votes)
+            position[party] = (balance > 0) - (balance < 0)
+
+        n_pivotal = n_defectors = 0
+        is_close = abs(yeas - nays) <= close * (yeas + nays)
+
+        for name, vote in votes.items():
+
+            # Would switching this vote alone flip the outcome?
+            switched = (yeas - 1, nays + 1) if vote == 1 else (yeas + 1,
+                                                               nays - 1)
+            pivotal = (yeas > nays) != (switched[0] > switched[1])
+            party = members.Party[name]
+            defect = party in PARTY_CODES and position[party] != 0 and \
+                (1 if vote == 1 else -1) != position[party]
+
+            count = counts.setdefault(name, dict(
+                n_votes=0, n_close=0, defections=0, close_defections=0,
+                pivotal=0, pivotal_defections=0))
+            count['n_votes'] += 1
+            count['n_close'] += is_close
+            count['defections'] += defect
+            count['close_defections'] += defect and is_close
+            count['pivotal'] += pivotal
+            count['pivotal_defections'] += pivotal and defect
+            n_pivotal += pivotal
+            n_defectors += defect
+
+        measures[vote_id] = dict(yeas=yeas, nays=nays, close=is_close,
+                                 pivotal=n_pivotal, defectors=n_defectors)
+
+    return measures, counts
+
+
+@pytest.mark.parametrize('chamber', ['s', 'h'])
+def test_pivotal_votes_match_recount(records, chamber):
+
+    from pivotal import PivotalVotes
+
+    df_measures, df_members = PivotalVotes(records, chamber,
+                                           close=0.2).analyze()
+    measures, counts = recount(records, chamber, 0.2)
+
+    assert sorted(df_measures.index) == sorted(measures)
+    assert df_measures.close.any()
+    assert df_measures.pivotal.any()
+
+    for vote_id, expected in measures.items():
+        for column, value in expected.items():
+            assert df_measures.loc[vote_id, column] == value, (vote_id, column)
+
+    for name, row in df_members.iterrows():
+        for column, value in counts.get(name, {}).items():
+            assert row[column] == value, (name, column)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_precision.py
+---------------------
+The float32 precision mode stores the same votes as float64, and the
+singular values of an SVD are found on every version of scikit-learn.
+"""
+import numpy as np
+
+from conftest import SESSION
+
+
+def test_int8_votes_match_float64(synthetic):
+
+    from make_dataset import Congress, Dataset
+
+    measures_voted_on, records = Congress(SESSION).get_measures_voted_on()
+    df64 = Dataset().construct(measures_voted_on, records)
+    df8 = Dataset().construct(measures_voted_on, records, dtype='int8')
+
+    assert (df8.dtypes[3:] == np.int8).all()
+    np.testing.assert_array_equal(df8.iloc[:, 3:].values,
+                                  df64.iloc[:, 3:].values)
+    assert df8.iloc[:, :3].equals(df64.iloc[:, :3])
+
+
+def test_singular_values(records):
+
+    from sklearn.decomposition import TruncatedSVD
+    from measures import singular_values
+
+    X = records[records.Chamber == 'h'].iloc[:, 3:].values.astype(float)
+    svd = TruncatedSVD(10, algorithm='arpack').fit(X)
+    expected = np.linalg.svd(X, compute_uv=False)[:10]
+
+    np.testing.assert_allclose(singular_values(svd, X), expected, rtol=1e-6)
+
+    if hasattr(svd, 'singular_values_'):
+        del svd.singular_values_
+        np.testing.assert_allclose(singular_values(svd, X), expected,
+                                   rtol=1e-6)
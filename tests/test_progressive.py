@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_progressive.py
+---------------------
+The preview places members as inverse-distance weighted means computed one
+member at a time, and the refined embedding of the background thread is the
+t-SNE of the same initialization run directly.
+"""
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def X():
+    return np.random.RandomState(0).randn(80, 6)
+
+
+def test_interpolation_matches_brute_force(X):
+
+    from progressive import interpolate, squared_distances
+
+    landmarks = np.arange(0, len(X), 4)
+    Y_landmarks = np.random.RandomState(1).randn(len(landmarks), 2)
+    Y = interpolate(X, landmarks, Y_landmarks, n_neighbors=3)
+
+    np.testing.assert_allclose(
+        squared_distances(X, X[landmarks]),
+        ((X[:, None, :] - X[landmarks][None, :, :]) ** 2).sum(axis=2),
+        atol=1e-10)
+
+    for i in range(len(X)):
+
+        d = np.sqrt(((X[landmarks] - X[i]) ** 2).sum(axis=1))
+
+        if i in landmarks:
+            expected = Y_landmarks[list(landmarks).index(i)]
+
+        else:
+            nearest = np.argsort(d)[:3]
+            weights = 1. / d[nearest]
+            expected = weights.dot(Y_landmarks[nearest]) / weights.sum()
+
+        np.testing.assert_allclose(Y[i], expected)
+
+
+def test_refined_matches_direct_tsne(project, X):
+
+    from affinities import fit_transform
+    from progressive import ProgressiveEmbedding, make_tsne
+
+    progressive = ProgressiveEmbedding(X, n_landmarks=20, n_iter=250)
+    preview = progressive.preview()
+    received = []
+    progressive.refine(callback=received.append)
+    result = progressive.result()
+
+    init = 1e-4 * (preview - preview.mean(axis=0)) / preview[:, 0].std()
+    expected = fit_transform(make_tsne(n_components=2, init=init,
+                                       random_state=0), X)
+
+    assert len(progressive.landmarks) == 20
+    assert received[0] is result
+    np.testing.assert_allclose(result, expected)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_render_batch.py
+---------------------
+The batch renderer draws from the saved embeddings alone, into the same
+directory as the figure of a single session.
+"""
+import os
+
+from conftest import SESSION
+
+
+def test_single_and_batch_figures_share_a_directory(records, project):
+
+    from build_features import Features
+    from render_batch import render_sessions
+
+    features = Features(SESSION)
+    embeddings = {}
+
+    for chamber, scale in [('s', 'robust'), ('h', 'standard')]:
+        embeddings[chamber] = features.transform_SVD_tSNE(
+            records, chamber, n_features_SVD=5, scale=scale)
+        features.embedding_to_file(embeddings[chamber], chamber)
+
+    features.plot_2D_tSNE(embeddings['s'], embeddings['h'], SESSION)
+    single = os.listdir(features.output_path)
+
+    # Rendering never reads the vote records.
+    os.remove(features.input_file)
+    results = list(render_sessions([SESSION], formats=['png', 'svg']))
+    session, paths, seconds, error = results[0]
+
+    assert error is None
+    assert set(os.path.dirname(path) for path in paths) == \
+        set([os.path.dirname(features.output_path)])
+    assert features.output_path == os.path.join(project, 'reports/figures/')
+    assert [name for name in single if name.endswith('.png')] == \
+        [os.path.basename(path) for path in paths if path.endswith('.png')]
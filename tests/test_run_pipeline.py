@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_run_pipeline.py
+---------------------
+The stages of the in-memory pipeline hand on what the scripts read back from
+the processed CSVs, and a second run reuses the cached outputs.
+"""
+import numpy as np
+
+from conftest import SESSION
+
+
+def test_in_memory_stages_match_csv_round_trip(synthetic):
+
+    from build_features import Features
+    from run_pipeline import Pipeline
+
+    skip = ['embedding', 'plot']
+    results = Pipeline(SESSION, skip=skip, n_features_SVD=5).run()
+
+    features = Features(SESSION)
+    records = features.load_records()
+    df = results['matrix']
+
+    assert df.index.tolist() == records.index.tolist()
+    assert df.columns.tolist() == records.columns.tolist()
+    assert df.iloc[:, :3].astype(object).equals(
+        records.iloc[:, :3].astype(object))
+    np.testing.assert_array_equal(df.iloc[:, 3:].values,
+                                  records.iloc[:, 3:].values)
+    assert results['embedding'] is None
+
+    for chamber in ['s', 'h']:
+
+        df_chamber, X_trunc = results['svd'][chamber]
+        expected, X_expected = features.transform_SVD(records, chamber,
+                                                      n_features_SVD=5)
+
+        assert df_chamber.index.tolist() == expected.index.tolist()
+        np.testing.assert_allclose(X_trunc, X_expected, rtol=1e-6,
+                                   atol=1e-8)
+
+    cached = Pipeline(SESSION, skip=skip + ['ingest', 'matrix', 'svd'],
+                      n_features_SVD=5).run()
+
+    assert cached['matrix'].equals(df)
+    np.testing.assert_array_equal(cached['svd']['h'][1],
+                                  results['svd']['h'][1])
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_serve.py
+---------------------
+The service answers member votes and agreement from the processed session,
+as counted directly from the records, and answers in valid JSON for missing
+parties and failing requests (Python 3.7+).
+"""
+import os
+import sys
+import json
+import numpy as np
+import pytest
+
+from conftest import SESSION
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 7),
+                                reason='serve.py runs on Python 3.7+')
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'src', 'service'))
+
+
+def test_session_matches_records(records, project):
+
+    from serve import Session
+
+    session = Session.from_file(os.path.join(project, 'data/processed'),
+                                SESSION)
+    votes = records.iloc[:, 3:]
+    names = records[records.Chamber == 'h'].index[:4]
+
+    for name in names:
+
+        cast = votes.loc[name][votes.loc[name] >= 0]
+        answer = session.member_votes(name)
+
+        assert [v['vote_id'] for v in answer['votes']] == cast.index.tolist()
+        assert [v['vote'] for v in answer['votes']] == cast.tolist()
+
+    for a, b in zip(names, names[1:]):
+
+        x, y = votes.loc[a].values, votes.loc[b].values
+        both = (x >= 0) & (y >= 0)
+        answer = session.agreement(a, b)
+
+        assert answer['n_common'] == both.sum()
+        assert answer['n_agree'] == (x[both] == y[both]).sum()
+        assert np.isclose(answer['agreement'],
+                          (x[both] == y[both]).mean())
+
+    with pytest.raises(LookupError):
+        session.member_votes(u'Nobody')
+
+
+def test_missing_party_is_null(processed, project):
+
+    import pandas as pd
+    from serve import Session
+
+    df = pd.read_csv(os.path.join(project, 'data/processed',
+                                  SESSION + '_dataframe.csv'),
+                     encoding='utf-8')
+    df.loc[0, 'Party'] = np.nan
+    answer = Session(SESSION, df).member_votes(df.Name[0])
+
+    assert answer['party'] is None
+    json.dumps(answer, allow_nan=False)
+
+
+class Stream(object):
+    """Reader and writer of one connection to QueryService.handle.
+    """
+
+    def __init__(self, request):
+        self.lines = request.splitlines(True) + [b'']
+        self.data = b''
+
+    def readline(self):
+        import asyncio
+        return asyncio.sleep(0, result=self.lines.pop(0))
+
+    def write(self, data):
+        self.data += data
+
+    def drain(self):
+        import asyncio
+        return asyncio.sleep(0)
+
+    def close(self):
+        pass
+
+
+def test_unexpected_errors_answer_500(project):
+
+    import asyncio
+    from serve import QueryService
+
+    class Failing(QueryService):
+
+        def route(self, path, query):
+            raise RuntimeError('unexpected')
+
+    stream = Stream(b'GET /health HTTP/1.0\r\n\r\n')
+    asyncio.run(Failing(workers=1).handle(stream, stream))
+
+    assert stream.data.startswith(b'HTTP/1.0 500 Internal Server Error')
+    assert json.loads(stream.data.split(b'\r\n\r\n')[1].decode()) == \
+        {'error': 'internal error'}
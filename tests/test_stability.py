@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_stability.py
+---------------------
+Embeddings of the worker pool, which reads the SVD features from shared
+memory, match those of the same seeds run one after the other, and the
+scores from the summed kNN indicators match overlaps counted for every pair
+of runs.
+"""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import SESSION
+
+
+@pytest.fixture
+def X():
+    return np.random.RandomState(0).randn(60, 5)
+
+
+def neighbors(X, k):
+
+    from stability import knn_indicator
+
+    return [set(np.flatnonzero(row)) for row in knn_indicator(X, k)]
+
+
+def test_pool_matches_sequential_runs(project, X):
+
+    from sklearn.manifold import TSNE
+    from affinities import fit_transform
+    from stability import Stability
+
+    stability = Stability(X, seeds=[0, 1], perplexities=(10,), n_jobs=2)
+    embeddings = stability.run()
+
+    assert stability.tasks == [(0, 10), (1, 10)]
+
+    for (seed, perplexity), embedding in zip(stability.tasks, embeddings):
+        expected = fit_transform(TSNE(n_components=2, perplexity=perplexity,
+                                      random_state=seed), X)
+        np.testing.assert_allclose(embedding, expected)
+
+
+def test_scores_match_pairwise_overlaps(X):
+
+    from stability import Stability
+
+    k = 5
+    rng = np.random.RandomState(1)
+    embeddings = [X[:, :2] + 0.3 * rng.randn(len(X), 2) for _ in range(4)]
+    runs = [neighbors(embedding, k) for embedding in embeddings]
+    reference = neighbors(X, k)
+
+    consistency, fidelity = Stability(X, n_neighbors=k).scores(embeddings)
+
+    for i in range(len(X)):
+
+        pairs = [len(runs[r][i] & runs[s][i]) / float(k)
+                 for r in range(len(runs)) for s in range(r + 1, len(runs))]
+
+        assert np.isclose(consistency[i], np.mean(pairs))
+        assert np.isclose(fidelity[i], np.mean(
+            [len(run[i] & reference[i]) / float(k) for run in runs]))
+
+
+def test_plot_is_saved_with_the_figures(project, X):
+
+    from build_features import Features
+    from stability import SessionStability
+
+    stability = SessionStability(SESSION, 's')
+    df_scores = pd.DataFrame({'Party': ['D', 'R', 'I'] * 20,
+                              'consistency': np.linspace(0, 1, len(X))})
+    stability.plot(df_scores, X[:, :2])
+
+    assert [name.split('_')[2]
+            for name in os.listdir(Features(SESSION).output_path)] == \
+        ['stability']
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_startup.py
+---------------------
+Loading the command line entry points imports none of the heavy
+dependencies; they are imported where they are used.
+"""
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'benchmarks'))
+
+from startup import ENTRY_POINTS, heavy_imports  # noqa: E402
+
+
+@pytest.mark.parametrize('directory, module', ENTRY_POINTS)
+def test_entry_points_import_no_heavy_modules(directory, module):
+
+    assert heavy_imports(directory, module) == []
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_timeline.py
+---------------------
+The rolling metrics of Timeline, against a direct recomputation of every
+window.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+from conftest import SESSION
+
+
+def party_metrics(votes, party, start, end):
+    """Cohesion, separation and unity of the measures [start, end).
+    """
+
+    V = votes[:, start:end]
+    metrics, yea_fraction = {}, {}
+
+    for name in ['D', 'R']:
+
+        yeas = (V[party == name] > 0).sum(axis=0)
+        nays = (V[party == name] < 0).sum(axis=0)
+        cast = yeas + nays
+        rice = [abs(y - n) / float(c)
+                for y, n, c in zip(yeas, nays, cast) if c]
+        metrics['cohesion_' + name] = np.mean(rice) if rice else 0.
+        yea_fraction[name] = yeas / np.maximum(cast, 1).astype(float)
+
+    metrics['separation'] = np.abs(yea_fraction['D'] -
+                                   yea_fraction['R']).mean()
+    metrics['unity'] = (((yea_fraction['D'] - 0.5) *
+                         (yea_fraction['R'] - 0.5)) < 0).mean()
+
+    return metrics
+
+
+def test_party_metrics_match_direct_recomputation(records):
+
+    from timeline import SessionTimeline, Timeline
+
+    measures = SessionTimeline(SESSION).load_measures()
+
+    for chamber in ['s', 'h']:
+
+        timeline = Timeline(records, measures, chamber, window=20)
+        days, starts, ends = timeline.windows()
+        metrics = timeline.party_metrics(starts, ends)
+        party = np.asarray(records[records.Chamber == chamber].Party)
+
+        assert len(days) > 1
+
+        for w, (start, end) in enumerate(zip(starts, ends)):
+
+            expected = party_metrics(timeline.votes, party, start, end)
+
+            for column, value in expected.items():
+                assert np.isclose(metrics[column][w], value), \
+                    (chamber, w, column)
+
+
+def test_sliding_gram_matches_eigendecomposition(records):
+
+    from timeline import SessionTimeline, Timeline
+
+    measures = SessionTimeline(SESSION).load_measures()
+    timeline = Timeline(records, measures, 'h', window=20, rank=2,
+                        n_power_iter=100)
+    days, starts, ends = timeline.windows()
+    explained = timeline.low_rank_metrics(starts, ends)['explained']
+
+    for w, (start, end) in enumerate(zip(starts, ends)):
+
+        V = timeline.votes[:, start:end]
+        eigenvalues = np.linalg.eigvalsh(V.dot(V.T))
+        assert np.isclose(explained[w], eigenvalues[-1] / eigenvalues.sum(),
+                          rtol=1e-3), w
+
+
+def test_days_windows_span_calendar_days(records):
+
+    from timeline import SessionTimeline, Timeline
+
+    measures = SessionTimeline(SESSION).load_measures()
+    timeline = Timeline(records, measures, 's', days=7)
+    days, starts, ends = timeline.windows()
+    dates = pd.to_datetime(timeline.dates)
+
+    for day, start, end in zip(pd.to_datetime(days), starts, ends):
+
+        assert (dates[start:end] <= day).all()
+        assert (dates[start:end] > day - pd.Timedelta(days=7)).all()
+        assert start == 0 or dates[start - 1] <= day - pd.Timedelta(days=7)
+
+
+def test_plot_is_saved_with_the_figures(records, project):
+
+    from build_features import Features
+    from timeline import SessionTimeline
+
+    timeline = SessionTimeline(SESSION)
+    timeline.plot(timeline.build(records, window=20))
+
+    assert [name.split('_')[1]
+            for name in os.listdir(Features(SESSION).output_path)] == \
+        ['timeline']
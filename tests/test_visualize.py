@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_visualize.py
+---------------------
+The t-SNE animation of a chamber is saved with the other figures of the
+session, in reports/figures/.
+"""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import SESSION
+
+
+def test_animation_is_saved_with_the_figures(project):
+
+    pytest.importorskip('tsne_animate')
+
+    from matplotlib.animation import AbstractMovieWriter
+    from sklearn.manifold import TSNE
+    from build_features import Features
+    from convergence import Convergence
+    from visualize import load_tsne_animate
+
+    class Recorder(AbstractMovieWriter):
+        """Writer that records the file name in place of encoding frames.
+        """
+
+        outfiles = []
+
+        def setup(self, fig, outfile, dpi, *args, **kwargs):
+            self.outfiles.append(outfile)
+
+        def grab_frame(self, **savefig_kwargs):
+            pass
+
+        def finish(self):
+            pass
+
+    X = pd.DataFrame(np.random.RandomState(0).randn(30, 5))
+    y = pd.DataFrame({'Name': ['m{}'.format(i) for i in range(len(X))],
+                      'Party': ['D', 'R', 'I'] * 10})
+    tsne = load_tsne_animate()(TSNE(perplexity=5., random_state=0))
+    tsne.convergence = Convergence(tol=None, max_iter=5)
+    tsne.animate(X, y, None, SESSION, 'Senate', writer=Recorder())
+
+    assert [os.path.dirname(outfile) for outfile in Recorder.outfiles] == \
+        [os.path.dirname(Features(SESSION).output_path)]
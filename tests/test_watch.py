@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_watch.py
+---------------------
+Votes parsed one file at a time by the watcher, including files edited after
+they were parsed, give the dataframe of a full parse, from the extracted tree
+or from an archive.
+"""
+import os
+import json
+import shutil
+import zipfile
+
+from conftest import SESSION
+
+
+def full_parse():
+
+    from make_dataset import Congress, Dataset
+
+    measures_voted_on, records = Congress(SESSION).get_measures_voted_on()
+
+    return Dataset().construct(measures_voted_on, records)
+
+
+def watched(watcher):
+
+    from make_dataset import Dataset
+
+    watcher.parse(watcher.pending(watcher.scan()))
+
+    return Dataset().construct(*watcher.ingested())
+
+
+def assert_same(df, expected):
+
+    assert sorted(df.index) == sorted(expected.index)
+    assert sorted(df.columns) == sorted(expected.columns)
+    assert df.loc[expected.index, expected.columns].equals(expected)
+
+
+def edit(filename, answer, keep):
+    """Keeps only the first keep members who voted answer, as if the file
+    had been corrected after it was first written.
+    """
+
+    with open(filename) as jfile:
+        data = json.load(jfile)
+
+    data['votes'][answer] = data['votes'][answer][:keep]
+
+    with open(filename, 'w') as jfile:
+        json.dump(data, jfile)
+
+    mtime = os.path.getmtime(filename) + 10
+    os.utime(filename, (mtime, mtime))
+
+
+def test_incremental_parse_matches_full_parse(synthetic):
+
+    from watch import Watcher
+
+    assert_same(watched(Watcher(SESSION)), full_parse())
+
+
+def test_reparsed_file_matches_full_parse(synthetic, project):
+
+    from watch import Watcher
+
+    watcher = Watcher(SESSION)
+    watched(watcher)
+
+    raw = os.path.join(project, 'data/raw', SESSION, 'votes', '2013')
+    edit(os.path.join(raw, 'h1', 'data.json'), 'Aye', 3)
+    edit(os.path.join(raw, 's2', 'data.json'), 'Nay', 0)
+
+    df = watched(watcher)
+    expected = full_parse()
+
+    assert (expected['h1-900.2013'] == 1).sum() == 3
+    assert_same(df, expected)
+    # A restarted watcher resumes from the state saved after the refresh.
+    watcher.save()
+    assert_same(watched(Watcher(SESSION)), expected)
+
+
+def zip_session(source, raw):
+    """Writes raw/<session>.zip from the tree of the session in source.
+    """
+
+    with zipfile.ZipFile(os.path.join(raw, SESSION + '.zip'), 'w') as zfile:
+
+        for directory, _, files in os.walk(os.path.join(source, SESSION)):
+
+            for name in files:
+                path = os.path.join(directory, name)
+                zfile.write(path, os.path.relpath(path, source))
+
+
+def test_archive_is_watched_by_member(synthetic, project):
+
+    from watch import Watcher
+
+    raw = os.path.join(project, 'data/raw')
+    source = os.path.join(project, 'source')
+    os.makedirs(source)
+    shutil.move(os.path.join(raw, SESSION), source)
+    zip_session(source, raw)
+
+    watcher = Watcher(SESSION)
+    expected = full_parse()
+    assert_same(watched(watcher), expected)
+    assert not watcher.pending(watcher.scan())
+
+    # The archive is rewritten with one corrected member.
+    edit(os.path.join(source, SESSION, 'votes', '2013', 'h1', 'data.json'),
+         'Aye', 3)
+    zip_session(source, raw)
+
+    assert list(watcher.pending(watcher.scan())) == \
+        [SESSION + '/votes/2013/h1/data.json']
+    assert_same(watched(watcher), full_parse())